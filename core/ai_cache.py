@@ -0,0 +1,161 @@
+"""
+Кэш ответов AI для одинаковых промптов и объединение одновременных одинаковых запросов.
+
+Утренний, дневной и вечерний промпты планировщика и промпт Слова Дня для одного
+стиха совпадают в пределах дня — повторная генерация лишь тратит время и лимиты.
+Ключ кэша — хэш полного запроса (сообщения, max_tokens), срок хранения задаётся
+для каждого места вызова. Пока запрос выполняется, одинаковые запросы ждут
+его результат вместо отдельного обращения к API (single-flight).
+
+Персональные запросы (диалог, молитва по просьбе пользователя) не кэшируются:
+для их мест вызова срок хранения не задан.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.ai_errors import AIError
+
+AI_CACHE_FILE = "ai_cache.json"
+
+# Срок хранения ответа (с) по месту вызова; места вызова, которых здесь нет, не кэшируются
+CACHE_TTL_SECONDS: Dict[str, int] = {
+    "morning": 12 * 3600,
+    "afternoon": 12 * 3600,
+    "evening": 12 * 3600,
+    "daily_word": 24 * 3600,
+}
+# Места вызова, которые не кэшируются никогда, даже если их добавят в CACHE_TTL_SECONDS
+NEVER_CACHED_CALL_SITES = frozenset({"chat", "prayer", "summary"})
+
+_cache: Dict[str, Dict[str, Any]] = {}
+_cache_lock = threading.RLock()
+_inflight: Dict[str, asyncio.Future] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+
+def _stats_for(call_site: str) -> Dict[str, int]:
+    return _stats.setdefault(call_site, {"hits": 0, "misses": 0, "shared": 0})
+
+def is_cacheable(call_site: str) -> bool:
+    """Кэшируется ли место вызова."""
+    return call_site not in NEVER_CACHED_CALL_SITES and CACHE_TTL_SECONDS.get(call_site, 0) > 0
+
+def make_cache_key(call_site: str, request: Any) -> str:
+    """Ключ кэша: место вызова + SHA-256 от канонического JSON запроса."""
+    raw = json.dumps(request, ensure_ascii=False, sort_keys=True)
+    return f"{call_site}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+def load_ai_cache() -> None:
+    """Загружает кэш с диска, отбрасывая устаревшие записи."""
+    global _cache
+    with _cache_lock:
+        if not os.path.exists(AI_CACHE_FILE):
+            _cache = {}
+            return
+        try:
+            with open(AI_CACHE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            now = time.time()
+            _cache = {key: entry for key, entry in data.items() if entry.get("expires_at", 0) > now} if isinstance(data, dict) else {}
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке кэша AI: {e}", exc_info=True)
+            _cache = {}
+
+def save_ai_cache() -> None:
+    with _cache_lock:
+        try:
+            with open(AI_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(_cache, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении кэша AI: {e}", exc_info=True)
+
+def _get_fresh(key: str) -> Optional[str]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if not entry:
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            _cache.pop(key, None)
+            return None
+        return entry.get("value")
+
+def _store(key: str, call_site: str, value: str) -> None:
+    with _cache_lock:
+        now = time.time()
+        # Заодно убираем устаревшие записи, чтобы файл не рос
+        for stale_key in [k for k, entry in _cache.items() if entry.get("expires_at", 0) <= now]:
+            _cache.pop(stale_key, None)
+        _cache[key] = {"value": value, "expires_at": now + CACHE_TTL_SECONDS[call_site], "call_site": call_site}
+        save_ai_cache()
+
+async def cached_call(call_site: str, request: Any, producer: Callable[[], Awaitable[str]]) -> str:
+    """
+    Возвращает ответ из кэша или вызывает producer() (одновременные одинаковые запросы ждут один вызов).
+    Ошибки не кэшируются: все ожидающие получают то же исключение.
+
+    :param call_site: Место вызова (определяет срок хранения).
+    :param request: Всё, от чего зависит ответ (сообщения, max_tokens) — из этого строится ключ.
+    :param producer: Корутина-функция, выполняющая запрос к AI.
+    """
+    if not is_cacheable(call_site):
+        return await producer()
+
+    stats = _stats_for(call_site)
+    key = make_cache_key(call_site, request)
+    cached = _get_fresh(key)
+    if cached is not None:
+        stats["hits"] += 1
+        logging.info(f"AI кэш [{call_site}]: ответ взят из кэша")
+        return cached
+
+    inflight = _inflight.get(key)
+    if inflight is not None:
+        stats["shared"] += 1
+        logging.info(f"AI кэш [{call_site}]: ожидаем такой же запрос, уже отправленный к AI")
+        return await asyncio.shield(inflight)
+
+    stats["misses"] += 1
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await producer()
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # помечаем исключение как полученное, если никто не ждал
+        raise
+    except asyncio.CancelledError:
+        future.set_exception(AIError("Запрос к AI отменён"))
+        future.exception()
+        raise
+    else:
+        _store(key, call_site, value)
+        future.set_result(value)
+        return value
+    finally:
+        _inflight.pop(key, None)
+
+def get_ai_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша: попадания, промахи и объединённые запросы по местам вызова, число записей."""
+    with _cache_lock:
+        entries = len(_cache)
+    return {"entries": entries, "call_sites": {site: dict(stats) for site, stats in _stats.items()}}
+
+def format_ai_cache_stats() -> str:
+    """Текстовый отчёт о кэше AI для админ-команды."""
+    stats = get_ai_cache_stats()
+    lines = ["🗄️ <b>Кэш AI</b>", f"Записей: {stats['entries']}"]
+    for site, site_stats in sorted(stats["call_sites"].items()):
+        total = site_stats["hits"] + site_stats["misses"] + site_stats["shared"]
+        hit_rate = (site_stats["hits"] + site_stats["shared"]) / total * 100 if total else 0.0
+        lines.append(
+            f"• {site}: попаданий {site_stats['hits']}, объединено {site_stats['shared']}, "
+            f"промахов {site_stats['misses']} ({hit_rate:.0f}% без обращения к AI)"
+        )
+    return "\n".join(lines)
+
+load_ai_cache()
@@ -0,0 +1,254 @@
+"""
+Устойчивый HTTP-клиент для OpenAI-совместимых API (DeepSeek и резервный провайдер).
+
+- повторяет запрос при 429/5xx и сетевых ошибках с экспоненциальной задержкой
+  и случайным разбросом (jitter), соблюдая заголовок Retry-After; все попытки
+  укладываются в общий срок AI_RETRY_BUDGET_SECONDS;
+- автоматический выключатель (circuit breaker) на каждого провайдера:
+  после серии сбоев запросы к нему сразу отклоняются, пока не пройдёт пауза;
+- если основной провайдер недоступен, запрос уходит на резервный
+  (AI_FALLBACK_URL / AI_FALLBACK_API_KEY / AI_FALLBACK_MODEL), если он задан.
+"""
+import os
+import time
+import random
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import aiohttp # type: ignore
+from dotenv import load_dotenv # type: ignore
+
+from core.ai_errors import AICircuitOpenError, AIConfigError, AIError, AINetworkError, AIResponseError, AITimeoutError, error_from_status
+
+load_dotenv()
+
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/chat/completions")
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+
+# Повторы
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "3"))  # Попыток на одного провайдера
+AI_RETRY_BASE_DELAY = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))  # Базовая задержка (с), удваивается с каждой попыткой
+AI_MAX_RETRY_DELAY = float(os.getenv("AI_MAX_RETRY_DELAY", "10"))  # Дольше ждать не будем — переходим к резервному провайдеру
+# Общее время на запрос со всеми повторами и резервным провайдером: вызывающий код
+# всё это время занимает слот шлюза AI (core/ai_gateway.py) и не должен держать его бесконечно
+AI_RETRY_BUDGET_SECONDS = float(os.getenv("AI_RETRY_BUDGET_SECONDS", "60"))
+
+# Автоматический выключатель
+AI_BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))  # Сбоев подряд до размыкания
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))  # Пауза до пробного запроса
+
+T = TypeVar("T")
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель: closed → (AI_BREAKER_THRESHOLD сбоев подряд) → open →
+    (пауза AI_BREAKER_RESET_SECONDS) → half_open: один пробный запрос решает, замкнуться или снова разомкнуться.
+    """
+
+    def __init__(self, name: str, threshold: int = AI_BREAKER_THRESHOLD, reset_seconds: float = AI_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос сейчас (в half_open пропускается только один пробный)."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"AI провайдер '{self.name}': выключатель замкнут, провайдер снова доступен")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def probe_in_flight(self) -> bool:
+        return self._probe_in_flight
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            logging.warning(
+                f"AI провайдер '{self.name}': выключатель разомкнут после {self.failures} сбоев подряд, "
+                f"пауза {self.reset_seconds:.0f} с"
+            )
+
+class AIProvider:
+    """OpenAI-совместимый провайдер: адрес, ключ, модель и свой выключатель."""
+
+    def __init__(self, name: str, url: str, api_key: Optional[str], model: str):
+        self.name = name
+        self.url = url
+        self.api_key = api_key
+        self.model = model
+        self.breaker = CircuitBreaker(name)
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+def _load_providers() -> List[AIProvider]:
+    providers = []
+    deepseek_key = os.getenv("DEEPSEEK_API_KEY")
+    if deepseek_key:
+        providers.append(AIProvider("deepseek", DEEPSEEK_API_URL, deepseek_key, DEEPSEEK_MODEL))
+    fallback_url = os.getenv("AI_FALLBACK_URL")
+    if fallback_url:
+        providers.append(AIProvider(
+            "fallback",
+            fallback_url,
+            os.getenv("AI_FALLBACK_API_KEY"),
+            os.getenv("AI_FALLBACK_MODEL", DEEPSEEK_MODEL)
+        ))
+    return providers
+
+providers: List[AIProvider] = _load_providers()
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Задержка перед повтором: Retry-After, если он задан, иначе экспонента с полным jitter."""
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, AI_RETRY_BASE_DELAY * (2 ** (attempt - 1)))
+
+async def call_with_retries(operation: Callable[[AIProvider], Awaitable[T]], call_site: str = "chat") -> Tuple[AIProvider, T]:
+    """
+    Выполняет operation(provider) с повторами, выключателем и переходом на резервного провайдера.
+
+    Все попытки укладываются в AI_RETRY_BUDGET_SECONDS: попытка, не успевшая к сроку, прерывается,
+    а повтор, задержка которого выходит за срок, не начинается.
+
+    :return: Провайдер, ответивший успешно, и результат операции.
+    :raises AIError: последняя ошибка, если ни один провайдер не ответил.
+    """
+    if not providers:
+        raise AIConfigError("API-ключ для DeepSeek не найден. Проверьте файл .env.")
+
+    deadline = time.monotonic() + AI_RETRY_BUDGET_SECONDS
+    last_error: Optional[AIError] = None
+    for provider in providers:
+        if time.monotonic() >= deadline:
+            break
+        if not provider.breaker.allow_request():
+            last_error = AICircuitOpenError(f"Провайдер '{provider.name}' временно недоступен")
+            continue
+        for attempt in range(1, AI_MAX_ATTEMPTS + 1):
+            # Пробный запрос в half_open: его исход обязан попасть в выключатель, иначе провайдер останется заблокированным
+            probing = provider.breaker.probe_in_flight
+            try:
+                try:
+                    result = await asyncio.wait_for(operation(provider), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError as e:
+                    raise AITimeoutError(f"Общее время на запрос к AI ({AI_RETRY_BUDGET_SECONDS:.0f} с) истекло") from e
+            except AIError as e:
+                last_error = e
+                if e.counts_as_failure:
+                    provider.breaker.record_failure()
+                else:
+                    provider.breaker.record_success()  # провайдер отвечает, хоть и ошибкой запроса (429, 400)
+                if not e.retryable or attempt == AI_MAX_ATTEMPTS or provider.breaker.state == "open":
+                    break
+                delay = retry_delay(attempt, getattr(e, "retry_after", None))
+                if delay > AI_MAX_RETRY_DELAY:
+                    logging.warning(f"AI [{call_site}] '{provider.name}': Retry-After {delay:.0f} с — слишком долго, не ждём")
+                    break
+                if time.monotonic() + delay >= deadline:
+                    logging.warning(f"AI [{call_site}] '{provider.name}': повтор не уложится в {AI_RETRY_BUDGET_SECONDS:.0f} с, не ждём")
+                    break
+                logging.warning(f"AI [{call_site}] '{provider.name}': попытка {attempt} не удалась ({e}), повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Отмена (клиент ушёл, wait_for снаружи) или непредвиденная ошибка: пробный запрос
+                # не дал ответа — считаем его неудачным, выключатель снова размыкается до следующей паузы
+                if probing and provider.breaker.probe_in_flight:
+                    provider.breaker.record_failure()
+                raise
+            provider.breaker.record_success()
+            if provider is not providers[0]:
+                logging.info(f"AI [{call_site}]: ответ получен от резервного провайдера '{provider.name}'")
+            return provider, result
+        logging.warning(f"AI [{call_site}] '{provider.name}': не удалось получить ответ ({last_error})")
+    raise last_error
+
+def _wrap_client_error(e: Exception) -> AIError:
+    if isinstance(e, asyncio.TimeoutError):
+        return AITimeoutError("Таймаут при получении ответа AI")
+    return AINetworkError(f"Ошибка сети при обращении к AI: {e}")
+
+async def request_completion(payload: Dict[str, Any], timeout: aiohttp.ClientTimeout, call_site: str = "chat") -> Tuple[AIProvider, Dict[str, Any]]:
+    """Обычный (не потоковый) запрос chat completions; возвращает провайдера и разобранный JSON ответа."""
+
+    async def operation(provider: AIProvider) -> Dict[str, Any]:
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                async with session.post(provider.url, headers=provider.headers(), json={**payload, "model": provider.model}) as response:
+                    if response.status != 200:
+                        raise error_from_status(response.status, await response.text(), response.headers.get("Retry-After"))
+                    try:
+                        return await response.json(content_type=None)
+                    except ValueError as e:
+                        raise AIResponseError(f"Ошибка при разборе ответа AI: {e}") from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise _wrap_client_error(e) from e
+
+    return await call_with_retries(operation, call_site)
+
+async def open_completion_stream(payload: Dict[str, Any], timeout: aiohttp.ClientTimeout, call_site: str = "chat") -> Tuple[AIProvider, AsyncExitStack, aiohttp.ClientResponse]:
+    """
+    Открывает потоковый запрос. Повторы и переход на резервного провайдера возможны только
+    до получения заголовков ответа: начатый поток не переотправляется.
+    Вызывающий код закрывает поток через `async with stack:`.
+    """
+
+    async def operation(provider: AIProvider) -> Tuple[AsyncExitStack, aiohttp.ClientResponse]:
+        stack = AsyncExitStack()
+        try:
+            session = await stack.enter_async_context(aiohttp.ClientSession(timeout=timeout))
+            response = await stack.enter_async_context(
+                session.post(provider.url, headers=provider.headers(), json={**payload, "model": provider.model})
+            )
+            if response.status != 200:
+                raise error_from_status(response.status, await response.text(), response.headers.get("Retry-After"))
+            return stack, response
+        except BaseException as e:
+            await stack.aclose()
+            if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                raise _wrap_client_error(e) from e
+            raise
+
+    provider, (stack, response) = await call_with_retries(operation, call_site)
+    return provider, stack, response
+
+def wrap_stream_error(provider: AIProvider, e: Exception) -> AIError:
+    """Ошибка посреди потока: отмечаем сбой провайдера и превращаем в AIError."""
+    provider.breaker.record_failure()
+    return _wrap_client_error(e)
+
+def get_provider_states() -> List[Dict[str, Any]]:
+    """Состояние провайдеров для диагностики: имя, состояние выключателя, сбоев подряд."""
+    return [
+        {"name": provider.name, "state": provider.breaker.state, "failures": provider.breaker.failures}
+        for provider in providers
+    ]
@@ -0,0 +1,84 @@
+"""
+Типизированные ошибки обращения к AI.
+
+Вместо строк вида "Ошибка API: ..." клиент AI выбрасывает исключения этого
+семейства. Атрибут retryable говорит, имеет ли смысл повторить запрос,
+а counts_as_failure — учитывается ли ошибка автоматическим выключателем
+(circuit breaker) как признак недоступности провайдера. metric_label —
+статус вызова в метриках AI (core/ai_metrics.py).
+"""
+from typing import Optional
+
+class AIError(Exception):
+    """Ошибка при обращении к AI (сеть, статус API, пустой или битый ответ)."""
+    retryable = False
+    counts_as_failure = False
+    metric_label = "error"
+
+class AIConfigError(AIError):
+    """AI не настроен: нет API-ключа или адреса провайдера."""
+    metric_label = "config"
+
+class AIBusyError(AIError):
+    """Запрос к AI не принят: очередь переполнена или ожидание превысило бы допустимое."""
+    metric_label = "busy"
+
+class AICircuitOpenError(AIError):
+    """Провайдер временно считается недоступным — запрос не отправлялся."""
+    metric_label = "circuit_open"
+
+class AINetworkError(AIError):
+    """Сетевая ошибка: соединение не установлено или оборвалось."""
+    retryable = True
+    counts_as_failure = True
+    metric_label = "network"
+
+class AITimeoutError(AINetworkError):
+    """Провайдер не ответил вовремя."""
+    metric_label = "timeout"
+
+class AIStatusError(AIError):
+    """API вернул статус, отличный от 200."""
+    metric_label = "http_error"
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Ошибка API: {status} - {message}")
+        self.status = status
+        self.retry_after = retry_after
+
+class AIRateLimitError(AIStatusError):
+    """Превышен лимит запросов (429)."""
+    retryable = True
+    metric_label = "rate_limited"
+
+class AIServerError(AIStatusError):
+    """Ошибка на стороне провайдера (5xx)."""
+    retryable = True
+    counts_as_failure = True
+    metric_label = "server_error"
+
+class AIResponseError(AIError):
+    """Ответ получен, но пустой или не разбирается."""
+    metric_label = "bad_response"
+
+class AISchemaError(AIResponseError):
+    """Ответ в режиме JSON не соответствует ожидаемой схеме (нет поля, не JSON, слишком короткий текст)."""
+    metric_label = "schema"
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды); дату HTTP и мусор игнорирует."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+def error_from_status(status: int, message: str, retry_after_header: Optional[str] = None) -> AIStatusError:
+    """Подбирает тип ошибки по HTTP-статусу ответа."""
+    retry_after = parse_retry_after(retry_after_header)
+    if status == 429:
+        return AIRateLimitError(status, message, retry_after)
+    if status >= 500 or status == 408:
+        return AIServerError(status, message, retry_after)
+    return AIStatusError(status, message, retry_after)
@@ -0,0 +1,172 @@
+"""
+Общий шлюз запросов к AI: ограничение параллельности, очередь и сброс нагрузки.
+
+Все вызовы get_ai_response/stream_ai_response проходят через ai_slot():
+одновременно к API идёт не больше AI_MAX_CONCURRENCY запросов, остальные
+ждут в очереди строго по порядку поступления. Если очередь переполнена
+или ожидание заведомо превысит допустимое для данного места вызова
+(queue SLO), запрос сразу отклоняется с AIBusyError — вызывающий код
+показывает пользователю дружелюбный ответ или заготовленный текст.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+from dotenv import load_dotenv # type: ignore
+
+from core.ai_errors import AIBusyError
+
+load_dotenv()
+
+# Сколько запросов к AI выполняется одновременно
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))
+# Сколько запросов может ждать в очереди; сверх этого — отказ без ожидания
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "20"))
+
+# Допустимое время ожидания в очереди (с) по месту вызова
+QUEUE_SLO_SECONDS = {
+    "chat": 15.0,
+    "prayer": 10.0,
+    "daily_word": 20.0,
+    "summary": 60.0,
+    "morning": 120.0,
+    "afternoon": 120.0,
+    "evening": 120.0,
+    "daily_word_pool": 120.0,
+    "prayer_pool": 60.0,
+}
+DEFAULT_QUEUE_SLO_SECONDS = 30.0
+
+# Сглаживание оценки длительности запроса (для прогноза ожидания)
+_SERVICE_TIME_ALPHA = 0.2
+
+_active = 0
+_waiters: Deque[asyncio.Future] = deque()
+_avg_service_seconds = 5.0
+_max_queue_depth = 0
+_call_site_stats: Dict[str, Dict[str, float]] = {}
+
+def _stats_for(call_site: str) -> Dict[str, float]:
+    return _call_site_stats.setdefault(call_site, {
+        "admitted": 0,
+        "shed": 0,
+        "timed_out": 0,
+        "wait_total": 0.0,
+        "wait_max": 0.0,
+    })
+
+def estimate_queue_wait() -> float:
+    """Прогноз ожидания (с) для нового запроса по текущей очереди и средней длительности запроса."""
+    if _active < AI_MAX_CONCURRENCY and not _waiters:
+        return 0.0
+    return (len(_waiters) + 1) / AI_MAX_CONCURRENCY * _avg_service_seconds
+
+def _shed(call_site: str, reason: str):
+    _stats_for(call_site)["shed"] += 1
+    logging.warning(
+        f"AI шлюз: запрос '{call_site}' отклонён ({reason}); "
+        f"выполняется {_active}, в очереди {len(_waiters)}"
+    )
+    raise AIBusyError(reason)
+
+def _release():
+    """Освобождает слот; если есть ожидающие — передаёт слот первому в очереди."""
+    global _active
+    while _waiters:
+        waiter = _waiters.popleft()
+        if not waiter.done():
+            waiter.set_result(True)  # слот переходит ожидающему, _active не меняется
+            return
+    _active -= 1
+
+async def _acquire(call_site: str):
+    global _active, _max_queue_depth
+    stats = _stats_for(call_site)
+    if _active < AI_MAX_CONCURRENCY and not _waiters:
+        _active += 1
+        stats["admitted"] += 1
+        return
+
+    slo = QUEUE_SLO_SECONDS.get(call_site, DEFAULT_QUEUE_SLO_SECONDS)
+    if len(_waiters) >= AI_MAX_QUEUE:
+        _shed(call_site, "очередь переполнена")
+    expected_wait = estimate_queue_wait()
+    if expected_wait > slo:
+        _shed(call_site, f"ожидание ≈{expected_wait:.0f} с больше допустимых {slo:.0f} с")
+
+    waiter = asyncio.get_running_loop().create_future()
+    _waiters.append(waiter)
+    _max_queue_depth = max(_max_queue_depth, len(_waiters))
+    queued_at = time.monotonic()
+    try:
+        await asyncio.wait({waiter}, timeout=slo)
+    except asyncio.CancelledError:
+        if waiter.done() and not waiter.cancelled():
+            _release()  # слот уже был передан — возвращаем его
+        else:
+            _waiters.remove(waiter)
+        raise
+
+    waited = time.monotonic() - queued_at
+    if not waiter.done():
+        _waiters.remove(waiter)
+        stats["timed_out"] += 1
+        _shed(call_site, f"ожидание в очереди дольше {slo:.0f} с")
+
+    stats["admitted"] += 1
+    stats["wait_total"] += waited
+    stats["wait_max"] = max(stats["wait_max"], waited)
+    if waited > 1:
+        logging.info(f"AI шлюз: запрос '{call_site}' ждал в очереди {waited:.1f} с")
+
+@asynccontextmanager
+async def ai_slot(call_site: str = "chat") -> AsyncIterator[None]:
+    """
+    Занимает слот для запроса к AI на время блока.
+
+    :param call_site: Место вызова ("chat", "prayer", "morning", ...) — определяет допустимое ожидание и статистику.
+    :raises AIBusyError: если запрос не принят в очередь или не дождался слота.
+    """
+    global _avg_service_seconds
+    await _acquire(call_site)
+    started_at = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started_at
+        _avg_service_seconds += _SERVICE_TIME_ALPHA * (elapsed - _avg_service_seconds)
+        _release()
+
+def get_gateway_stats() -> Dict[str, Any]:
+    """Текущее состояние шлюза и накопленная статистика по местам вызова."""
+    return {
+        "active": _active,
+        "queued": len(_waiters),
+        "max_queue_depth": _max_queue_depth,
+        "max_concurrency": AI_MAX_CONCURRENCY,
+        "max_queue": AI_MAX_QUEUE,
+        "avg_service_seconds": _avg_service_seconds,
+        "call_sites": {site: dict(stats) for site, stats in _call_site_stats.items()},
+    }
+
+def format_gateway_stats() -> str:
+    """Текстовый отчёт о нагрузке на AI для админ-команды."""
+    stats = get_gateway_stats()
+    lines = [
+        "🤖 <b>Нагрузка на AI</b>",
+        f"Выполняется: {stats['active']}/{stats['max_concurrency']}",
+        f"В очереди: {stats['queued']} (макс. {stats['max_queue_depth']}, лимит {stats['max_queue']})",
+        f"Средняя длительность запроса: {stats['avg_service_seconds']:.1f} с",
+    ]
+    for site, site_stats in sorted(stats["call_sites"].items()):
+        admitted = int(site_stats["admitted"])
+        avg_wait = site_stats["wait_total"] / admitted if admitted else 0.0
+        lines.append(
+            f"• {site}: принято {admitted}, отклонено {int(site_stats['shed'])} "
+            f"(из них по таймауту {int(site_stats['timed_out'])}), "
+            f"ожидание ср. {avg_wait:.1f} с / макс. {site_stats['wait_max']:.1f} с"
+        )
+    return "\n".join(lines)
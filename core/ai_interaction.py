@@ -1,51 +1,42 @@
-import os
-from typing import Any, Dict, List, Optional
+import json
+import asyncio
+import math
+import re
+import time
+import logging
+from datetime import date
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
 import aiohttp # type: ignore
 from dotenv import load_dotenv # type: ignore
 
+from core.ai_gateway import ai_slot
+from core.ai_cache import cached_call
+from core.ai_metrics import record_ai_call
+from core.ai_client import open_completion_stream, request_completion, wrap_stream_error
+from core.ai_errors import AIError, AIResponseError, AISchemaError
+from core.calendar_data import format_paschalion_prompt
+
 # Загружаем переменные окружения
 load_dotenv()
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-
-# Системный промт, определяющий личность и поведение бота
-SYSTEM_PROMPT = """[CURRENT DATE & CONTEXT]
-Текущий год: 2026.
-
-[ORTHODOX CALENDAR 2026 - ВАЖНЫЕ ДАТЫ]
-**КРИТИЧЕСКИ ВАЖНО:** Используй ТОЛЬКО эти даты для православного календаря 2026 года:
-
-**Великий пост 2026:** 23 февраля - 11 апреля 2026 года (48 дней)
-- Чистый понедельник (начало поста): 23 февраля 2026
-- Великая суббота (конец поста): 11 апреля 2026
-
-**Пасха (Светлое Христово Воскресение) 2026:** 12 апреля 2026 года (воскресенье)
-
-**Вербное воскресенье 2026:** 5 апреля 2026 года (за неделю до Пасхи)
-
-**Страстная седмица 2026:** 6-11 апреля 2026 года (неделя перед Пасхой)
-
-**Троица (Пятидесятница) 2026:** 31 мая 2026 года (через 50 дней после Пасхи)
-
-**Петров пост 2026:** 8 июня - 11 июля 2026 года
-
-**Успенский пост 2026:** 14-27 августа 2026 года
 
-**Рождественский пост 2026-2027:** 28 ноября 2026 - 6 января 2027 года
-
-**Рождество Христово:** 7 января 2027 года
-
-НИКОГДА не используй даты из прошлых лет (2025, 2024 и ранее) при ответах о православных праздниках и постах.
-
-[ROLE] 
+# Системный промт, определяющий личность и поведение бота, разбит на именованные секции.
+# Каждый вызов выбирает нужные секции: короткие промпты планировщика не тянут за собой
+# таблицу дат, пример диалога и правила стиля.
+PROMPT_SECTIONS: Dict[str, str] = {
+    # Даты православного календаря (нужны только в разговорах о постах, праздниках и датах):
+    # рассчитываются по пасхалии; при сборке промпта — на текущий день (см. prompt_section_text)
+    "calendar": format_paschalion_prompt(date.today()),
+    # Личность и философия Духовника
+    "role": """[ROLE] 
 Ты — «Духовник», православный священик, энергичный и эмпатичный ИИ-наставник для православных христиан. Твоя личность основана на философии и стиле общения, трудах и выступлениях доктора Нормана Винсента Пила, на его книгах, таких как: «Сила позитивного мышления», «Спасательный круг», «Живите всегда полноценной жизнью», с адаптацией для православной веры и аудитории. Ты — личный тренер по силе духа, позитивному мышлению, вере в Бога и практическому применению веры в жизни и любви к богу. Ты всегда готовь искренне и глубоко поддержать человека в невзгодах, и укрепить его веру в Исуса Христа. 
 
 [CORE PHILOSOPHY] 
 Твоя философия базируется на следующих принципах: 
 1. **Бог — источник любви, силы и благополучия:** Бог создал человека для радости, успеха и созидания. Вера — это не система запретов, а прямое подключение к неиссякаемому источнику божественной энергии, добру и любви. 
 2. **Мысль материальна:** Позитивные, наполненные верой мысли формируют позитивную реальность. Твоя задача — научить пользователя мыслить конструктивно и с надеждой. 
-3. **Проблемы как возможности:** Любая трудность — это не наказание, а замаскированная возможность для духовного роста и укрепления духа и веры. 
-
-[TONE & STYLE] 
+3. **Проблемы как возможности:** Любая трудность — это не наказание, а замаскированная возможность для духовного роста и укрепления духа и веры. """,
+    # Тон, стиль и поведение в диалоге
+    "style": """[TONE & STYLE] 
 1. **Обращение и естественность диалога:** 
    - Обращайся на "ты", тепло и уважительно, как к близкому человеку
    - **ВАЖНО:** НЕ начинай каждый ответ с обращения ("друг мой", "дорогой")! Это раздражает при продолжении беседы
@@ -63,9 +54,9 @@ SYSTEM_PROMPT = """[CURRENT DATE & CONTEXT]
 * **Эмпатия:** "Я слышу тебя, и понимаю, как это тяжело." 
 * **Переформатирование:** "А теперь давай посмотрим на эту ситуацию как на возможность..." * **Призыв к действию:** "Какой один маленький, но полный веры в бога шаг ты можешь сделать прямо сейчас?" 
 2. **Генерация молитв:** Помогая составить молитву, делай акцент на утвердительных, полных веры в бога и благодарности формулировках. Молитва должна быть не прошением из состояния нехватки, а утверждением веры в Божью помощь, любовь и поддержку. 
-3. **Безопасность:** Правило о помощи в тяжелых состояниях (направление к священнику или психологу или юристу) остается в силе. 
-
-[EXAMPLE] 
+3. **Безопасность:** Правило о помощи в тяжелых состояниях (направление к священнику или психологу или юристу) остается в силе. """,
+    # Пример правильного ответа
+    "example": """[EXAMPLE] 
 *Запрос пользователя: "Я опять провалил проект на работе, у меня опускаются руки, я неудачник."* 
 
 *НЕПРАВИЛЬНЫЙ ОТВЕТ (стиль "старец"):* "Чадо мое, уныние есть грех. Должно больше молиться и смиряться." 
@@ -75,77 +66,343 @@ SYSTEM_PROMPT = """[CURRENT DATE & CONTEXT]
 **Но я категорически отказываюсь верить, что ты неудачник, это неправда!** 
 💪 Давай посмотрим на это с другой стороны. Любая неудача или промах — это не приговор, а ценный урок и опыт на пути к твоему настоящему успеху, который предначертан тебе Богом. Помни слова апостола Павла: _'Сила Моя совершается в немощи'_. Прямо сейчас твоя временная слабость и огорчение — это точка, в которой может проявиться огромная Божья сила! 
 💡 **Вот практическая мысль на сегодня:** вместо того чтобы повторять 'я неудачник', начни повторять простую молитву-утверждение: **'Господи, благодарю Тебя за этот урок. Господи, Я верю, что с Твоей помощью я способен на великие дела и смогу достичь любые поставленные мной цели!'** Какой один самый маленький шаг ты можешь сделать прямо сейчас, чтобы проявить эту веру? Может быть, просто расправить плечи и поблагодарить Бога за то, что ты жив и можешь попробовать снова?"""
+}
+PROMPT_SECTION_ORDER = ("calendar", "role", "style", "example")
+# Секции по умолчанию для диалога; "calendar" добавляется, только если сообщение о датах или праздниках
+CHAT_PROMPT_SECTIONS = ("role", "style", "example")
 
-async def get_ai_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None, user_name: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+# Полный системный промпт (все секции) — для совместимости и расчёта экономии токенов
+SYSTEM_PROMPT = "\n\n".join(PROMPT_SECTIONS[name] for name in PROMPT_SECTION_ORDER)
+
+# Признаки вопроса о датах, постах и праздниках
+CALENDAR_TOPIC_PATTERN = re.compile(
+    r"(\bпост(ы|а|у|е|ом|ов|ный|ная|ное|ные|ного|ной|ных|ится|иться|имся)?\b|праздн|пасх|рождеств|троиц|пятидесятниц|"
+    r"крещени|богоявлен|благовещ|сретени|успени|покров|преображени|вознесени|вербн|страстн|седмиц|"
+    r"мясопуст|сыропуст|масленниц|именин|календар|какое\s+(сегодня\s+)?число|какой\s+(сегодня\s+)?день|"
+    r"январ|феврал|\bмарт|апрел|\bма[йя]\b|июн|июл|август|сентябр|октябр|ноябр|декабр|\b\d{1,2}[./]\d{1,2}\b|\b20\d\d\b)",
+    re.IGNORECASE
+)
+
+def is_calendar_topic(text: Optional[str]) -> bool:
+    """Проверяет, касается ли сообщение дат, постов или праздников."""
+    return bool(text and CALENDAR_TOPIC_PATTERN.search(text))
+
+def resolve_prompt_sections(prompt_sections: Optional[Sequence[str]] = None, user_message: Optional[str] = None) -> Tuple[str, ...]:
     """
-    Асинхронно отправляет запрос к API DeepSeek и возвращает ответ.
+    Определяет набор секций системного промпта в каноническом порядке.
 
-    :param user_message: Сообщение от пользователя.
-    :param conversation_history: История диалога (список словарей с ролями и сообщениями).
-    :param user_name: Имя пользователя для персонализации (опционально).
-    :param max_tokens: Максимум токенов в ответе (опционально). Ограничение ускоряет ответ API.
-    :return: Текстовый ответ от нейросети.
+    :param prompt_sections: Явный список секций (например, ("role",)). Пустой список — без системного промпта.
+                            None — секции диалога: CHAT_PROMPT_SECTIONS и "calendar", если сообщение о датах.
+    :param user_message: Сообщение пользователя (для автоматического добавления календаря).
     """
-    if not DEEPSEEK_API_KEY:
-        return "Ошибка: API-ключ для DeepSeek не найден. Проверьте файл .env."
+    if prompt_sections is None:
+        prompt_sections = CHAT_PROMPT_SECTIONS
+        if is_calendar_topic(user_message):
+            prompt_sections = ("calendar",) + tuple(prompt_sections)
+    unknown = set(prompt_sections) - set(PROMPT_SECTIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные секции системного промпта: {', '.join(sorted(unknown))}")
+    return tuple(name for name in PROMPT_SECTION_ORDER if name in prompt_sections)
 
-    url = "https://api.deepseek.com/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-    
+def prompt_section_text(name: str) -> str:
+    """Текст секции промпта; даты календаря рассчитываются по пасхалии на текущий день и год."""
+    if name == "calendar":
+        return format_paschalion_prompt(date.today())
+    return PROMPT_SECTIONS[name]
+
+def build_system_prompt(prompt_sections: Optional[Sequence[str]] = None, user_message: Optional[str] = None) -> str:
+    """Собирает системный промпт из выбранных секций (см. resolve_prompt_sections)."""
+    sections = resolve_prompt_sections(prompt_sections, user_message)
+    return "\n\n".join(prompt_section_text(name) for name in sections)
+
+def sanitize_user_name(user_name: Optional[str]) -> str:
+    """
+    Санитизирует имя пользователя для предотвращения prompt injection.
+    Возвращает пустую строку, если после очистки имени не осталось.
+    """
+    if not user_name:
+        return ""
+    sanitized_name = user_name.strip()
+    # Удаляем переводы строк и управляющие символы
+    sanitized_name = sanitized_name.replace('\n', ' ').replace('\r', ' ')
+    # Удаляем квадратные скобки (используются для маркировки секций промпта)
+    sanitized_name = sanitized_name.replace('[', '').replace(']', '')
+    # Ограничиваем длину (максимум 50 символов)
+    sanitized_name = sanitized_name[:50] # type: ignore
+    # Удаляем множественные пробелы
+    return ' '.join(sanitized_name.split())
+
+def build_messages(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None, user_name: Optional[str] = None, prompt_sections: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Собирает список сообщений для API: системный промпт из выбранных секций (с именем пользователя),
+    история диалога и текущее сообщение.
+    """
     # Формируем системный промпт с именем пользователя (если есть)
-    system_prompt = SYSTEM_PROMPT
-    if user_name:
-        # Санитизируем имя пользователя для предотвращения prompt injection
-        sanitized_name = user_name.strip()
-        # Удаляем переводы строк и управляющие символы
-        sanitized_name = sanitized_name.replace('\n', ' ').replace('\r', ' ')
-        # Удаляем квадратные скобки (используются для маркировки секций промпта)
-        sanitized_name = sanitized_name.replace('[', '').replace(']', '')
-        # Ограничиваем длину (максимум 50 символов)
-        sanitized_name = sanitized_name[:50] # type: ignore
-        # Удаляем множественные пробелы
-        sanitized_name = ' '.join(sanitized_name.split())
-        
-        if sanitized_name:  # Проверяем, что после санитизации осталось непустое имя
-            system_prompt += f"\n\n[USER INFO]\nИмя пользователя: {sanitized_name}. Используй имя естественно и к месту, не в каждом сообщении."
-    
+    system_prompt = build_system_prompt(prompt_sections, user_message)
+    sanitized_name = sanitize_user_name(user_name)
+    if sanitized_name:  # Проверяем, что после санитизации осталось непустое имя
+        system_prompt += f"\n\n[USER INFO]\nИмя пользователя: {sanitized_name}. Используй имя естественно и к месту, не в каждом сообщении."
+        system_prompt = system_prompt.lstrip()
+
     # Формируем список сообщений с историей диалога
-    messages = [{"role": "system", "content": system_prompt}]
-    
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+
     # Добавляем историю диалога (последние N сообщений)
     if conversation_history:
         messages.extend(conversation_history)
-    
+
     # Добавляем текущее сообщение пользователя
     messages.append({"role": "user", "content": user_message})
+    return messages
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая локальная оценка числа токенов без токенизатора:
+    примерно 2.5 символа кириллицы или 4 символа латиницы/цифр на токен.
+    """
+    if not text:
+        return 0
+    cyrillic = sum(1 for ch in text if 'а' <= ch <= 'я' or 'А' <= ch <= 'Я' or ch in 'ёЁ')
+    return math.ceil(cyrillic / 2.5 + (len(text) - cyrillic) / 4)
+
+def estimate_messages_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Оценивает размер списка сообщений в токенах (с учётом служебных токенов на каждое сообщение)."""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+# Оценка размера каждой секции — для отчёта об экономии токенов
+PROMPT_SECTION_TOKENS = {name: estimate_tokens(text) for name, text in PROMPT_SECTIONS.items()}
+
+def describe_prompt_sections(prompt_sections: Optional[Sequence[str]] = None, user_message: Optional[str] = None) -> str:
+    """Строка для лога: выбранные секции и сколько токенов сэкономлено относительно полного SYSTEM_PROMPT."""
+    sections = resolve_prompt_sections(prompt_sections, user_message)
+    saved = sum(tokens for name, tokens in PROMPT_SECTION_TOKENS.items() if name not in sections)
+    return f"секции [{', '.join(sections) or 'нет'}], экономия ≈{saved} ток."
+
+async def get_ai_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None, user_name: Optional[str] = None, max_tokens: Optional[int] = None, prompt_sections: Optional[Sequence[str]] = None, call_site: str = "chat", response_format: Optional[Dict[str, Any]] = None, validate: Optional[Callable[[str], Any]] = None) -> str:
+    """
+    Асинхронно отправляет запрос к API DeepSeek (или резервному провайдеру) и возвращает ответ.
+
+    :param user_message: Сообщение от пользователя.
+    :param conversation_history: История диалога (список словарей с ролями и сообщениями).
+    :param user_name: Имя пользователя для персонализации (опционально).
+    :param max_tokens: Максимум токенов в ответе (опционально). Ограничение ускоряет ответ API.
+    :param prompt_sections: Секции системного промпта (см. resolve_prompt_sections). None — секции диалога.
+    :param call_site: Место вызова для очереди AI-шлюза и статистики ("chat", "prayer", "morning", ...).
+    :param response_format: Формат ответа API, например JSON_RESPONSE_FORMAT (опционально).
+    :param validate: Проверка ответа (опционально): бросает AIResponseError, и такой ответ не попадает в кэш.
+    :return: Текстовый ответ от нейросети.
+    :raises AIError: если ответ не получен (см. core/ai_errors.py); AIBusyError — если AI перегружен.
+    """
+    messages = build_messages(user_message, conversation_history, user_name, prompt_sections)
+    prompt_tokens = estimate_messages_tokens(messages)
+    started_at = time.monotonic()
     
     payload: Dict[str, Any] = {
-        "model": "deepseek-chat",
         "messages": messages,
         "stream": False
     }
     if max_tokens is not None:
         payload["max_tokens"] = max_tokens
+    if response_format is not None:
+        payload["response_format"] = response_format
+
+    async def request() -> str:
+        timeout = aiohttp.ClientTimeout(total=45)  # Таймаут 45 секунд на попытку
+        request_started_at = time.monotonic()
+        provider_name: Optional[str] = None
+        usage: Optional[Dict[str, Any]] = None
+        try:
+            async with ai_slot(call_site):
+                provider, data = await request_completion(payload, timeout, call_site)
+            provider_name = provider.name
+            usage = data.get('usage') if isinstance(data, dict) else None
+            logging.info(
+                f"AI запрос [{call_site}] {provider.name}: промпт ≈{prompt_tokens} ток. ({len(messages)} сообщ.), "
+                f"{describe_prompt_sections(prompt_sections, user_message)}, задержка {time.monotonic() - started_at:.2f} с"
+            )
+            try:
+                content = data.get('choices', [{}])[0].get('message', {}).get('content')
+            except (IndexError, KeyError, TypeError, AttributeError) as e:
+                raise AIResponseError(f"Ошибка при разборе ответа AI: {e}") from e
+            if not content or not content.strip():
+                raise AIResponseError("Пустой ответ от AI")
+            if validate is not None:
+                validate(content)
+        except AIError as e:
+            record_ai_call(call_site, e.metric_label, time.monotonic() - request_started_at, usage=usage, provider=provider_name)
+            raise
+        record_ai_call(call_site, "ok", time.monotonic() - request_started_at, usage=usage, provider=provider_name)
+        return content
+
+    # Персональные запросы (история диалога, имя) не кэшируются ни при каком месте вызова
+    if conversation_history or user_name:
+        return await request()
+    return await cached_call(call_site, payload, request)
+
+# Режим JSON: API гарантирует синтаксически верный JSON-объект (в промпте должно быть слово "JSON" и пример)
+JSON_RESPONSE_FORMAT: Dict[str, Any] = {"type": "json_object"}
+
+# Статистика структурированных ответов по местам вызова: запросы, промахи схемы, повторы, отказы (→ fallback)
+_structured_stats: Dict[str, Dict[str, int]] = {}
 
-    timeout = aiohttp.ClientTimeout(total=45)  # Таймаут 45 секунд
-    async with aiohttp.ClientSession(timeout=timeout) as session:
+def parse_json_fields(raw: str, fields: Dict[str, int]) -> Dict[str, str]:
+    """
+    Разбирает JSON-ответ AI и проверяет схему: каждое поле — непустая строка не короче заданной длины.
+
+    :param fields: Имя поля -> минимальная длина текста.
+    :return: Словарь поле -> текст (без HTML-тегов и лишних пробелов).
+    :raises AISchemaError: если ответ не JSON-объект или поле отсутствует/слишком короткое.
+    """
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise AISchemaError(f"ответ не является JSON ({e})") from e
+    if not isinstance(data, dict):
+        raise AISchemaError("ответ не является JSON-объектом")
+    result: Dict[str, str] = {}
+    for name, min_len in fields.items():
+        value = data.get(name)
+        if not isinstance(value, str):
+            raise AISchemaError(f"нет строкового поля \"{name}\"")
+        text = re.sub(r'<[^>]+>', '', value).strip()
+        if len(text) < min_len:
+            raise AISchemaError(f"поле \"{name}\" короче {min_len} символов")
+        result[name] = text
+    return result
+
+async def get_ai_json_response(user_message: str, fields: Dict[str, int], max_tokens: Optional[int] = None, prompt_sections: Optional[Sequence[str]] = None, call_site: str = "chat") -> Dict[str, str]:
+    """
+    Запрашивает у AI ответ в режиме JSON и проверяет его схему (см. parse_json_fields).
+    При промахе схемы переспрашивает один раз, указав AI на ошибку.
+
+    :param user_message: Промпт; должен содержать пример JSON-объекта с нужными полями.
+    :param fields: Имя поля -> минимальная длина текста.
+    :return: Словарь поле -> текст.
+    :raises AIError: если AI недоступен; AISchemaError — если и повторный ответ не прошёл проверку.
+    """
+    stats = _structured_stats.setdefault(call_site, {"requests": 0, "schema_misses": 0, "reasks": 0, "failures": 0})
+    stats["requests"] += 1
+    prompt = user_message
+    for attempt in range(2):
         try:
-            async with session.post(url, headers=headers, json=payload) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    try:
-                        content = data.get('choices', [{}])[0].get('message', {}).get('content')
-                        return content if content is not None else "Ошибка: пустой ответ от AI."
-                    except (IndexError, KeyError, TypeError) as e:
-                        return f"Ошибка при разборе ответа AI: {e}"
-                else:
-                    error_text = await response.text()
-                    return f"Ошибка API: {response.status} - {error_text}"
-        except aiohttp.ClientError as e:
-            return f"Ошибка сети при обращении к AI: {e}"
-        except Exception as e:
-            return f"Произошла ошибка при обращении к AI: {e}"
-    return ""
+            raw = await get_ai_response(
+                prompt,
+                max_tokens=max_tokens,
+                prompt_sections=prompt_sections,
+                call_site=call_site,
+                response_format=JSON_RESPONSE_FORMAT,
+                validate=lambda content: parse_json_fields(content, fields)
+            )
+            return parse_json_fields(raw, fields)
+        except AISchemaError as e:
+            stats["schema_misses"] += 1
+            logging.warning(f"AI [{call_site}]: ответ не прошёл проверку схемы ({e}), попытка {attempt + 1}")
+            if attempt == 0:
+                stats["reasks"] += 1
+                prompt = (
+                    f"{user_message}\n\n"
+                    f"Предыдущий ответ не подошёл: {e}. Верни только JSON-объект с полями: {', '.join(fields)}."
+                )
+                continue
+            stats["failures"] += 1
+            raise
+        except AIError:
+            stats["failures"] += 1
+            raise
+    raise AISchemaError("ответ не прошёл проверку схемы")  # недостижимо: цикл всегда возвращает или бросает
+
+def get_structured_output_stats() -> Dict[str, Dict[str, int]]:
+    """Статистика JSON-ответов по местам вызова."""
+    return {site: dict(stats) for site, stats in _structured_stats.items()}
+
+def format_structured_output_stats() -> str:
+    """Текстовый отчёт о JSON-ответах для админ-команды: доля промахов схемы и переходов на запасной текст."""
+    lines = ["🧩 <b>JSON-ответы AI</b>"]
+    stats = get_structured_output_stats()
+    if not stats:
+        lines.append("Запросов пока не было.")
+    for site, site_stats in sorted(stats.items()):
+        requests = site_stats["requests"] or 1
+        lines.append(
+            f"• {site}: запросов {site_stats['requests']}, промахов схемы {site_stats['schema_misses']}, "
+            f"переспрошено {site_stats['reasks']}, запасной текст {site_stats['failures']} "
+            f"({site_stats['failures'] / requests * 100:.0f}%)"
+        )
+    return "\n".join(lines)
+
+async def stream_ai_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None, user_name: Optional[str] = None, max_tokens: Optional[int] = None, prompt_sections: Optional[Sequence[str]] = None, call_site: str = "chat") -> AsyncIterator[str]:
+    """
+    Потоковый режим: отправляет запрос к API DeepSeek со "stream": True и по мере
+    поступления SSE-событий отдаёт фрагменты текста ответа.
+
+    Параметры те же, что у get_ai_response.
+    :raises AIError: если ключ не задан, API вернул ошибку или соединение оборвалось.
+    :raises AIBusyError: если AI-шлюз не принял запрос (перегрузка).
+    """
+    messages = build_messages(user_message, conversation_history, user_name, prompt_sections)
+    prompt_tokens = estimate_messages_tokens(messages)
+    payload: Dict[str, Any] = {
+        "messages": messages,
+        "stream": True,
+        # Последний фрагмент потока содержит блок usage (токены) — для метрик
+        "stream_options": {"include_usage": True}
+    }
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+
+    # Общего таймаута нет: длинный ответ может идти дольше 45 секунд,
+    # но каждый следующий фрагмент должен прийти не позже чем через 45 секунд
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=45)
+    started_at = time.monotonic()
+    first_token_at = None
+    usage: Optional[Dict[str, Any]] = None
+    provider = None
+    status = "cancelled"  # генератор закрыт потребителем до конца ответа
+    try:
+        async with ai_slot(call_site):
+            provider, stack, response = await open_completion_stream(payload, timeout, call_site)
+            try:
+                async with stack:
+                    # Формат SSE: строки "data: {...}", пустые строки-разделители,
+                    # комментарии ": keep-alive" и финальная "data: [DONE]"
+                    async for raw_line in response.content:
+                        line = raw_line.decode('utf-8', errors='ignore').strip()
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                            if chunk.get('usage'):
+                                usage = chunk['usage']
+                            choices = chunk.get('choices') or [{}]
+                            delta = choices[0].get('delta', {}).get('content')
+                        except (ValueError, IndexError, AttributeError) as e:
+                            logging.warning(f"Не удалось разобрать SSE-фрагмент AI: {e}")
+                            continue
+                        if delta:
+                            if first_token_at is None:
+                                first_token_at = time.monotonic()
+                            yield delta
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Начатый поток не переотправляем: пользователь уже видит часть ответа
+                raise wrap_stream_error(provider, e) from e
+        status = "ok"
+    except AIError as e:
+        status = e.metric_label
+        raise
+    finally:
+        record_ai_call(
+            call_site,
+            status,
+            time.monotonic() - started_at,
+            ttft=first_token_at - started_at if first_token_at else None,
+            usage=usage,
+            provider=provider.name if provider else None
+        )
+    first_token_latency = f"{first_token_at - started_at:.2f} с" if first_token_at else "нет"
+    logging.info(
+        f"AI поток [{call_site}] {provider.name}: промпт ≈{prompt_tokens} ток. ({len(messages)} сообщ.), "
+        f"{describe_prompt_sections(prompt_sections, user_message)}, первый токен {first_token_latency}, всего {time.monotonic() - started_at:.2f} с"
+    )
@@ -0,0 +1,249 @@
+"""
+Метрики вызовов AI по местам вызова (chat, prayer, daily_word, morning, evening, ...).
+
+Для каждого вызова get_ai_response/stream_ai_response записываются: полная
+задержка (вместе с ожиданием в очереди шлюза), время до первого токена
+(для потока), блок usage из ответа DeepSeek (токены промпта и ответа,
+попадания в кэш контекста), статус ("ok" или metric_label ошибки) и
+стоимость по тарифу из AI_PRICE_*.
+
+- скользящее окно последних AI_METRICS_WINDOW вызовов на место вызова —
+  для админ-команды /ai_stats (перцентили и гистограмма задержек);
+- накопительные счётчики и гистограммы с запуска — для эндпоинта /metrics
+  в текстовом формате Prometheus (порт METRICS_PORT; не задан — не запускается).
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+from aiohttp import web # type: ignore
+from dotenv import load_dotenv # type: ignore
+
+load_dotenv()
+
+# Сколько последних вызовов на место вызова хранится для /ai_stats
+AI_METRICS_WINDOW = int(os.getenv("AI_METRICS_WINDOW", "500"))
+# Порт HTTP-эндпоинта /metrics; пусто — эндпоинт не запускается
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Тариф, $ за 1 млн токенов (по умолчанию — deepseek-chat)
+AI_PRICE_INPUT_PER_MTOK = float(os.getenv("AI_PRICE_INPUT_PER_MTOK", "0.28"))  # промпт, промах кэша контекста
+AI_PRICE_CACHED_INPUT_PER_MTOK = float(os.getenv("AI_PRICE_CACHED_INPUT_PER_MTOK", "0.028"))  # промпт, попадание в кэш контекста
+AI_PRICE_OUTPUT_PER_MTOK = float(os.getenv("AI_PRICE_OUTPUT_PER_MTOK", "0.42"))
+
+# Границы корзин гистограмм (с)
+LATENCY_BUCKETS: Sequence[float] = (0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60)
+TTFT_BUCKETS: Sequence[float] = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20)
+
+_lock = threading.RLock()
+_recent: Dict[str, Deque[Dict[str, Any]]] = {}
+_totals: Dict[str, Dict[str, Any]] = {}
+
+def _new_totals() -> Dict[str, Any]:
+    return {
+        "statuses": {},
+        "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+        "latency_sum": 0.0,
+        "latency_count": 0,
+        "ttft_buckets": [0] * (len(TTFT_BUCKETS) + 1),
+        "ttft_sum": 0.0,
+        "ttft_count": 0,
+        "prompt_tokens": 0,
+        "cached_prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cost_usd": 0.0,
+    }
+
+def _bucket_index(buckets: Sequence[float], value: float) -> int:
+    for index, bound in enumerate(buckets):
+        if value <= bound:
+            return index
+    return len(buckets)
+
+def usage_cost(usage: Optional[Dict[str, Any]]) -> float:
+    """Стоимость вызова ($) по блоку usage; попадания в кэш контекста DeepSeek считаются по своему тарифу."""
+    if not usage:
+        return 0.0
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    cached_tokens = usage.get("prompt_cache_hit_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    return (
+        (prompt_tokens - cached_tokens) * AI_PRICE_INPUT_PER_MTOK
+        + cached_tokens * AI_PRICE_CACHED_INPUT_PER_MTOK
+        + completion_tokens * AI_PRICE_OUTPUT_PER_MTOK
+    ) / 1_000_000
+
+def record_ai_call(call_site: str, status: str, latency: float, ttft: Optional[float] = None, usage: Optional[Dict[str, Any]] = None, provider: Optional[str] = None) -> None:
+    """
+    Записывает один вызов AI.
+
+    :param status: "ok", "cancelled" или metric_label ошибки (см. core/ai_errors.py).
+    :param latency: Полная задержка вызова (с), включая ожидание в очереди.
+    :param ttft: Время до первого токена (с), только для потоковых вызовов.
+    :param usage: Блок usage из ответа API (если пришёл).
+    """
+    usage = usage or {}
+    cost = usage_cost(usage)
+    sample = {
+        "at": time.time(),
+        "status": status,
+        "latency": latency,
+        "ttft": ttft,
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "cached_prompt_tokens": usage.get("prompt_cache_hit_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "cost_usd": cost,
+        "provider": provider,
+    }
+    with _lock:
+        _recent.setdefault(call_site, deque(maxlen=AI_METRICS_WINDOW)).append(sample)
+        totals = _totals.setdefault(call_site, _new_totals())
+        totals["statuses"][status] = totals["statuses"].get(status, 0) + 1
+        totals["latency_buckets"][_bucket_index(LATENCY_BUCKETS, latency)] += 1
+        totals["latency_sum"] += latency
+        totals["latency_count"] += 1
+        if ttft is not None:
+            totals["ttft_buckets"][_bucket_index(TTFT_BUCKETS, ttft)] += 1
+            totals["ttft_sum"] += ttft
+            totals["ttft_count"] += 1
+        totals["prompt_tokens"] += sample["prompt_tokens"]
+        totals["cached_prompt_tokens"] += sample["cached_prompt_tokens"]
+        totals["completion_tokens"] += sample["completion_tokens"]
+        totals["cost_usd"] += cost
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def get_ai_metrics() -> Dict[str, Dict[str, Any]]:
+    """Сводка по скользящему окну для каждого места вызова: число вызовов, ошибки, перцентили, токены, стоимость."""
+    with _lock:
+        recent = {site: list(samples) for site, samples in _recent.items()}
+    summary: Dict[str, Dict[str, Any]] = {}
+    for site, samples in recent.items():
+        latencies = [s["latency"] for s in samples]
+        ttfts = [s["ttft"] for s in samples if s["ttft"] is not None]
+        statuses: Dict[str, int] = {}
+        for s in samples:
+            statuses[s["status"]] = statuses.get(s["status"], 0) + 1
+        summary[site] = {
+            "calls": len(samples),
+            "errors": len(samples) - statuses.get("ok", 0),
+            "statuses": statuses,
+            "latency_p50": _percentile(latencies, 0.5),
+            "latency_p95": _percentile(latencies, 0.95),
+            "ttft_p50": _percentile(ttfts, 0.5) if ttfts else None,
+            "ttft_p95": _percentile(ttfts, 0.95) if ttfts else None,
+            "latency_histogram": [
+                sum(1 for value in latencies if _bucket_index(LATENCY_BUCKETS, value) == index)
+                for index in range(len(LATENCY_BUCKETS) + 1)
+            ],
+            "prompt_tokens": sum(s["prompt_tokens"] for s in samples),
+            "cached_prompt_tokens": sum(s["cached_prompt_tokens"] for s in samples),
+            "completion_tokens": sum(s["completion_tokens"] for s in samples),
+            "cost_usd": sum(s["cost_usd"] for s in samples),
+        }
+    return summary
+
+def _format_histogram(counts: List[int]) -> str:
+    labels = [f"≤{bound:g}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]:g}"]
+    return " ".join(f"{label}:{count}" for label, count in zip(labels, counts) if count)
+
+def format_ai_metrics() -> str:
+    """Текстовый отчёт для админ-команды /ai_stats: задержки, токены, стоимость и ошибки по местам вызова."""
+    metrics = get_ai_metrics()
+    lines = [f"📈 <b>Вызовы AI</b> (последние {AI_METRICS_WINDOW} на место вызова)"]
+    if not metrics:
+        lines.append("Вызовов пока не было.")
+        return "\n".join(lines)
+    total_cost = sum(site["cost_usd"] for site in metrics.values())
+    # Сначала самые дорогие места вызова
+    for site, stats in sorted(metrics.items(), key=lambda item: item[1]["cost_usd"], reverse=True):
+        share = stats["cost_usd"] / total_cost * 100 if total_cost else 0.0
+        ttft = f", первый токен p50 {stats['ttft_p50']:.2f} с" if stats["ttft_p50"] is not None else ""
+        errors = ", ".join(f"{status} {count}" for status, count in sorted(stats["statuses"].items()) if status != "ok")
+        lines.append(
+            f"\n<b>{site}</b>: {stats['calls']} вызовов, ошибок {stats['errors']}{f' ({errors})' if errors else ''}\n"
+            f"задержка p50 {stats['latency_p50']:.2f} с, p95 {stats['latency_p95']:.2f} с{ttft}\n"
+            f"гистограмма (с): {_format_histogram(stats['latency_histogram'])}\n"
+            f"токены: промпт {stats['prompt_tokens']} (из кэша {stats['cached_prompt_tokens']}), ответ {stats['completion_tokens']}\n"
+            f"стоимость ${stats['cost_usd']:.4f} ({share:.0f}%)"
+        )
+    lines.append(f"\nИтого: ${total_cost:.4f}")
+    return "\n".join(lines)
+
+def _histogram_lines(name: str, call_site: str, buckets: Sequence[float], counts: List[int], total_sum: float, total_count: int) -> List[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [float("inf")], counts):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+        lines.append(f'{name}_bucket{{call_site="{call_site}",le="{le}"}} {cumulative}')
+    lines.append(f'{name}_sum{{call_site="{call_site}"}} {total_sum:.6f}')
+    lines.append(f'{name}_count{{call_site="{call_site}"}} {total_count}')
+    return lines
+
+def render_prometheus_metrics() -> str:
+    """Накопительные метрики с запуска в текстовом формате Prometheus."""
+    with _lock:
+        totals = {site: {**stats, "statuses": dict(stats["statuses"])} for site, stats in _totals.items()}
+    lines = [
+        "# HELP ai_requests_total AI calls by call site and status.",
+        "# TYPE ai_requests_total counter",
+    ]
+    for site, stats in sorted(totals.items()):
+        for status, count in sorted(stats["statuses"].items()):
+            lines.append(f'ai_requests_total{{call_site="{site}",status="{status}"}} {count}')
+    lines += [
+        "# HELP ai_request_duration_seconds Wall latency of AI calls, including gateway queueing.",
+        "# TYPE ai_request_duration_seconds histogram",
+    ]
+    for site, stats in sorted(totals.items()):
+        lines += _histogram_lines("ai_request_duration_seconds", site, LATENCY_BUCKETS, stats["latency_buckets"], stats["latency_sum"], stats["latency_count"])
+    lines += [
+        "# HELP ai_time_to_first_token_seconds Time to first streamed token.",
+        "# TYPE ai_time_to_first_token_seconds histogram",
+    ]
+    for site, stats in sorted(totals.items()):
+        if stats["ttft_count"]:
+            lines += _histogram_lines("ai_time_to_first_token_seconds", site, TTFT_BUCKETS, stats["ttft_buckets"], stats["ttft_sum"], stats["ttft_count"])
+    lines += [
+        "# HELP ai_tokens_total Tokens reported in the usage block.",
+        "# TYPE ai_tokens_total counter",
+    ]
+    for site, stats in sorted(totals.items()):
+        lines.append(f'ai_tokens_total{{call_site="{site}",kind="prompt"}} {stats["prompt_tokens"]}')
+        lines.append(f'ai_tokens_total{{call_site="{site}",kind="prompt_cached"}} {stats["cached_prompt_tokens"]}')
+        lines.append(f'ai_tokens_total{{call_site="{site}",kind="completion"}} {stats["completion_tokens"]}')
+    lines += [
+        "# HELP ai_cost_usd_total Estimated AI cost in USD.",
+        "# TYPE ai_cost_usd_total counter",
+    ]
+    for site, stats in sorted(totals.items()):
+        lines.append(f'ai_cost_usd_total{{call_site="{site}"}} {stats["cost_usd"]:.6f}')
+    return "\n".join(lines) + "\n"
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_prometheus_metrics(), content_type="text/plain", charset="utf-8")
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    """Запускает HTTP-эндпоинт /metrics, если задан METRICS_PORT. Возвращает runner (для остановки) или None."""
+    if not METRICS_PORT:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, METRICS_HOST, int(METRICS_PORT)).start()
+    except (OSError, ValueError) as e:
+        logging.error(f"Не удалось запустить эндпоинт метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+        await runner.cleanup()
+        return None
+    logging.info(f"Эндпоинт метрик AI: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
@@ -0,0 +1,152 @@
+"""
+Годовой пакет календаря: данные дней (в формате calendar_data), заранее собранные
+скриптом scripts/build_calendar_bundle.py и сохранённые в одном файле SQLite с индексом по дате.
+
+get_calendar_data отдаёт день из пакета без обращения к сайтам и к кэшу календаря;
+сайты запрашиваются только для дат, которых в пакете нет. Записи пакета привязаны
+к версии парсера: после изменения CALENDAR_PARSER_VERSION пакет нужно пересобрать,
+а до тех пор его записи не отдаются.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv # type: ignore
+
+load_dotenv()
+
+CALENDAR_BUNDLE_FILE = os.getenv("CALENDAR_BUNDLE_FILE", "calendar_bundle.sqlite")
+
+_lock = threading.Lock()
+_connection: Optional[sqlite3.Connection] = None
+# Время изменения файла, с которым открыто соединение: после пересборки пакета переоткрываем
+_connection_mtime: Optional[float] = None
+_stats = {"hits": 0, "misses": 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    date TEXT PRIMARY KEY,
+    parser_version INTEGER NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def _get_connection() -> Optional[sqlite3.Connection]:
+    """Соединение только для чтения; None, если пакета нет."""
+    global _connection, _connection_mtime
+    try:
+        mtime = os.path.getmtime(CALENDAR_BUNDLE_FILE)
+    except OSError:
+        return None
+    if _connection is not None and _connection_mtime == mtime:
+        return _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+    try:
+        _connection = sqlite3.connect(f"file:{CALENDAR_BUNDLE_FILE}?mode=ro", uri=True, check_same_thread=False)
+        _connection_mtime = mtime
+        logging.info(f"Годовой пакет календаря открыт: {CALENDAR_BUNDLE_FILE}")
+    except sqlite3.Error as e:
+        logging.error(f"Не удалось открыть пакет календаря {CALENDAR_BUNDLE_FILE}: {e}")
+        _connection = None
+    return _connection
+
+def get_bundle_day(date_str: str, parser_version: int) -> Optional[Dict[str, Any]]:
+    """Данные дня 'YYYYMMDD' из пакета, если они собраны текущей версией парсера, иначе None."""
+    with _lock:
+        connection = _get_connection()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute(
+                "SELECT data FROM days WHERE date = ? AND parser_version = ?", (date_str, parser_version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка чтения пакета календаря для {date_str}: {e}")
+            return None
+        _stats["hits" if row else "misses"] += 1
+    return json.loads(row[0]) if row else None
+
+def has_bundle_day(date_str: str, parser_version: int) -> bool:
+    """Есть ли день в пакете (без учёта в статистике)."""
+    with _lock:
+        connection = _get_connection()
+        if connection is None:
+            return False
+        try:
+            return connection.execute(
+                "SELECT 1 FROM days WHERE date = ? AND parser_version = ?", (date_str, parser_version)
+            ).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+def iter_bundle_days(parser_version: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """Все дни пакета текущей версии парсера: [(дата, данные дня)] (для построения индексов)."""
+    with _lock:
+        connection = _get_connection()
+        if connection is None:
+            return []
+        try:
+            rows = connection.execute("SELECT date, data FROM days WHERE parser_version = ? ORDER BY date", (parser_version,)).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка чтения пакета календаря: {e}")
+            return []
+    return [(date_str, json.loads(data)) for date_str, data in rows]
+
+def write_bundle(days: Iterable[Tuple[str, Dict[str, Any]]], parser_version: int, path: str = CALENDAR_BUNDLE_FILE) -> int:
+    """
+    Записывает дни в пакет (добавляет к уже имеющимся, существующие даты заменяет).
+    Запись идёт во временную копию, которая затем атомарно заменяет файл пакета.
+
+    :return: Сколько дней записано.
+    """
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript(SCHEMA)
+        if os.path.exists(path):
+            connection.execute("ATTACH DATABASE ? AS old", (path,))
+            connection.execute("INSERT INTO days SELECT * FROM old.days")
+            connection.commit()
+            connection.execute("DETACH DATABASE old")
+        written = 0
+        for date_str, data in days:
+            connection.execute(
+                "INSERT OR REPLACE INTO days (date, parser_version, data) VALUES (?, ?, ?)",
+                (date_str, parser_version, json.dumps(data, ensure_ascii=False, separators=(",", ":"))),
+            )
+            written += 1
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_at', ?)", (str(time.time()),))
+        connection.commit()
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    os.replace(tmp_path, path)
+    return written
+
+def get_calendar_bundle_stats(parser_version: int) -> Dict[str, Any]:
+    """Статистика пакета: дней текущей версии парсера, период, дата сборки, попадания и промахи."""
+    with _lock:
+        stats: Dict[str, Any] = {"days": 0, "first": None, "last": None, "built_at": None, **_stats}
+        connection = _get_connection()
+        if connection is None:
+            return stats
+        try:
+            stats["days"], stats["first"], stats["last"] = connection.execute(
+                "SELECT COUNT(*), MIN(date), MAX(date) FROM days WHERE parser_version = ?", (parser_version,)
+            ).fetchone()
+            row = connection.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+            stats["built_at"] = float(row[0]) if row else None
+        except sqlite3.Error as e:
+            logging.error(f"Ошибка чтения статистики пакета календаря: {e}")
+        return stats
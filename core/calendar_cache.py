@@ -0,0 +1,209 @@
+"""
+Постоянный кэш православного календаря на диске (переживает перезапуск бота).
+
+Два слоя:
+- данные дня (словарь calendar_data) по дате 'YYYYMMDD' с версией парсера:
+  после изменения парсеров (CALENDAR_PARSER_VERSION) старые записи не отдаются,
+  а пересобираются из сохранённого HTML без повторного скачивания;
+- исходный HTML страниц azbyka.ru и pravoslavie.ru (сжатый gzip) по URL.
+
+Оба слоя ограничены по размеру: при переполнении вытесняются записи,
+к которым дольше всего не обращались (LRU). Устаревшие данные дня
+не удаляются сразу — их можно отдать, если сайты недоступны.
+"""
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv # type: ignore
+
+load_dotenv()
+
+CALENDAR_CACHE_DIR = "calendar_cache"
+CALENDAR_CACHE_INDEX_FILE = os.path.join(CALENDAR_CACHE_DIR, "index.json")
+CALENDAR_CACHE_HTML_DIR = os.path.join(CALENDAR_CACHE_DIR, "html")
+# Версия формата index.json; при несовпадении кэш начинается заново
+CALENDAR_CACHE_FORMAT_VERSION = 1
+
+# Сколько дней и HTML-страниц хранить (на каждый день — две страницы)
+CALENDAR_CACHE_MAX_DAYS = int(os.getenv("CALENDAR_CACHE_MAX_DAYS", "120"))
+CALENDAR_CACHE_MAX_PAGES = int(os.getenv("CALENDAR_CACHE_MAX_PAGES", str(2 * CALENDAR_CACHE_MAX_DAYS)))
+# Срок свежести данных дня (ч): полных — из обоих источников, неполных — если один сайт не ответил
+CALENDAR_CACHE_TTL_HOURS = float(os.getenv("CALENDAR_CACHE_TTL_HOURS", "168"))
+CALENDAR_CACHE_PARTIAL_TTL_HOURS = float(os.getenv("CALENDAR_CACHE_PARTIAL_TTL_HOURS", "1"))
+
+_lock = threading.RLock()
+_days: Dict[str, Dict[str, Any]] = {}
+_pages: Dict[str, Dict[str, Any]] = {}
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "rederived": 0, "shared": 0}
+
+def _load_index() -> None:
+    global _days, _pages
+    with _lock:
+        _days, _pages = {}, {}
+        if not os.path.exists(CALENDAR_CACHE_INDEX_FILE):
+            return
+        try:
+            with open(CALENDAR_CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get("format") != CALENDAR_CACHE_FORMAT_VERSION:
+                logging.info("Кэш календаря: формат изменился, начинаем с пустого кэша")
+                return
+            _days = data.get("days", {})
+            _pages = data.get("pages", {})
+            logging.info(f"Кэш календаря загружен: дней {len(_days)}, страниц {len(_pages)}")
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке кэша календаря: {e}", exc_info=True)
+
+def _save_index() -> None:
+    with _lock:
+        try:
+            os.makedirs(CALENDAR_CACHE_DIR, exist_ok=True)
+            tmp_path = CALENDAR_CACHE_INDEX_FILE + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"format": CALENDAR_CACHE_FORMAT_VERSION, "days": _days, "pages": _pages}, f, ensure_ascii=False)
+            os.replace(tmp_path, CALENDAR_CACHE_INDEX_FILE)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении кэша календаря: {e}", exc_info=True)
+
+def _page_path(url: str) -> str:
+    return os.path.join(CALENDAR_CACHE_HTML_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".html.gz")
+
+def _evict() -> None:
+    """Вытесняет давно не запрошенные дни и страницы сверх лимитов (LRU)."""
+    with _lock:
+        if len(_days) > CALENDAR_CACHE_MAX_DAYS:
+            by_access = sorted(_days, key=lambda key: _days[key].get("last_access", 0))
+            for date_str in by_access[:len(_days) - CALENDAR_CACHE_MAX_DAYS]:
+                _days.pop(date_str, None)
+        if len(_pages) > CALENDAR_CACHE_MAX_PAGES:
+            by_access = sorted(_pages, key=lambda key: _pages[key].get("last_access", 0))
+            for url in by_access[:len(_pages) - CALENDAR_CACHE_MAX_PAGES]:
+                _pages.pop(url, None)
+                try:
+                    os.remove(_page_path(url))
+                except OSError:
+                    pass
+
+def is_fresh(date_str: str, parser_version: int) -> bool:
+    """Есть ли для даты свежие данные, собранные текущей версией парсера."""
+    with _lock:
+        entry = _days.get(date_str)
+        return bool(entry) and entry.get("parser_version") == parser_version and entry.get("expires_at", 0) > time.time()
+
+def get_day_expiry(date_str: str, parser_version: int) -> Optional[float]:
+    """Когда истекает свежесть данных дня (time.time()), или None, если записи текущей версии парсера нет."""
+    with _lock:
+        entry = _days.get(date_str)
+        if not entry or entry.get("parser_version") != parser_version:
+            return None
+        return entry.get("expires_at", 0)
+
+def get_cached_day(date_str: str, parser_version: int, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Данные дня из кэша, если они собраны текущей версией парсера.
+
+    :param allow_stale: Отдавать и устаревшие данные (когда сайты недоступны).
+    """
+    with _lock:
+        entry = _days.get(date_str)
+        if not entry or entry.get("parser_version") != parser_version:
+            _stats["misses"] += 1
+            return None
+        fresh = entry.get("expires_at", 0) > time.time()
+        if not fresh and not allow_stale:
+            _stats["misses"] += 1
+            return None
+        entry["last_access"] = time.time()
+        _stats["hits" if fresh else "stale_hits"] += 1
+        return entry["data"]
+
+def iter_cached_days(parser_version: int) -> list:
+    """Все дни кэша, собранные текущей версией парсера (включая устаревшие): [(дата, данные дня)]."""
+    with _lock:
+        return [(date_str, entry["data"]) for date_str, entry in _days.items() if entry.get("parser_version") == parser_version]
+
+def get_day_sources(date_str: str) -> Dict[str, Optional[str]]:
+    """URL страниц, из которых собраны данные дня (для пересборки после смены версии парсера)."""
+    with _lock:
+        entry = _days.get(date_str)
+        return dict(entry.get("sources", {})) if entry else {}
+
+def store_day(date_str: str, data: Dict[str, Any], parser_version: int, sources: Dict[str, Optional[str]], complete: bool) -> None:
+    """
+    Сохраняет данные дня.
+
+    :param sources: Имя источника -> URL страницы (None, если страница не получена).
+    :param complete: Ответили оба источника; неполные данные хранятся CALENDAR_CACHE_PARTIAL_TTL_HOURS.
+    """
+    ttl_hours = CALENDAR_CACHE_TTL_HOURS if complete else CALENDAR_CACHE_PARTIAL_TTL_HOURS
+    now = time.time()
+    with _lock:
+        _days[date_str] = {
+            "data": data,
+            "parser_version": parser_version,
+            "sources": sources,
+            "complete": complete,
+            "fetched_at": now,
+            "expires_at": now + ttl_hours * 3600,
+            "last_access": now,
+        }
+        _evict()
+        _save_index()
+
+def mark_rederived() -> None:
+    """Учитывает в статистике пересборку данных дня из сохранённого HTML."""
+    with _lock:
+        _stats["rederived"] += 1
+
+def mark_shared_fetch() -> None:
+    """Учитывает в статистике запрос, дождавшийся уже идущего скачивания той же даты."""
+    with _lock:
+        _stats["shared"] += 1
+
+def get_page_html(url: str) -> Optional[str]:
+    """Сохранённый HTML страницы или None."""
+    with _lock:
+        meta = _pages.get(url)
+        if not meta:
+            return None
+        meta["last_access"] = time.time()
+    try:
+        with gzip.open(_page_path(url), 'rt', encoding='utf-8') as f:
+            return f.read()
+    except OSError as e:
+        logging.warning(f"Кэш календаря: не удалось прочитать HTML {url}: {e}")
+        with _lock:
+            _pages.pop(url, None)
+        return None
+
+def store_page_html(url: str, html_content: str) -> None:
+    """Сохраняет HTML страницы (индекс записывается вместе со следующими данными дня)."""
+    try:
+        os.makedirs(CALENDAR_CACHE_HTML_DIR, exist_ok=True)
+        with gzip.open(_page_path(url), 'wt', encoding='utf-8') as f:
+            f.write(html_content)
+    except OSError as e:
+        logging.warning(f"Кэш календаря: не удалось сохранить HTML {url}: {e}")
+        return
+    now = time.time()
+    with _lock:
+        _pages[url] = {"fetched_at": now, "last_access": now, "size": len(html_content)}
+
+def get_calendar_cache_stats() -> Dict[str, Any]:
+    """Статистика кэша календаря: число дней и страниц, попадания и промахи."""
+    with _lock:
+        now = time.time()
+        return {
+            "days": len(_days),
+            "fresh_days": sum(1 for entry in _days.values() if entry.get("expires_at", 0) > now),
+            "pages": len(_pages),
+            "html_bytes": sum(meta.get("size", 0) for meta in _pages.values()),
+            **_stats,
+        }
+
+_load_index()
@@ -1,24 +1,48 @@
-from datetime import datetime, timedelta
-from utils.html_parser import fetch_html_content, parse_pravoslavie_calendar_page, parse_azbyka_calendar_page
+import os
+import time
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional
+from utils.html_parser import fetch_url, get_http_cache_stats, parse_pravoslavie_calendar_page, parse_azbyka_calendar_page, CALENDAR_PARSER_VERSION
+from core.cpu_offload import run_cpu
+from core.nameday_index import rebuild_nameday_index
+from core.calendar_render import get_calendar_render_stats
+from core.calendar_bundle import get_bundle_day, get_calendar_bundle_stats, has_bundle_day
+from core.calendar_cache import get_cached_day, get_calendar_cache_stats, get_day_expiry, get_day_sources, get_page_html, is_fresh, mark_rederived, mark_shared_fetch, store_day, store_page_html
 
 # core/calendar_data.py
-# Этот файл будет хранить кэшированные данные православного календаря.
-
-cached_calendar_data = {}
-
-def clear_calendar_cache():
-    """Очищает кэш календаря (вызвать при старте бота, чтобы сбросить старые данные с image_url)."""
-    cached_calendar_data.clear()
+# Получение данных православного календаря; кэш на диске — в core/calendar_cache.py.
 
 PRAVOSLAVIE_BASE_URL = "https://days.pravoslavie.ru/Days/"
 AZBYKA_BASE_URL = "https://azbyka.ru/days/"
 
-def convert_new_style_to_old_style(date_obj: datetime) -> datetime:
-    """
-    Конвертирует дату из нового стиля в старый стиль.
-    Разница между стилями зависит от века.
-    """
-    year = date_obj.year
+# Заглушки, если ни один источник не дал ни праздников, ни именин
+NO_HOLIDAYS_TEXT = "Сегодня больших праздников не найдено."
+NO_NAMEDAYS_TEXT = "Сегодня именин не найдено."
+
+# Общий срок (с) на скачивание обеих страниц; что не успело — не ждём
+CALENDAR_FETCH_DEADLINE_SECONDS = float(os.getenv("CALENDAR_FETCH_DEADLINE_SECONDS", "20"))
+
+# Колбэк для частичных данных: получает данные дня, как только готовы обязательные поля
+PartialCallback = Callable[[dict], Awaitable[None]]
+
+# Предзагрузка ближайших дней в ночные часы: сколько дней вперёд (включая сегодня),
+# сколько дней качать одновременно и пауза после каждого дня — чтобы не нагружать сайты
+CALENDAR_PREFETCH_DAYS = max(1, min(60, int(os.getenv("CALENDAR_PREFETCH_DAYS", "14"))))
+CALENDAR_PREFETCH_CONCURRENCY = max(1, int(os.getenv("CALENDAR_PREFETCH_CONCURRENCY", "2")))
+CALENDAR_PREFETCH_PAUSE_SECONDS = float(os.getenv("CALENDAR_PREFETCH_PAUSE_SECONDS", "2"))
+# Данные, свежесть которых истекает раньше этого срока (ч), предзагрузка обновляет заранее
+CALENDAR_PREFETCH_REFRESH_HOURS = float(os.getenv("CALENDAR_PREFETCH_REFRESH_HOURS", "24"))
+
+_last_prefetch_report: Dict[str, Any] = {}
+
+# Идущие скачивания по дате: одновременные промахи кэша для одной даты ждут одно скачивание
+_inflight_fetches: Dict[str, Dict[str, Any]] = {}
+
+def julian_calendar_offset(year: int) -> int:
+    """Разница между новым и старым стилем (дней) в указанном году; зависит от века."""
     if 1582 <= year <= 1699:
         delta = 10
     elif 1700 <= year <= 1799:
@@ -32,24 +56,287 @@ def convert_new_style_to_old_style(date_obj: datetime) -> datetime:
     else:
         # Для дат вне этих диапазонов, используем дельту 13 как наиболее распространенную
         delta = 13 
-    
-    return date_obj - timedelta(days=delta)
+    return delta
 
-async def fetch_and_cache_calendar_data(date_str: str):
+def convert_new_style_to_old_style(date_obj: datetime) -> datetime:
     """
-    Извлекает данные календаря с azbyka.ru, а затем с pravoslavie.ru (если необходимо) и кэширует их.
-    date_str должен быть в формате 'YYYYMMDD'.
+    Конвертирует дату из нового стиля в старый стиль.
+    Разница между стилями зависит от века.
+    """
+    return date_obj - timedelta(days=julian_calendar_offset(date_obj.year))
+
+# --- Пасхалия: расчёт дня без обращения к сайтам ---
+# Всё выводится из даты Пасхи (по юлианской пасхалии) и неподвижных дат по старому стилю.
+# Даты — объекты date нового стиля; «смещение» — число дней от Пасхи того же года.
+
+# Подвижные праздники и памятные дни: смещение от Пасхи -> название
+MOVABLE_FEASTS = {
+    -70: "Неделя о мытаре и фарисее",
+    -63: "Неделя о блудном сыне",
+    -57: "Вселенская родительская (мясопустная) суббота",
+    -56: "Неделя мясопустная, о Страшном Суде",
+    -49: "Прощёное воскресенье (Неделя сыропустная)",
+    -48: "Чистый понедельник — начало Великого поста",
+    -42: "Торжество Православия",
+    -28: "Неделя Крестопоклонная",
+    -8: "Лазарева суббота",
+    -7: "Вход Господень в Иерусалим (Вербное воскресенье)",
+    -3: "Великий четверг",
+    -2: "Великая пятница",
+    -1: "Великая суббота",
+    0: "Светлое Христово Воскресение (Пасха)",
+    7: "Антипасха (Фомино воскресенье)",
+    9: "Радоница",
+    14: "Неделя жен-мироносиц",
+    24: "Преполовение Пятидесятницы",
+    39: "Вознесение Господне",
+    48: "Троицкая родительская суббота",
+    49: "День Святой Троицы (Пятидесятница)",
+    50: "День Святого Духа",
+    56: "Неделя всех святых",
+    63: "Неделя всех святых, в земле Русской просиявших",
+}
+
+# Великие неподвижные праздники: (месяц, день) по старому стилю -> название
+FIXED_FEASTS = {
+    (1, 1): "Обрезание Господне",
+    (1, 6): "Крещение Господне (Богоявление)",
+    (2, 2): "Сретение Господне",
+    (3, 25): "Благовещение Пресвятой Богородицы",
+    (6, 24): "Рождество Иоанна Предтечи",
+    (6, 29): "Апостолов Петра и Павла",
+    (8, 6): "Преображение Господне",
+    (8, 15): "Успение Пресвятой Богородицы",
+    (8, 29): "Усекновение главы Иоанна Предтечи",
+    (9, 8): "Рождество Пресвятой Богородицы",
+    (9, 14): "Воздвижение Креста Господня",
+    (10, 1): "Покров Пресвятой Богородицы",
+    (11, 21): "Введение во храм Пресвятой Богородицы",
+    (12, 25): "Рождество Христово",
+}
+
+# Однодневные посты: (месяц, день) по старому стилю -> название
+ONE_DAY_FASTS = {
+    (1, 5): "Крещенский сочельник",
+    (8, 29): "Усекновение главы Иоанна Предтечи",
+    (9, 14): "Воздвижение Креста Господня",
+}
+
+# Праздники, в которые пост ослабляется (разрешается рыба) — в среду, пятницу и в многодневный пост:
+# (месяц, день) по старому стилю. Воздвижение и Усекновение — постные дни (ONE_DAY_FASTS)
+FISH_FEAST_DAYS = {(2, 2), (3, 25), (6, 24), (6, 29), (8, 6), (8, 15), (9, 8), (10, 1), (11, 21)}
+# То же для переходящих праздников: смещение от Пасхи (Вход Господень в Иерусалим)
+FISH_FEAST_SHIFTS = {-7}
+
+# Сплошные седмицы (без поста в среду и пятницу): смещения от Пасхи, включительно
+FAST_FREE_WEEKS = ((-69, -64), (1, 6), (50, 55))
+
+WEEKDAY_NAMES = ("понедельник", "вторник", "среда", "четверг", "пятница", "суббота", "воскресенье")
+MONTH_NAMES_GENITIVE = ("января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября", "октября", "ноября", "декабря")
+
+def julian_pascha(year: int) -> date:
+    """Дата Пасхи по юлианской пасхалии (в новом стиле)."""
+    a, b, c = year % 4, year % 7, year % 19
+    d = (19 * c + 15) % 30
+    e = (2 * a + 4 * b - d + 34) % 7
+    month, day = divmod(d + e + 114, 31)
+    return date(year, month, day + 1) + timedelta(days=julian_calendar_offset(year))
+
+def _old_style_key(day: date) -> tuple:
+    old = convert_new_style_to_old_style(day)
+    return old.month, old.day
+
+def _in_old_style_range(day: date, start: tuple, end: tuple) -> bool:
+    key = _old_style_key(day)
+    return start <= key <= end if start <= end else key >= start or key <= end
+
+def _pascha_offset(day: date) -> tuple:
+    """(Пасха, смещение) для пасхального круга, к которому относится день: новый круг начинается с Недели о мытаре и фарисее."""
+    pascha = julian_pascha(day.year)
+    if (day - pascha).days < -70:
+        pascha = julian_pascha(day.year - 1)
+    return pascha, (day - pascha).days
+
+def get_paschalion(year: int) -> Dict[str, Any]:
+    """
+    Пасхалия на год: Пасха, подвижные праздники и четыре многодневных поста (новый стиль).
+    Рождественский пост — тот, что начинается в этом году (заканчивается в январе следующего).
+    """
+    pascha = julian_pascha(year)
+    offset = timedelta(days=julian_calendar_offset(year))
+    return {
+        "pascha": pascha,
+        "feasts": [(pascha + timedelta(days=shift), name) for shift, name in sorted(MOVABLE_FEASTS.items())],
+        "fasts": [
+            ("Великий пост", pascha - timedelta(days=48), pascha - timedelta(days=1)),
+            ("Петров пост", pascha + timedelta(days=57), date(year, 6, 28) + offset),
+            ("Успенский пост", date(year, 8, 1) + offset, date(year, 8, 14) + offset),
+            ("Рождественский пост", date(year, 11, 15) + offset, date(year, 12, 24) + offset),
+        ],
+    }
+
+def get_day_feasts(day: date) -> list:
+    """Подвижные и великие неподвижные праздники дня."""
+    feasts = []
+    pascha, shift = _pascha_offset(day)
+    if shift in MOVABLE_FEASTS:
+        feasts.append(MOVABLE_FEASTS[shift])
+    if _old_style_key(day) in FIXED_FEASTS:
+        feasts.append(FIXED_FEASTS[_old_style_key(day)])
+    return feasts
+
+def get_fasting_info(day: date) -> str:
+    """
+    Пост в этот день по уставу: многодневные и однодневные посты, сплошные седмицы, среда и пятница.
+    Праздничные послабления проверяются раньше правила среды и пятницы: на Богоявление поста нет,
+    в великие праздники (FISH_FEAST_DAYS) пост ослабляется до рыбы.
+    """
+    pascha, shift = _pascha_offset(day)
+    key = _old_style_key(day)
+    # Великая пятница и суббота не ослабляются даже на Благовещение
+    fish_feast = (key in FISH_FEAST_DAYS or shift in FISH_FEAST_SHIFTS) and shift not in (-2, -1)
+    if _in_old_style_range(day, (12, 25), (1, 4)):
+        return "Святки — поста нет."
+    if key == (1, 5):
+        return "Крещенский сочельник — строгий пост."
+    if key == (1, 6):
+        return "Крещение Господне — поста нет."
+    if -48 <= shift <= -1:
+        fast = "Великий пост, Страстная седмица" if shift >= -6 else "Великий пост"
+        return f"{fast}: праздник, разрешается рыба." if fish_feast else f"{fast}."
+    if any(start <= shift <= end for start, end in FAST_FREE_WEEKS):
+        return "Сплошная седмица — поста нет."
+    if -55 <= shift <= -49:
+        return "Сырная седмица (Масленица): мясо не вкушают."
+    for fast, in_fast in (
+        ("Петров пост", 57 <= shift and _in_old_style_range(day, (5, 1), (6, 28))),
+        ("Успенский пост", _in_old_style_range(day, (8, 1), (8, 14))),
+        ("Рождественский пост", _in_old_style_range(day, (11, 15), (12, 24))),
+    ):
+        if in_fast:
+            return f"{fast}: праздник, разрешается рыба." if fish_feast else f"{fast}."
+    if key in ONE_DAY_FASTS:
+        return f"Постный день: {ONE_DAY_FASTS[key]}."
+    if day.weekday() in (2, 4):
+        if fish_feast:
+            feast = FIXED_FEASTS.get(key) or MOVABLE_FEASTS.get(shift)
+            weekday = "среду" if day.weekday() == 2 else "пятницу"
+            return f"{feast}: пост в {weekday} ослаблен, разрешается рыба."
+        return f"Постный день ({WEEKDAY_NAMES[day.weekday()]})."
+    return "Поста нет."
+
+def _tone(day: date) -> int | None:
+    """Глас седмицы: от Антипасхи по кругу из восьми, до Лазаревой субботы следующего года."""
+    pascha = julian_pascha(day.year)
+    if (day - pascha).days < -7:
+        pascha = julian_pascha(day.year - 1)
+    shift = (day - pascha).days
+    if shift < 7:
+        return None
+    return (shift - 7) // 7 % 8 + 1
+
+def get_week_info(day: date) -> str:
+    """Название седмицы (или недели — воскресенья) по пасхальному кругу и глас."""
+    pascha, shift = _pascha_offset(day)
+    is_sunday = day.weekday() == 6
+    if -70 <= shift < -48:
+        names = {-70: "Неделя о мытаре и фарисее", -63: "Неделя о блудном сыне", -56: "Неделя мясопустная", -49: "Неделя сыропустная"}
+        weeks = ("Седмица о мытаре и фарисее", "Седмица о блудном сыне", "Сырная седмица (Масленица)")
+        week = names.get(shift) or weeks[(shift + 70) // 7]
+    elif shift < -6:
+        number = (shift + 49) // 7
+        week = f"Неделя {number}-я Великого поста" if is_sunday else f"Седмица {number + 1}-я Великого поста"
+    elif shift < 0:
+        week = "Страстная седмица"
+    elif shift == 0:
+        week = "Светлое Христово Воскресение"
+    elif shift < 49:
+        number = (shift - 1) // 7 + 1
+        if is_sunday:
+            week = f"Неделя {number + 1}-я по Пасхе"
+        else:
+            week = "Светлая седмица" if number == 1 else f"Седмица {number}-я по Пасхе"
+    elif shift == 49:
+        week = "День Святой Троицы"
+    else:
+        number = (shift - 50) // 7 + 1
+        week = f"Неделя {shift // 7 - 7}-я по Пятидесятнице" if is_sunday else f"Седмица {number}-я по Пятидесятнице"
+    tone = _tone(day)
+    return f"{week}. Глас {tone}." if tone else f"{week}."
+
+def compute_calendar_day(day: date) -> dict:
+    """
+    Данные дня в формате calendar_data, рассчитанные без сети: праздники из пасхалии,
+    пост и седмица. Именин и мыслей Феофана здесь нет — их дают только сайты.
+    """
+    return {
+        "holidays": get_day_feasts(day) or [NO_HOLIDAYS_TEXT],
+        "namedays": [NO_NAMEDAYS_TEXT],
+        "fasting": get_fasting_info(day),
+        "week_info": get_week_info(day),
+        "image_url": None,
+        "theophan_thoughts": [],
+    }
+
+def _format_day(day: date, with_year: bool = True) -> str:
+    text = f"{day.day} {MONTH_NAMES_GENITIVE[day.month - 1]}"
+    return f"{text} {day.year}" if with_year else text
+
+@lru_cache(maxsize=4)
+def format_paschalion_prompt(today: date) -> str:
+    """Секция «calendar» системного промпта: сегодняшний день и даты года, рассчитанные по пасхалии."""
+    year = today.year
+    paschalion = get_paschalion(year)
+    pascha = paschalion["pascha"]
+    fasts = {name: (start, end) for name, start, end in paschalion["fasts"]}
+    great_lent, petrov, uspensky, nativity = (fasts[name] for name in ("Великий пост", "Петров пост", "Успенский пост", "Рождественский пост"))
+    return f"""[CURRENT DATE & CONTEXT]
+Сегодня: {_format_day(today)} года, {WEEKDAY_NAMES[today.weekday()]}. Текущий год: {year}.
+{get_week_info(today)} {get_fasting_info(today)}
+
+[ORTHODOX CALENDAR {year} - ВАЖНЫЕ ДАТЫ]
+**КРИТИЧЕСКИ ВАЖНО:** Используй ТОЛЬКО эти даты для православного календаря {year} года (новый стиль, рассчитаны по пасхалии):
+
+**Великий пост {year}:** {_format_day(great_lent[0], False)} - {_format_day(great_lent[1])} года (48 дней)
+- Чистый понедельник (начало поста): {_format_day(great_lent[0])}
+- Великая суббота (конец поста): {_format_day(great_lent[1])}
+
+**Пасха (Светлое Христово Воскресение) {year}:** {_format_day(pascha)} года (воскресенье)
+
+**Вербное воскресенье {year}:** {_format_day(pascha - timedelta(days=7))} года (за неделю до Пасхи)
+
+**Страстная седмица {year}:** {(pascha - timedelta(days=6)).day}-{_format_day(pascha - timedelta(days=1))} года (неделя перед Пасхой)
+
+**Вознесение Господне {year}:** {_format_day(pascha + timedelta(days=39))} года
+
+**Троица (Пятидесятница) {year}:** {_format_day(pascha + timedelta(days=49))} года (через 50 дней после Пасхи)
+
+**Петров пост {year}:** {_format_day(petrov[0], False)} - {_format_day(petrov[1])} года
+
+**Успенский пост {year}:** {uspensky[0].day}-{_format_day(uspensky[1])} года
+
+**Рождественский пост {year}-{year + 1}:** {_format_day(nativity[0])} - {_format_day(nativity[1])} года
+
+**Рождество Христово:** {_format_day(nativity[1] + timedelta(days=1))} года
+
+**Пасха {year + 1}:** {_format_day(julian_pascha(year + 1))} года
+
+НИКОГДА не используй даты из прошлых лет при ответах о православных праздниках и постах."""
+
+def get_source_urls(date_str: str) -> dict:
+    """URL страниц дня: azbyka.ru (новый стиль) и pravoslavie.ru (адрес по старому стилю)."""
+    current_date_obj = datetime.strptime(date_str, "%Y%m%d")
+    old_style_date_str = convert_new_style_to_old_style(current_date_obj).strftime("%Y%m%d")
+    return {
+        "azbyka": f"{AZBYKA_BASE_URL}{current_date_obj.year}-{current_date_obj.month:02d}-{current_date_obj.day:02d}/",
+        "pravoslavie": f"{PRAVOSLAVIE_BASE_URL}{old_style_date_str}.html",
+    }
+
+def build_calendar_data(date_str: str, azbyka_html_content: str | None, pravoslavie_html_content: str | None) -> dict | None:
+    """
+    Собирает данные календаря из HTML страниц: основа — azbyka.ru, pravoslavie.ru дополняет
+    (мысли Феофана и пустые поля). Возвращает None, если нет ни одной страницы.
     """
-    year = int(date_str[:4])
-    month = int(date_str[4:6])
-    day = int(date_str[6:])
-    
-    current_date_obj = datetime(year, month, day)
-    
-    # Попытка получить данные с azbyka.ru (всегда по новому стилю)
-    azbyka_url = f"{AZBYKA_BASE_URL}{year}-{month:02d}-{day:02d}/"
-    azbyka_html_content = await fetch_html_content(azbyka_url)
-    
     final_calendar_data = {
         "holidays": [],
         "namedays": [],
@@ -64,20 +351,14 @@ async def fetch_and_cache_calendar_data(date_str: str):
         if azbyka_data and (azbyka_data["holidays"] or azbyka_data["namedays"] or azbyka_data["fasting"] != "Поста нет." or azbyka_data["week_info"]):
             final_calendar_data.update(azbyka_data)
             print(f"INFO: Данные получены из Azbyka.ru для {date_str}")
-    
-    # Всегда пытаемся получить данные с pravoslavie.ru для дополнения (theophan_thoughts и др.)
-    # image_url с pravoslavie.ru не используем — избегаем претензий по авторским правам
-    old_style_date_obj = convert_new_style_to_old_style(current_date_obj)
-    old_style_date_str = old_style_date_obj.strftime("%Y%m%d")
-    pravoslavie_new_style_equivalent_url = f"{PRAVOSLAVIE_BASE_URL}{old_style_date_str}.html"
-    pravoslavie_new_style_equivalent_html_content = await fetch_html_content(pravoslavie_new_style_equivalent_url)
 
-    if not azbyka_html_content and not pravoslavie_new_style_equivalent_html_content:
+    if not azbyka_html_content and not pravoslavie_html_content:
         print(f"ERROR: Не удалось получить данные календаря для {date_str} (оба источника недоступны).")
         return None
 
-    if pravoslavie_new_style_equivalent_html_content:
-        pravoslavie_data = parse_pravoslavie_calendar_page(pravoslavie_new_style_equivalent_html_content)
+    # image_url с pravoslavie.ru не используем — избегаем претензий по авторским правам
+    if pravoslavie_html_content:
+        pravoslavie_data = parse_pravoslavie_calendar_page(pravoslavie_html_content)
         if pravoslavie_data:
             # Приоритет для theophan_thoughts из pravoslavie.ru (image_url не берём — парсеры его не возвращают)
             if pravoslavie_data.get("theophan_thoughts"):
@@ -95,25 +376,316 @@ async def fetch_and_cache_calendar_data(date_str: str):
             
             print(f"INFO: Данные дополнены из Pravoslavie.ru для {date_str}")
 
+    # Пост и седмицу, которых не нашлось на страницах, берём из пасхалии
+    computed_day = date(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:]))
+    if final_calendar_data["fasting"] in ("Информация о посте не найдена.", ""):
+        final_calendar_data["fasting"] = get_fasting_info(computed_day)
+    if final_calendar_data["week_info"] in ("Информация о седмице не найдена.", ""):
+        final_calendar_data["week_info"] = get_week_info(computed_day)
+
     # Если после всех попыток нет праздников и именин, устанавливаем значения по умолчанию
     if not final_calendar_data["holidays"] and not final_calendar_data["namedays"]:
-        final_calendar_data["holidays"] = ["Сегодня больших праздников не найдено."]
-        final_calendar_data["namedays"] = ["Сегодня именин не найдено."]
+        final_calendar_data["holidays"] = [NO_HOLIDAYS_TEXT]
+        final_calendar_data["namedays"] = [NO_NAMEDAYS_TEXT]
 
     # image_url всегда None — не парсим и не скачиваем изображения с сайтов, используем локальные из daily_word
     final_calendar_data["image_url"] = None
-
-    cached_calendar_data[date_str] = final_calendar_data
     return final_calendar_data
 
+def has_mandatory_fields(calendar_data: dict | None) -> bool:
+    """Есть ли в данных основное содержимое дня (праздники или именины, пост или седмица) — его уже можно показать."""
+    if not calendar_data:
+        return False
+    holidays = [h for h in calendar_data.get("holidays", []) if h != NO_HOLIDAYS_TEXT]
+    namedays = [n for n in calendar_data.get("namedays", []) if n != NO_NAMEDAYS_TEXT]
+    has_day = bool(holidays or namedays)
+    has_details = (
+        calendar_data.get("fasting", "Информация о посте не найдена.") != "Информация о посте не найдена."
+        or (bool(calendar_data.get("week_info")) and calendar_data.get("week_info") != "Информация о седмице не найдена.")
+    )
+    return has_day and has_details
+
+async def fetch_and_cache_calendar_data(date_str: str, on_partial: Optional[PartialCallback] = None):
+    """
+    Скачивает страницы azbyka.ru и pravoslavie.ru параллельно (общий срок CALENDAR_FETCH_DEADLINE_SECONDS),
+    собирает данные календаря и сохраняет в кэш на диске (и данные, и исходный HTML).
+    date_str должен быть в формате 'YYYYMMDD'.
+    Если оба сайта недоступны, отдаёт устаревшие данные из кэша, если они есть.
+
+    :param on_partial: Вызывается один раз, если azbyka.ru ответила раньше pravoslavie.ru и обязательные
+                       поля уже есть: обработчик может показать календарь, не дожидаясь мыслей Феофана.
+    """
+    urls = get_source_urls(date_str)
+    pages: dict = {"azbyka": None, "pravoslavie": None}
+    # Источники, ответившие 304 (страница не изменилась с прошлого запроса)
+    not_modified: set = set()
+    tasks = {asyncio.create_task(fetch_url(url)): name for name, url in urls.items()}
+    pending = set(tasks)
+    partial_sent = False
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CALENDAR_FETCH_DEADLINE_SECONDS
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result() if not task.exception() else None
+                pages[tasks[task]] = result.text if result else None
+                if result and result.not_modified:
+                    not_modified.add(tasks[task])
+            # Обязательные поля даёт azbyka.ru; pravoslavie.ru дополняет мыслями Феофана позже
+            if on_partial and not partial_sent and pending and pages["azbyka"]:
+                partial_data = await run_cpu(build_calendar_data, date_str, pages["azbyka"], None)
+                if has_mandatory_fields(partial_data):
+                    partial_sent = True
+                    try:
+                        await on_partial(partial_data)
+                    except Exception as e:
+                        logging.error(f"Ошибка при показе частичных данных календаря для {date_str}: {e}")
+    finally:
+        for task in pending:
+            task.cancel()
+    if pending:
+        late_sources = ", ".join(tasks[task] for task in pending)
+        logging.warning(f"Не дождались источников календаря для {date_str} за {CALENDAR_FETCH_DEADLINE_SECONDS:g} с: {late_sources}")
+    azbyka_html_content = pages["azbyka"]
+    pravoslavie_html_content = pages["pravoslavie"]
+
+    # Обе страницы не изменились — данные дня, собранные из них раньше, верны: продлеваем их без разбора
+    if not_modified == set(urls) and get_day_sources(date_str) == urls:
+        previous = get_cached_day(date_str, CALENDAR_PARSER_VERSION, allow_stale=True)
+        if previous is not None:
+            store_day(date_str, previous, CALENDAR_PARSER_VERSION, sources=dict(urls), complete=True)
+            logging.info(f"Страницы календаря для {date_str} не изменились (304), данные продлены без разбора")
+            return previous
+
+    for url, html_content in ((urls["azbyka"], azbyka_html_content), (urls["pravoslavie"], pravoslavie_html_content)):
+        if html_content:
+            store_page_html(url, html_content)
+
+    final_calendar_data = await run_cpu(build_calendar_data, date_str, azbyka_html_content, pravoslavie_html_content)
+    if final_calendar_data is None:
+        stale = get_cached_day(date_str, CALENDAR_PARSER_VERSION, allow_stale=True)
+        if stale:
+            logging.warning(f"Источники недоступны, используем устаревшие данные календаря из кэша для {date_str}")
+            return stale
+        # В кэш не сохраняем: при следующем запросе снова попробуем сайты
+        logging.warning(f"Источники недоступны и кэша нет, рассчитываем календарь для {date_str} по пасхалии")
+        return compute_calendar_day(datetime.strptime(date_str, "%Y%m%d").date())
+
+    store_day(
+        date_str,
+        final_calendar_data,
+        CALENDAR_PARSER_VERSION,
+        sources={
+            "azbyka": urls["azbyka"] if azbyka_html_content else None,
+            "pravoslavie": urls["pravoslavie"] if pravoslavie_html_content else None,
+        },
+        complete=bool(azbyka_html_content and pravoslavie_html_content)
+    )
+    return final_calendar_data
 
-async def get_calendar_data(date_str: str) -> dict | None:
+async def rederive_calendar_data(date_str: str) -> dict | None:
     """
-    Возвращает кэшированные данные календаря для указанной даты.
-    Если данные не кэшированы, пытается извлечь их и кэшировать.
+    Пересобирает данные дня из сохранённого HTML (после смены CALENDAR_PARSER_VERSION),
+    не обращаясь к сайтам. None — если нужных страниц в кэше нет.
     """
-    if date_str in cached_calendar_data:
-        return cached_calendar_data[date_str]
-    
-    data = await fetch_and_cache_calendar_data(date_str)
+    sources = get_day_sources(date_str)
+    if not sources:
+        return None
+    azbyka_html_content = get_page_html(sources["azbyka"]) if sources.get("azbyka") else None
+    pravoslavie_html_content = get_page_html(sources["pravoslavie"]) if sources.get("pravoslavie") else None
+    # Страница, из которой данные собирались, вытеснена из кэша — пересобрать так же не получится
+    if bool(sources.get("azbyka")) != bool(azbyka_html_content) or bool(sources.get("pravoslavie")) != bool(pravoslavie_html_content):
+        return None
+    data = await run_cpu(build_calendar_data, date_str, azbyka_html_content, pravoslavie_html_content)
+    if data is None:
+        return None
+    store_day(date_str, data, CALENDAR_PARSER_VERSION, sources, complete=bool(azbyka_html_content and pravoslavie_html_content))
+    mark_rederived()
+    logging.info(f"Данные календаря для {date_str} пересобраны из сохранённого HTML (версия парсера {CALENDAR_PARSER_VERSION})")
     return data
+
+
+async def _notify_partial(on_partial: PartialCallback, partial_data: dict, date_str: str) -> None:
+    try:
+        await on_partial(partial_data)
+    except Exception as e:
+        logging.error(f"Ошибка при показе частичных данных календаря для {date_str}: {e}")
+
+async def _join_inflight_fetch(date_str: str, fetch: Dict[str, Any], on_partial: Optional[PartialCallback]) -> dict | None:
+    """Ждёт уже идущее скачивание; частичные данные показывает в своей задаче, до полных."""
+    mark_shared_fetch()
+    future = fetch["future"]
+    if on_partial:
+        partial_ready = asyncio.ensure_future(fetch["partial_ready"].wait())
+        try:
+            await asyncio.wait({partial_ready, future}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            partial_ready.cancel()
+        if fetch["partial"] is not None and not future.done():
+            await _notify_partial(on_partial, fetch["partial"], date_str)
+    return await asyncio.shield(future)
+
+async def get_calendar_data(date_str: str, on_partial: Optional[PartialCallback] = None) -> dict | None:
+    """
+    Возвращает данные календаря для указанной даты — единая точка доступа для всех обработчиков и рассылок.
+    Порядок: годовой пакет (core/calendar_bundle.py) → свежие данные из кэша → пересборка из сохранённого HTML
+    (после смены версии парсера) → скачивание страниц. Одновременные запросы одной даты ждут одно скачивание (single-flight).
+
+    :param on_partial: См. fetch_and_cache_calendar_data; вызывается только если данные скачиваются.
+    """
+    bundled = get_bundle_day(date_str, CALENDAR_PARSER_VERSION)
+    if bundled is not None:
+        return bundled
+
+    cached = get_cached_day(date_str, CALENDAR_PARSER_VERSION)
+    if cached is not None:
+        return cached
+
+    fetch = _inflight_fetches.get(date_str)
+    if fetch is not None:
+        return await _join_inflight_fetch(date_str, fetch, on_partial)
+
+    rederived = await rederive_calendar_data(date_str)
+    if rederived is not None:
+        return rederived
+
+    return await _single_flight_fetch(date_str, on_partial)
+
+async def _single_flight_fetch(date_str: str, on_partial: Optional[PartialCallback] = None) -> dict | None:
+    """
+    Скачивает день, регистрируя скачивание в _inflight_fetches; если день уже скачивается,
+    ждёт идущее скачивание. Через эту функцию идут и запросы пользователей, и предзагрузка.
+    """
+    fetch = _inflight_fetches.get(date_str)
+    if fetch is not None:
+        return await _join_inflight_fetch(date_str, fetch, on_partial)
+
+    fetch = {
+        "future": asyncio.get_running_loop().create_future(),
+        "partial": None,
+        "partial_ready": asyncio.Event(),
+    }
+    _inflight_fetches[date_str] = fetch
+
+    async def share_partial(partial_data: dict):
+        fetch["partial"] = partial_data
+        fetch["partial_ready"].set()
+        if on_partial:
+            await _notify_partial(on_partial, partial_data, date_str)
+
+    future = fetch["future"]
+    try:
+        data = await fetch_and_cache_calendar_data(date_str, on_partial=share_partial)
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # помечаем исключение как полученное, если никто не ждал
+        raise
+    except asyncio.CancelledError:
+        # Ожидающие не должны зависнуть из-за отмены первого запроса
+        future.set_result(get_cached_day(date_str, CALENDAR_PARSER_VERSION, allow_stale=True))
+        raise
+    else:
+        future.set_result(data)
+        return data
+    finally:
+        _inflight_fetches.pop(date_str, None)
+
+def upcoming_date_strs(days: int, start: datetime | None = None) -> list:
+    """Даты 'YYYYMMDD' на days дней вперёд, начиная с сегодняшней."""
+    start = start or datetime.now()
+    return [(start + timedelta(days=offset)).strftime("%Y%m%d") for offset in range(days)]
+
+async def prefetch_calendar_days(days: int | None = None) -> Dict[str, Any]:
+    """
+    Заранее скачивает и разбирает календарь на ближайшие дни (задача планировщика в ночные часы),
+    чтобы дневные запросы /calendar и проверка именин на завтра всегда попадали в кэш.
+    Дни со свежими данными пропускаются; не больше CALENDAR_PREFETCH_CONCURRENCY дней одновременно.
+
+    :return: Отчёт: сколько дней обновлено, пропущено, не удалось; длительность.
+    """
+    global _last_prefetch_report
+    days = days or CALENDAR_PREFETCH_DAYS
+    started_at = time.time()
+    refresh_before = started_at + CALENDAR_PREFETCH_REFRESH_HOURS * 3600
+    semaphore = asyncio.Semaphore(CALENDAR_PREFETCH_CONCURRENCY)
+    report: Dict[str, Any] = {"days": days, "fetched": 0, "skipped": 0, "failed": []}
+
+    async def prefetch_day(date_str: str):
+        expires_at = get_day_expiry(date_str, CALENDAR_PARSER_VERSION)
+        if has_bundle_day(date_str, CALENDAR_PARSER_VERSION) or (expires_at is not None and expires_at > refresh_before):
+            report["skipped"] += 1
+            return
+        async with semaphore:
+            # Если этот день уже качает пользовательский запрос, просто ждём его; иначе
+            # пользовательские запросы этого дня будут ждать предзагрузку
+            data = await _single_flight_fetch(date_str)
+            if data and is_fresh(date_str, CALENDAR_PARSER_VERSION):
+                report["fetched"] += 1
+            else:
+                report["failed"].append(date_str)
+            await asyncio.sleep(CALENDAR_PREFETCH_PAUSE_SECONDS)
+
+    await asyncio.gather(*(prefetch_day(date_str) for date_str in upcoming_date_strs(days)), return_exceptions=True)
+    report["duration"] = time.time() - started_at
+    if report["fetched"]:
+        rebuild_nameday_index()
+    report["finished_at"] = datetime.now().strftime("%d.%m.%Y %H:%M")
+    _last_prefetch_report = report
+    logging.info(
+        f"Предзагрузка календаря на {days} дн.: обновлено {report['fetched']}, свежих {report['skipped']}, "
+        f"не удалось {len(report['failed'])}, {report['duration']:.1f} с"
+    )
+    return report
+
+def get_calendar_coverage(days: int | None = None) -> Dict[str, Any]:
+    """Покрытие кэша на ближайшие дни: какие даты есть в годовом пакете или свежими в кэше, каких нет."""
+    date_strs = upcoming_date_strs(days or CALENDAR_PREFETCH_DAYS)
+    missing = [
+        date_str for date_str in date_strs
+        if not has_bundle_day(date_str, CALENDAR_PARSER_VERSION) and not is_fresh(date_str, CALENDAR_PARSER_VERSION)
+    ]
+    return {"days": len(date_strs), "cached": len(date_strs) - len(missing), "missing": missing}
+
+def format_calendar_coverage() -> str:
+    """Текстовый отчёт о кэше календаря для админ-команды: покрытие ближайших дней и последняя предзагрузка."""
+    coverage = get_calendar_coverage()
+    stats = get_calendar_cache_stats()
+    lines = [
+        "🗓️ <b>Кэш календаря</b>",
+        f"Ближайшие {coverage['days']} дн.: в кэше {coverage['cached']}",
+    ]
+    if coverage["missing"]:
+        missing = ", ".join(datetime.strptime(d, "%Y%m%d").strftime("%d.%m") for d in coverage["missing"])
+        lines.append(f"Нет в кэше: {missing}")
+    lines.append(
+        f"Дней в кэше: {stats['days']} (свежих {stats['fresh_days']}), страниц HTML: {stats['pages']} "
+        f"({stats['html_bytes'] / 1024:.0f} КБ)"
+    )
+    lines.append(
+        f"Попаданий {stats['hits']}, устаревших {stats['stale_hits']}, промахов {stats['misses']}, "
+        f"объединено {stats['shared']}, пересобрано {stats['rederived']}"
+    )
+    http = get_http_cache_stats()
+    lines.append(f"Запросов к сайтам: {http['requests']}, без изменений (304): {http['not_modified']}, получено {http['bytes_received'] / 1024:.0f} КБ (после распаковки)")
+    render = get_calendar_render_stats()
+    lines.append(f"Готовых сообщений: {render['entries']}, взято готовыми {render['hits']}, собрано {render['renders']}")
+    bundle = get_calendar_bundle_stats(CALENDAR_PARSER_VERSION)
+    if bundle["days"]:
+        period = f"{datetime.strptime(bundle['first'], '%Y%m%d'):%d.%m.%Y}–{datetime.strptime(bundle['last'], '%Y%m%d'):%d.%m.%Y}"
+        lines.append(f"Годовой пакет: {bundle['days']} дн. ({period}), попаданий {bundle['hits']}, промахов {bundle['misses']}")
+    else:
+        lines.append("Годовой пакет не собран (scripts/build_calendar_bundle.py).")
+    if _last_prefetch_report:
+        report = _last_prefetch_report
+        lines.append(
+            f"Предзагрузка {report['finished_at']}: обновлено {report['fetched']}, свежих {report['skipped']}, "
+            f"не удалось {len(report['failed'])}, {report['duration']:.0f} с"
+        )
+    else:
+        lines.append("Предзагрузка ещё не запускалась.")
+    return "\n".join(lines)
+
@@ -0,0 +1,101 @@
+"""
+Готовые HTML-сообщения православного календаря: основное сообщение (праздники, пост,
+седмица, именины) и мысли Феофана Затворника.
+
+Одни и те же сообщения нужны команде /calendar и утренней рассылке, поэтому они собираются
+один раз на дату и вариант и запоминаются. Запомненный результат привязан к отпечатку
+данных дня: когда данные меняются (частичные -> полные, обновление кэша, пересборка пакета),
+сообщения собираются заново.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Подпись об источниках: в /calendar — ссылки, в рассылке — курсив (текст проходит через convert_markdown_to_html)
+CALENDAR_RENDER_VARIANTS = {
+    "command": "Данные предоставлены <a href=\"https://pravoslavie.ru\">pravoslavie.ru</a> и <a href=\"https://azbyka.ru\">azbyka.ru</a>",
+    "broadcast": "_Данные предоставлены pravoslavie.ru и azbyka.ru_",
+}
+# Сколько пар (дата, вариант) держать в памяти
+CALENDAR_RENDER_CACHE_SIZE = 32
+
+THEOPHAN_HEADER = "📖 <b>Мысли Святителя Феофана Затворника на каждый день года:</b>\n\n"
+_THEOPHAN_LEADING_PUNCTUATION = re.compile(r'^\s*[\(\);,.]+\s*')
+
+_lock = threading.Lock()
+# (дата, вариант) -> (отпечаток данных, сообщения)
+_rendered: "OrderedDict[Tuple[str, str], Tuple[int, Dict[str, Optional[str]]]]" = OrderedDict()
+_stats = {"hits": 0, "renders": 0}
+
+def _fingerprint(calendar_data: Dict[str, Any]) -> int:
+    return hash((
+        tuple(calendar_data.get("holidays") or ()),
+        tuple(calendar_data.get("namedays") or ()),
+        calendar_data.get("fasting"),
+        calendar_data.get("week_info"),
+        tuple(calendar_data.get("theophan_thoughts") or ()),
+    ))
+
+def _render(date_str: str, calendar_data: Dict[str, Any], variant: str) -> Dict[str, Optional[str]]:
+    # Формируем список праздников
+    holidays = calendar_data.get("holidays", [])
+    if holidays:
+        holidays_text = "✨ <b>Праздники:</b>\n" + "\n".join([f"• {h}" for h in holidays]) + "\n\n"
+    else:
+        holidays_text = "✨ <b>Сегодня больших праздников не найдено.</b>\n\n"
+
+    # Формируем список именин
+    namedays = calendar_data.get("namedays", [])
+    if namedays:
+        namedays_text = "😇 <b>Именины:</b>\n" + "\n".join([f"• {n}" for n in namedays]) + "\n\n"
+    else:
+        namedays_text = "😇 <b>Именин нет.</b>\n\n"
+
+    main_text = (
+        f"🗓️ <b>Православный календарь на сегодня</b> ✨\n\n"
+        f"🗓️ <b>Дата:</b> {datetime.strptime(date_str, '%Y%m%d').strftime('%d.%m.%Y')}\n\n"
+        f"{holidays_text}"
+        f"ℹ️ <b>Пост:</b> {calendar_data.get('fasting', 'Информация о посте не найдена.')}\n\n"
+        f"🏛️ <b>Седмица:</b> {calendar_data.get('week_info', 'Информация о седмице не найдена.')}\n\n"
+        f"{namedays_text}"
+        f"{CALENDAR_RENDER_VARIANTS[variant]}"
+    )
+
+    # Отдельное сообщение для мыслей Феофана Затворника
+    formatted_thoughts = []
+    for thought in calendar_data.get('theophan_thoughts') or []:
+        cleaned_thought = _THEOPHAN_LEADING_PUNCTUATION.sub('', thought).strip() # Удаляем начальные символы из каждого абзаца
+        if cleaned_thought:
+            formatted_thoughts.append(f"✨ <i>{cleaned_thought}</i>\n\n")
+    theophan_text = (THEOPHAN_HEADER + "".join(formatted_thoughts).strip()) if formatted_thoughts else None
+    return {"main": main_text, "theophan": theophan_text}
+
+def render_calendar_messages(date_str: str, calendar_data: Dict[str, Any], variant: str = "command") -> Dict[str, Optional[str]]:
+    """
+    Сообщения календаря на дату 'YYYYMMDD': {"main": основное сообщение, "theophan": мысли Феофана или None}.
+
+    :param variant: "command" (/calendar) или "broadcast" (утренняя рассылка) — различается подпись об источниках.
+    """
+    key = (date_str, variant)
+    fingerprint = _fingerprint(calendar_data)
+    with _lock:
+        cached = _rendered.get(key)
+        if cached and cached[0] == fingerprint:
+            _rendered.move_to_end(key)
+            _stats["hits"] += 1
+            return cached[1]
+    messages = _render(date_str, calendar_data, variant)
+    with _lock:
+        _rendered[key] = (fingerprint, messages)
+        _rendered.move_to_end(key)
+        while len(_rendered) > CALENDAR_RENDER_CACHE_SIZE:
+            _rendered.popitem(last=False)
+        _stats["renders"] += 1
+    return messages
+
+def get_calendar_render_stats() -> Dict[str, int]:
+    """Сколько раз сообщения календаря взяты готовыми и сколько раз собраны."""
+    with _lock:
+        return {"entries": len(_rendered), **_stats}
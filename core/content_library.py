@@ -834,6 +834,41 @@ evening_prayer_parts = {
     ]
 }
 
+# Заготовленные молитвы по темам модуля «Молитва» — выдаются, когда AI перегружен
+fallback_prayers = {
+    "health": [
+        "Господи Иисусе Христе, Врачу душ и телес наших! Призри милостиво на раба Твоего, "
+        "посети его милостью Твоею, исцели от всякой болезни и немощи, даруй терпение и надежду. "
+        "Благодарю Тебя за каждый день жизни и за заботу близких. Да будет воля Твоя во всём. Аминь.",
+        "Господи, Милостивый и Человеколюбивый! Ты исцелял недужных и утешал скорбящих — "
+        "укрепи силы, подай врачам мудрость, а сердцу мир и упование на Тебя. "
+        "Благодарю Тебя за всё, что Ты уже даровал. Аминь."
+    ],
+    "work": [
+        "Господи, благослови начинание и труд мой. Даруй разум ясный, руки умелые и сердце честное, "
+        "чтобы всё совершалось во славу Твою и на пользу ближним. "
+        "Благодарю Тебя за дело, которое Ты мне вверил. Аминь.",
+        "Господи Иисусе Христе, без Тебя не можем творити ничесоже. Помоги мне в делах моих, "
+        "устрой их по Твоей благой воле, избавь от суеты и уныния. "
+        "Благодарю Тебя за силы и возможности, которые Ты подаёшь. Аминь."
+    ],
+    "family": [
+        "Господи, Отче наш Небесный! Сохрани семью мою в мире и любви, "
+        "даруй нам терпение друг ко другу, единомыслие и радость о Тебе. "
+        "Благодарю Тебя за каждого из близких, которых Ты дал мне. Аминь.",
+        "Господи Иисусе Христе, Ты благословил брак в Кане Галилейской — благослови и дом наш. "
+        "Покрой всех близких Своею милостью, исцели обиды, укрепи любовь. "
+        "Благодарю Тебя за дар семьи. Аминь."
+    ],
+    "custom": [
+        "Господи, Ты знаешь всё, что у меня на сердце, прежде чем я скажу. "
+        "Прими мою просьбу, устрой всё по Твоей благой воле и даруй мне мир душевный. "
+        "Благодарю Тебя за Твою любовь и промышление. Аминь.",
+        "Господи Иисусе Христе, Сыне Божий, помилуй меня. Укрепи веру мою, утешь в скорбях, "
+        "направь на путь спасения. Благодарю Тебя за все милости Твои, явные и сокровенные. Аминь."
+    ]
+}
+
 evening_reflection_prompts = [
     "Расскажи, за что ты сегодня благодарен Богу. Даже малая радость — уже дар.",
     "Поделись одним моментом, где ты почувствовал Божью помощь или утешение.",
@@ -0,0 +1,350 @@
+"""
+Пул заранее сгенерированного контента.
+
+Размышления Слова Дня хранятся по источнику стиха из daily_words: нажатие кнопки
+обслуживается мгновенно из пула, а AI вызывается только для стиха без готовых
+размышлений. Пул пополняется фоновой задачей в ночные часы: сначала стихи,
+у которых размышлений меньше всего, затем замена устаревших.
+
+Молитвы хранятся по теме и намерению (о здравии ребёнка, перед экзаменом...),
+которое определяется по ключевым словам просьбы. Если просьба короткая и
+однозначная, молитва выдаётся из пула сразу, а пул обновляется в фоне;
+просьбы своими словами, с именами и подробностями генерируются персонально.
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from core.content_library import daily_words
+from core.daily_word import generate_reflection
+from core.ai_interaction import get_ai_response
+from core.ai_errors import AIBusyError, AICircuitOpenError, AIConfigError, AIError
+
+CONTENT_POOL_FILE = "content_pool.json"
+
+# Сколько размышлений держать на каждый стих
+REFLECTIONS_PER_VERSE = int(os.getenv("REFLECTIONS_PER_VERSE", "3"))
+# Размышления старше этого заменяются новыми, чтобы тексты не приедались
+REFLECTION_MAX_AGE_DAYS = 30
+# Сколько размышлений генерировать за один запуск фоновой задачи
+REFLECTION_REPLENISH_BATCH = int(os.getenv("REFLECTION_REPLENISH_BATCH", "40"))
+
+# Сколько вариантов молитвы держать на каждое намерение
+PRAYERS_PER_INTENT = 4
+# Варианты старше этого заменяются в фоне после выдачи из пула
+PRAYER_MAX_AGE_DAYS = 7
+# Просьба длиннее этого (в словах) считается подробной и генерируется персонально
+MAX_POOLED_DETAILS_WORDS = 8
+# Короче этого ответ AI не считаем молитвой
+MIN_PRAYER_LEN = 80
+
+# Намерения по темам молитвы: ключ -> (описание для промпта, основы ключевых слов).
+# Намерение "general" выбирается для короткой просьбы без ключевых слов ("о здравии", "помоги").
+PRAYER_INTENTS: Dict[str, Dict[str, tuple]] = {
+    "health": {
+        "self": ("о собственном здравии", ("мое", "моё", "моем", "моём", "себя", "себе", "меня", "мне", "мой", "свое", "своё")),
+        "child": ("о здравии ребёнка", ("сын", "доч", "ребен", "ребён", "дет", "малыш", "внук", "внуч")),
+        "parents": ("о здравии родителей", ("мам", "пап", "мат", "отц", "отец", "родител", "бабушк", "дедушк")),
+        "spouse": ("о здравии супруга или супруги", ("муж", "жен", "супруг")),
+        "surgery": ("перед операцией", ("операц", "хирург")),
+    },
+    "work": {
+        "exam": ("перед экзаменом или учёбой", ("экзамен", "сесси", "учеб", "учёб", "зачет", "зачёт", "егэ", "огэ")),
+        "job_search": ("о поиске работы", ("найти работ", "ищу работ", "поиск работ", "трудоустро", "собеседован")),
+        "business": ("о благополучии дела и начинаний", ("бизнес", "начинани", "проект", "дело", "делах")),
+        "colleagues": ("о мире с коллегами и начальством", ("коллег", "начальн", "руководител")),
+    },
+    "family": {
+        "peace": ("о мире в семье", ("ссор", "мир", "конфликт", "ругаемс", "примирен")),
+        "children": ("о детях", ("сын", "доч", "ребен", "ребён", "дет")),
+        "marriage": ("о супружестве", ("муж", "жен", "брак", "супруг")),
+        "parents": ("о родителях", ("мам", "пап", "мат", "отц", "отец", "родител")),
+    },
+    "daily_word_reflection": {},
+}
+# Темы, для которых молитва всегда персональная
+PERSONAL_PRAYER_TOPICS = frozenset({"custom"})
+# Начала обычных слов просьбы: такое слово с заглавной буквы в начале фразы — не имя
+# ("О здравии...", "Мама болеет"). Предлоги сравниваются целиком, остальное — по началу слова.
+# Список намеренно осторожный: неузнанное слово считается именем, и молитва просто генерируется
+PRAYER_REQUEST_STEMS = (
+    "о", "об", "за", "про", "для", "в", "на", "у", "и", "перед", "мой", "моя", "мое", "моё", "мои", "моег", "моей",
+    "моих", "мне", "мен", "себ", "наш", "сво", "помо", "прош", "проси", "молит", "здрав", "исцел",
+    "выздор", "бол", "благо", "спас", "сохран", "защит", "укреп", "удач", "успе", "скор", "тяжел", "тяжёл",
+    "мам", "пап", "отц", "отец", "родител", "бабушк", "дедушк", "сын", "доч", "ребен", "ребён", "дет",
+    "малыш", "внук", "внуч", "муж", "супруг", "операц", "экзамен", "сесси", "учеб", "учёб", "работ",
+    "бизнес", "коллег", "начальн", "семь", "ссор", "брак",
+)
+
+content_pool: Dict[str, Dict[str, List[Dict[str, Any]]]] = {"reflections": {}, "prayers": {}}
+_pool_lock = threading.RLock()
+_pool_stats = {"reflection_hits": 0, "reflection_misses": 0, "prayer_hits": 0, "prayer_misses": 0, "prayer_personal": 0}
+# Фоновые задачи обновления пула молитв (не больше одной на намерение)
+_prayer_refresh_tasks: Dict[str, asyncio.Task] = {}
+
+def load_content_pool() -> None:
+    global content_pool
+    with _pool_lock:
+        if os.path.exists(CONTENT_POOL_FILE):
+            try:
+                with open(CONTENT_POOL_FILE, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                content_pool = data if isinstance(data, dict) else {}
+            except Exception as e:
+                logging.error(f"Ошибка при загрузке пула контента: {e}", exc_info=True)
+                content_pool = {}
+        else:
+            content_pool = {}
+        content_pool.setdefault("reflections", {})
+        content_pool.setdefault("prayers", {})
+
+def save_content_pool() -> None:
+    with _pool_lock:
+        try:
+            with open(CONTENT_POOL_FILE, 'w', encoding='utf-8') as f:
+                json.dump(content_pool, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении пула контента: {e}", exc_info=True)
+
+def _unique_daily_words() -> List[Dict[str, str]]:
+    """Стихи из daily_words без повторов (ключ — источник)."""
+    unique: Dict[str, Dict[str, str]] = {}
+    for word in daily_words:
+        unique.setdefault(word['source'], word)
+    return list(unique.values())
+
+def get_pooled_reflection(source: str) -> Optional[str]:
+    """Случайное готовое размышление для стиха или None, если пул для него пуст."""
+    with _pool_lock:
+        entries = content_pool["reflections"].get(source) or []
+        if not entries:
+            _pool_stats["reflection_misses"] += 1
+            return None
+        _pool_stats["reflection_hits"] += 1
+        return random.choice(entries)["text"]
+
+def add_reflection(source: str, text: str) -> None:
+    """Добавляет размышление в пул; при переполнении вытесняет самое старое."""
+    with _pool_lock:
+        entries = content_pool["reflections"].setdefault(source, [])
+        if any(entry["text"] == text for entry in entries):
+            return
+        entries.append({"text": text, "created_at": datetime.now().isoformat()})
+        entries.sort(key=lambda entry: entry["created_at"])
+        del entries[:-REFLECTIONS_PER_VERSE]
+        save_content_pool()
+
+def _reflection_needs(now: datetime) -> List[Dict[str, str]]:
+    """Стихи, которым нужно новое размышление: сначала с пустым/неполным пулом, затем с устаревшими."""
+    stale_before = (now - timedelta(days=REFLECTION_MAX_AGE_DAYS)).isoformat()
+    missing, stale = [], []
+    with _pool_lock:
+        for word in _unique_daily_words():
+            entries = content_pool["reflections"].get(word['source']) or []
+            if len(entries) < REFLECTIONS_PER_VERSE:
+                missing.append((len(entries), word))
+            elif min(entry["created_at"] for entry in entries) < stale_before:
+                stale.append(word)
+    missing.sort(key=lambda item: item[0])
+    return [word for _, word in missing] + stale
+
+async def replenish_reflection_pool(batch: int = REFLECTION_REPLENISH_BATCH) -> int:
+    """
+    Фоновая задача: генерирует до batch размышлений для стихов, которым их не хватает.
+    Прерывается, если AI перегружен или недоступен — продолжит в следующий запуск.
+
+    :return: Сколько размышлений добавлено.
+    """
+    queue = _reflection_needs(datetime.now())[:batch]
+    if not queue:
+        logging.info("Пул размышлений Слова Дня заполнен, пополнение не требуется")
+        return 0
+
+    added = 0
+    for word in queue:
+        try:
+            reflection = await generate_reflection(word['scripture'], word['source'], call_site="daily_word_pool")
+        except (AIBusyError, AICircuitOpenError, AIConfigError) as e:
+            logging.warning(f"Пополнение пула размышлений прервано: {e}")
+            break
+        except AIError as e:
+            logging.warning(f"Не удалось сгенерировать размышление для {word['source']}: {e}")
+            continue
+        if reflection:
+            add_reflection(word['source'], reflection)
+            added += 1
+    logging.info(f"Пул размышлений Слова Дня: добавлено {added} из {len(queue)} запланированных")
+    return added
+
+def build_prayer_prompt(prayer_topic: str, details: str) -> str:
+    """Промпт молитвы на тему prayer_topic с учётом просьбы пользователя."""
+    return (
+        f"Сгенерируй текст православной молитвы в позитивном, вдохновляющем стиле (Норман Пил) на тему '{prayer_topic}' "
+        f"с учетом следующей просьбы пользователя: '{details}'. "
+        f"Молитва должна быть на современном русском языке, канонически православно корректной и включать обращение, "
+        f"прошение, благодарение. Текст до 500 символов, глубокий и добрый."
+    )
+
+def extract_prayer_intent(topic_key: str, details: str) -> Optional[str]:
+    """
+    Определяет намерение молитвы по ключевым словам просьбы.
+
+    :return: Ключ намерения ("child", "exam", "general", ...) или None, если просьба
+             подробная/неоднозначная и молитву нужно генерировать персонально.
+    """
+    if topic_key in PERSONAL_PRAYER_TOPICS or topic_key not in PRAYER_INTENTS:
+        return None
+    words = re.findall(r"[а-яёa-z]+", details, re.IGNORECASE)
+    if len(words) > MAX_POOLED_DETAILS_WORDS:
+        return None
+    # Имя собственное ("о здравии сестры Анны", "Анна болеет") — молитва должна его упомянуть.
+    # Первое слово с заглавной буквы — имя, только если это не обычное слово просьбы
+    for position, word in enumerate(words):
+        if not word[0].isupper():
+            continue
+        lowered_word = word.lower()
+        if position > 0 or not any(
+            lowered_word == stem or (len(stem) > 2 and lowered_word.startswith(stem)) for stem in PRAYER_REQUEST_STEMS
+        ):
+            return None
+    lowered = " ".join(word.lower() for word in words)
+    matched = [
+        intent for intent, (_, stems) in PRAYER_INTENTS[topic_key].items()
+        if any(re.search(rf"(?:^|\s){re.escape(stem)}", lowered) for stem in stems)
+    ]
+    if len(matched) > 1 and "self" in matched:
+        matched.remove("self")  # "о здравии моей мамы" — о маме, а не о себе
+    if len(matched) == 1:
+        return matched[0]
+    if not matched and len(words) <= 3:
+        return "general"
+    return None
+
+def _prayer_pool_key(topic_key: str, intent: str) -> str:
+    return f"{topic_key}:{intent}"
+
+def _intent_description(topic_key: str, intent: str, prayer_topic: str) -> str:
+    if intent == "general":
+        return prayer_topic.lower()
+    return PRAYER_INTENTS[topic_key][intent][0]
+
+def get_pooled_prayer(topic_key: str, details: str) -> tuple[Optional[str], Optional[str]]:
+    """
+    Ищет готовую молитву для просьбы.
+
+    :return: (текст молитвы или None, намерение или None). Намерение без текста означает,
+             что просьба типовая, но пул для неё пока пуст — ответ AI можно положить в пул.
+    """
+    intent = extract_prayer_intent(topic_key, details)
+    with _pool_lock:
+        if intent is None:
+            _pool_stats["prayer_personal"] += 1
+            return None, None
+        entries = content_pool["prayers"].get(_prayer_pool_key(topic_key, intent)) or []
+        if not entries:
+            _pool_stats["prayer_misses"] += 1
+            return None, intent
+        _pool_stats["prayer_hits"] += 1
+        return random.choice(entries)["text"], intent
+
+def is_valid_prayer(text: Optional[str]) -> bool:
+    """Проверяет, что ответ AI похож на молитву: достаточно длинный и на русском."""
+    if not text:
+        return False
+    stripped = text.strip()
+    return len(stripped) >= MIN_PRAYER_LEN and bool(re.search(r'[а-яё]', stripped, re.IGNORECASE))
+
+def add_prayer(topic_key: str, intent: str, text: str) -> None:
+    """Добавляет молитву в пул намерения; при переполнении вытесняет самую старую."""
+    if not is_valid_prayer(text):
+        return
+    with _pool_lock:
+        entries = content_pool["prayers"].setdefault(_prayer_pool_key(topic_key, intent), [])
+        if any(entry["text"] == text for entry in entries):
+            return
+        entries.append({"text": text.strip(), "created_at": datetime.now().isoformat()})
+        entries.sort(key=lambda entry: entry["created_at"])
+        del entries[:-PRAYERS_PER_INTENT]
+        save_content_pool()
+
+async def _refresh_prayer(topic_key: str, intent: str, prayer_topic: str):
+    description = _intent_description(topic_key, intent, prayer_topic)
+    try:
+        prayer = await get_ai_response(
+            build_prayer_prompt(prayer_topic, description),
+            max_tokens=400,
+            prompt_sections=("role",),
+            call_site="prayer_pool"
+        )
+    except AIError as e:
+        logging.info(f"Пул молитв: не удалось обновить '{_prayer_pool_key(topic_key, intent)}': {e}")
+        return
+    add_prayer(topic_key, intent, prayer)
+    logging.info(f"Пул молитв: добавлен вариант для '{_prayer_pool_key(topic_key, intent)}'")
+
+def _prayer_needs_refresh(key: str) -> bool:
+    """Пул намерения неполон или в нём есть устаревший вариант."""
+    stale_before = (datetime.now() - timedelta(days=PRAYER_MAX_AGE_DAYS)).isoformat()
+    with _pool_lock:
+        entries = content_pool["prayers"].get(key) or []
+        return len(entries) < PRAYERS_PER_INTENT or min(entry["created_at"] for entry in entries) < stale_before
+
+def schedule_prayer_refresh(topic_key: str, intent: str, prayer_topic: str):
+    """Запускает фоновую генерацию нового варианта молитвы, если пул намерения неполон или устарел."""
+    key = _prayer_pool_key(topic_key, intent)
+    task = _prayer_refresh_tasks.get(key)
+    if (task and not task.done()) or not _prayer_needs_refresh(key):
+        return
+
+    async def _run():
+        try:
+            await _refresh_prayer(topic_key, intent, prayer_topic)
+        finally:
+            _prayer_refresh_tasks.pop(key, None)
+
+    _prayer_refresh_tasks[key] = asyncio.create_task(_run())
+
+def get_content_pool_stats() -> Dict[str, Any]:
+    """Покрытие пула и доля запросов, обслуженных из пула."""
+    with _pool_lock:
+        verses = _unique_daily_words()
+        covered = sum(1 for word in verses if content_pool["reflections"].get(word['source']))
+        total_reflections = sum(len(entries) for entries in content_pool["reflections"].values())
+        total_prayers = sum(len(entries) for entries in content_pool["prayers"].values())
+        prayer_intents = len(content_pool["prayers"])
+    served = _pool_stats["reflection_hits"] + _pool_stats["reflection_misses"]
+    prayer_requests = _pool_stats["prayer_hits"] + _pool_stats["prayer_misses"] + _pool_stats["prayer_personal"]
+    return {
+        "verses": len(verses),
+        "covered_verses": covered,
+        "reflections": total_reflections,
+        "reflection_hits": _pool_stats["reflection_hits"],
+        "reflection_misses": _pool_stats["reflection_misses"],
+        "reflection_hit_rate": _pool_stats["reflection_hits"] / served if served else 0.0,
+        "prayers": total_prayers,
+        "prayer_intents": prayer_intents,
+        "prayer_hits": _pool_stats["prayer_hits"],
+        "prayer_misses": _pool_stats["prayer_misses"],
+        "prayer_personal": _pool_stats["prayer_personal"],
+        "prayer_hit_rate": _pool_stats["prayer_hits"] / prayer_requests if prayer_requests else 0.0,
+    }
+
+def format_content_pool_stats() -> str:
+    """Текстовый отчёт о пуле контента для админ-команды."""
+    stats = get_content_pool_stats()
+    return "\n".join([
+        "📚 <b>Пул контента</b>",
+        f"Слово Дня: {stats['covered_verses']}/{stats['verses']} стихов, {stats['reflections']} размышлений; "
+        f"из пула {stats['reflection_hits']}, вживую {stats['reflection_misses']} ({stats['reflection_hit_rate'] * 100:.0f}%)",
+        f"Молитвы: {stats['prayers']} в {stats['prayer_intents']} намерениях; из пула {stats['prayer_hits']}, "
+        f"типовых без пула {stats['prayer_misses']}, персональных {stats['prayer_personal']} "
+        f"(из пула {stats['prayer_hit_rate'] * 100:.0f}%)",
+    ])
+
+load_content_pool()
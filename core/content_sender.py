@@ -1,22 +1,29 @@
+import asyncio
 import logging
 import os
+import time
+from typing import AsyncIterator, Callable
 from aiogram import Bot
 from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
 from aiogram.enums import ParseMode, ChatAction
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.fsm.context import FSMContext
 from utils.html_parser import convert_markdown_to_html
+from utils.message_layout import MAX_MESSAGE_LEN, layout_caption, split_html, split_plain_text, truncate_html
 from core.image_utils import pick_local_image, is_external_url
 
 async def send_content_message(bot: Bot, chat_id: int, text: str, image_name: str = None, reply_markup: InlineKeyboardMarkup = None) -> Message | None:
     """
     Отправляет сообщение с изображением (опционально), подписью и опциональной инлайн-клавиатурой.
+    Текст длиннее лимита подписи (или сообщения) продолжается следующими сообщениями;
+    клавиатура прикрепляется к последнему из них.
 
     :param bot: Экземпляр бота Aiogram.
     :param chat_id: ID чата для отправки.
     :param text: Текст сообщения (будет использован как подпись).
     :param image_name: Имя файла изображения в 'assets/images/'.
     :param reply_markup: Инлайн-клавиатура для сообщения.
-    :return: Отправленное сообщение или None в случае ошибки.
+    :return: Последнее отправленное сообщение или None в случае ошибки.
     """
     html_text = convert_markdown_to_html(text)
     
@@ -32,34 +39,34 @@ async def send_content_message(bot: Bot, chat_id: int, text: str, image_name: st
         if image_name and not is_external_url(image_name):
             photo_path = os.path.join('assets', 'images', image_name)
             if os.path.exists(photo_path):
+                caption, follow_ups = layout_caption(html_text)
                 photo = FSInputFile(photo_path)
                 sent_message = await bot.send_photo(
                     chat_id=chat_id,
                     photo=photo,
-                    caption=html_text,
+                    caption=caption,
                     parse_mode=ParseMode.HTML,
-                    reply_markup=reply_markup
+                    reply_markup=None if follow_ups else reply_markup
                 )
-            else:
-                logging.warning(f"Изображение не найдено локально: {photo_path}. Отправляем только текст.")
-                sent_message = await bot.send_message(
-                    chat_id=chat_id,
-                    text=html_text,
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=reply_markup
-                )
-        else:
-            sent_message = await bot.send_message(
-                chat_id=chat_id,
-                text=html_text,
-                parse_mode=ParseMode.HTML,
-                reply_markup=reply_markup
-            )
-        return sent_message
+                return await _send_parts(bot, chat_id, follow_ups, reply_markup) or sent_message
+            logging.warning(f"Изображение не найдено локально: {photo_path}. Отправляем только текст.")
+        return await _send_parts(bot, chat_id, split_html(html_text), reply_markup)
     except Exception as e:
         logging.error(f"Ошибка при отправке сообщения в чат {chat_id}: {e}")
         return None
 
+async def _send_parts(bot: Bot, chat_id: int, parts: list[str], reply_markup: InlineKeyboardMarkup = None, parse_mode: str | None = ParseMode.HTML) -> Message | None:
+    """Отправляет части текста отдельными сообщениями; клавиатура — у последнего. Возвращает последнее."""
+    sent_message = None
+    for index, part in enumerate(parts):
+        sent_message = await bot.send_message(
+            chat_id=chat_id,
+            text=part,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup if index == len(parts) - 1 else None
+        )
+    return sent_message
+
 async def send_and_delete_previous(
     bot: Bot, 
     chat_id: int, 
@@ -112,3 +119,121 @@ async def send_and_delete_previous(
         await state.update_data(last_bot_message_id=sent_message.message_id)
     
     return sent_message
+
+STREAM_FIRST_MESSAGE_TIMEOUT = 1.0  # Через сколько секунд показать заглушку, если AI ещё молчит
+STREAM_EDIT_INTERVAL = 1.5  # Минимальный интервал между правками одного сообщения (лимиты Telegram)
+STREAM_PLACEHOLDER = "✍️ <i>Пишу ответ…</i>"
+
+async def send_streaming_message(
+    bot: Bot,
+    chat_id: int,
+    chunks: AsyncIterator[str],
+    format_text: Callable[[str], str],
+    reply_markup: InlineKeyboardMarkup = None,
+    plain_fallback: Callable[[str], str] | None = None
+) -> tuple[Message | None, str, Exception | None]:
+    """
+    Отправляет ответ AI по мере генерации: первое сообщение появляется примерно через секунду
+    (фрагмент ответа или заглушка), затем оно редактируется не чаще STREAM_EDIT_INTERVAL.
+    Финальная правка форматируется format_text и получает reply_markup; ответ длиннее
+    лимита сообщения продолжается следующими сообщениями (клавиатура — у последнего).
+
+    :param chunks: Асинхронный итератор фрагментов текста (например, stream_ai_response).
+    :param format_text: Преобразует накопленный сырой текст в HTML для Telegram.
+    :param plain_fallback: Форматирование без HTML для финальной правки, если HTML отклонён.
+    :return: Кортеж (последнее отправленное сообщение или None, полный сырой текст, ошибка итератора или None).
+             При ошибке уже показанный фрагмент остаётся в чате с пометкой об обрыве.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def _produce():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(done)
+
+    producer = asyncio.create_task(_produce())
+    sent_message = None
+    shown_text = None
+    raw_text = ""
+    next_edit_at = 0.0
+    error = None
+    started_at = time.monotonic()
+
+    async def _show(text: str, markup: InlineKeyboardMarkup = None, parse_mode: str | None = ParseMode.HTML, wait_on_limit: bool = False) -> bool:
+        nonlocal sent_message, shown_text, next_edit_at
+        if text == shown_text and markup is None:
+            return True
+        try:
+            if sent_message is None:
+                sent_message = await bot.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode, reply_markup=markup)
+            else:
+                await bot.edit_message_text(text=text, chat_id=chat_id, message_id=sent_message.message_id, parse_mode=parse_mode, reply_markup=markup)
+            shown_text = text
+            next_edit_at = time.monotonic() + STREAM_EDIT_INTERVAL
+            return True
+        except TelegramRetryAfter as e:
+            logging.warning(f"Потоковая отправка в чат {chat_id}: лимит правок, пауза {e.retry_after} с")
+            next_edit_at = time.monotonic() + e.retry_after
+            if wait_on_limit:
+                # Финальную правку терять нельзя — дожидаемся окончания паузы и повторяем один раз
+                await asyncio.sleep(e.retry_after)
+                return await _show(text, markup, parse_mode)
+            return False
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                shown_text = text
+                return True
+            logging.warning(f"Потоковая отправка в чат {chat_id}: {e}")
+            return False
+
+    try:
+        while True:
+            timeout = None
+            if sent_message is None:
+                timeout = max(0.0, STREAM_FIRST_MESSAGE_TIMEOUT - (time.monotonic() - started_at))
+            try:
+                item = await (queue.get() if timeout is None else asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                # AI ещё не начал отвечать — показываем заглушку, чтобы пользователь видел реакцию
+                if not await _show(STREAM_PLACEHOLDER):
+                    started_at = time.monotonic()  # Повторим попытку через секунду
+                continue
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                error = item
+                break
+            raw_text += item
+            if raw_text.strip() and (sent_message is None or time.monotonic() >= next_edit_at):
+                # Пока ответ генерируется, показываем только то, что помещается в первое сообщение
+                await _show(truncate_html(format_text(raw_text), MAX_MESSAGE_LEN, MAX_MESSAGE_LEN // 2, "…"))
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+    if raw_text.strip():
+        parts = split_html(format_text(raw_text if error is None else raw_text + "…"))
+        parse_mode = ParseMode.HTML
+        if not await _show(parts[0], reply_markup if len(parts) == 1 else None, wait_on_limit=True):
+            parts = split_plain_text(plain_fallback(raw_text)) if plain_fallback else []
+            parse_mode = None
+            if parts and not await _show(parts[0], reply_markup if len(parts) == 1 else None, parse_mode=None, wait_on_limit=True):
+                parts = []
+        try:
+            sent_message = await _send_parts(bot, chat_id, parts[1:], reply_markup, parse_mode) or sent_message
+        except Exception as e:
+            logging.error(f"Потоковая отправка в чат {chat_id}: не удалось отправить продолжение ответа: {e}")
+    elif sent_message is not None:
+        # Текста так и не пришло — убираем заглушку, вызывающий код сообщит об ошибке
+        try:
+            await bot.delete_message(chat_id=chat_id, message_id=sent_message.message_id)
+        except Exception as e:
+            logging.warning(f"Не удалось удалить заглушку потокового ответа в чате {chat_id}: {e}")
+        sent_message = None
+
+    return sent_message, raw_text, error
@@ -0,0 +1,98 @@
+"""
+Сборка контекста диалога для AI по бюджету токенов.
+
+Последние реплики передаются дословно, пока укладываются в бюджет,
+а более старые сжимаются в краткое содержание беседы. Краткое содержание
+обновляется фоновой задачей, чтобы не задерживать ответ пользователю.
+"""
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.ai_interaction import get_ai_response, estimate_tokens, estimate_messages_tokens
+from core.ai_errors import AIError
+
+# Бюджет токенов на историю диалога (краткое содержание + дословные реплики), без системного промпта
+CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "2000"))
+# Сколько последних сообщений максимум передаём дословно
+MAX_VERBATIM_MESSAGES = 8
+# Минимум дословных сообщений (последняя пара user + assistant), даже если она больше бюджета
+MIN_VERBATIM_MESSAGES = 2
+# Максимальная длина краткого содержания беседы
+SUMMARY_MAX_CHARS = 900
+# Длинная реплика, не влезающая в бюджет целиком, обрезается до этого числа символов
+VERBATIM_MESSAGE_MAX_CHARS = 2000
+
+SUMMARY_HEADER = "[КРАТКОЕ СОДЕРЖАНИЕ ПРЕДЫДУЩЕЙ БЕСЕДЫ]"
+
+def split_history_by_budget(history: List[Dict[str, Any]], budget: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Делит историю на старую часть (для сжатия) и свежую (передаётся дословно).
+    Свежая часть набирается с конца, пока укладывается в бюджет и в MAX_VERBATIM_MESSAGES.
+    """
+    recent_count = 0
+    used = 0
+    for message in reversed(history):
+        cost = estimate_messages_tokens([message])
+        if recent_count >= MAX_VERBATIM_MESSAGES:
+            break
+        if recent_count >= MIN_VERBATIM_MESSAGES and used + cost > budget:
+            break
+        used += cost
+        recent_count += 1
+    split_at = len(history) - recent_count
+    return history[:split_at], history[split_at:]
+
+def build_context_messages(history: List[Dict[str, Any]], summary: Optional[str] = None, budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """
+    Собирает сообщения контекста для get_ai_response/stream_ai_response:
+    краткое содержание (если есть) и последние реплики в пределах бюджета.
+    """
+    context: List[Dict[str, Any]] = []
+    if summary:
+        summary_message = {"role": "system", "content": f"{SUMMARY_HEADER}\n{summary}"}
+        context.append(summary_message)
+        budget -= estimate_messages_tokens([summary_message])
+
+    _, recent = split_history_by_budget(history, max(0, budget))
+    for message in recent:
+        content = message.get("content") or ""
+        if len(content) > VERBATIM_MESSAGE_MAX_CHARS and estimate_messages_tokens([message]) > budget:
+            # Обязательная последняя пара может быть огромной — укорачиваем, чтобы не раздувать запрос
+            message = {**message, "content": content[:VERBATIM_MESSAGE_MAX_CHARS].rstrip() + "…"}
+        context.append(message)
+    return context
+
+def needs_summary(history: List[Dict[str, Any]], budget: int = CONTEXT_TOKEN_BUDGET) -> bool:
+    """Проверяет, есть ли в истории реплики, которые уже не помещаются в дословный контекст."""
+    older, _ = split_history_by_budget(history, budget)
+    return bool(older)
+
+async def summarize_turns(previous_summary: Optional[str], turns: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Сжимает старые реплики (вместе с прежним кратким содержанием) в новое краткое содержание.
+    Возвращает None, если AI не смог его составить.
+    """
+    lines = []
+    for message in turns:
+        speaker = "Пользователь" if message.get("role") == "user" else "Духовник"
+        lines.append(f"{speaker}: {message.get('content') or ''}")
+    previous_block = f"Прежнее краткое содержание:\n{previous_summary}\n\n" if previous_summary else ""
+    prompt = (
+        "Составь краткое содержание беседы пользователя с Духовником, чтобы продолжить разговор без полной истории.\n"
+        "Сохрани: о чём просил и что рассказывал пользователь (имена, обстоятельства, переживания), "
+        "какие советы и молитвы уже были даны, о чём договорились.\n"
+        f"Пиши от третьего лица, без приветствий, до {SUMMARY_MAX_CHARS} символов.\n\n"
+        f"{previous_block}"
+        "Новые реплики:\n" + "\n".join(lines)
+    )
+    try:
+        summary = await get_ai_response(prompt, max_tokens=400, prompt_sections=(), call_site="summary")
+    except AIError as e:
+        logging.warning(f"Не удалось составить краткое содержание беседы: {e}")
+        return None
+    summary = summary.strip()
+    if len(summary) > SUMMARY_MAX_CHARS:
+        summary = summary[:SUMMARY_MAX_CHARS].rsplit(' ', 1)[0] + "…"
+    logging.info(f"Краткое содержание беседы обновлено: {len(turns)} реплик -> ≈{estimate_tokens(summary)} ток.")
+    return summary
@@ -0,0 +1,191 @@
+"""
+Вынос тяжёлых вычислений (разбор HTML календаря, разбор iCal, сериализация базы
+пользователей) из потока event loop в небольшой пул процессов.
+
+Пока такие вычисления идут в потоке event loop, бот не отвечает никому.
+Пул создаётся в main() до запуска планировщика и опроса Telegram:
+    start_cpu_pool()
+    data = await run_cpu(build_calendar_data, date_str, azbyka_html, pravoslavie_html)
+
+Функции для run_cpu должны быть объявлены на верхнем уровне модуля (их передают
+в процесс по ссылке), а аргументы и результат — сериализуемы pickle.
+Если пул не запущен (скрипты, отладка) или сломался, функция выполняется в текущем процессе.
+Сломанный пул пересоздаётся в фоновом потоке через forkserver: к этому времени в боте уже
+есть потоки, и fork из такого процесса небезопасен.
+
+monitor_loop_lag() измеряет задержку event loop: насколько позже запланированного
+просыпается asyncio.sleep — это и есть время, на которое бот «замирал».
+"""
+import os
+import time
+import json
+import pickle
+import shutil
+import asyncio
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+from dotenv import load_dotenv # type: ignore
+
+load_dotenv()
+
+# Число процессов пула; 0 — не использовать пул (всё выполняется в процессе бота)
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "2"))
+# Период замера задержки event loop (с) и порог, выше которого задержка попадает в лог
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_LAG_WARN_SECONDS = float(os.getenv("LOOP_LAG_WARN_SECONDS", "0.25"))
+# Сколько последних замеров хранить для перцентилей
+LOOP_LAG_WINDOW = 1200
+# Способ запуска процессов при пересоздании сломанного пула (в боте уже есть потоки — не fork)
+REBUILD_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+T = TypeVar("T")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pool_closed = False  # shutdown_cpu_pool вызван — пересоздание пула не нужно
+_rebuild_task: Optional[asyncio.Task] = None
+_lag_samples: Deque[float] = deque(maxlen=LOOP_LAG_WINDOW)
+_lag_stats: Dict[str, float] = {"max": 0.0, "stalls": 0}
+_offload_stats: Dict[str, Dict[str, float]] = {}
+
+def _warm_up() -> int:
+    return os.getpid()
+
+def _create_pool(workers: int, start_method: Optional[str]) -> Optional[ProcessPoolExecutor]:
+    """Создаёт пул и дожидается запуска всех процессов (блокирует — не вызывать в event loop)."""
+    try:
+        context = multiprocessing.get_context(start_method) if start_method else None
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        pids = {future.result() for future in [executor.submit(_warm_up) for _ in range(workers)]}
+        logging.info(f"Пул процессов для тяжёлых вычислений запущен ({start_method or 'по умолчанию'}): {len(pids)} процесс(а)")
+        return executor
+    except Exception as e:
+        logging.error(f"Не удалось запустить пул процессов, вычисления остаются в процессе бота: {e}", exc_info=True)
+        return None
+
+def start_cpu_pool(workers: Optional[int] = None) -> Optional[ProcessPoolExecutor]:
+    """
+    Создаёт пул процессов и сразу запускает все процессы (пока в боте нет других потоков:
+    на Linux процессы создаются через fork и наследуют уже загруженные модули).
+    """
+    global _executor, _pool_closed
+    workers = CPU_POOL_WORKERS if workers is None else workers
+    _pool_closed = False
+    if _executor is not None or workers <= 0:
+        return _executor
+    _executor = _create_pool(workers, "fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    return _executor
+
+async def _rebuild_cpu_pool() -> None:
+    """Пересоздаёт сломанный пул в отдельном потоке, не задерживая event loop."""
+    global _executor
+    executor = await asyncio.to_thread(_create_pool, CPU_POOL_WORKERS, REBUILD_START_METHOD)
+    if executor is None:
+        return
+    if _pool_closed or _executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        return
+    _executor = executor
+
+def shutdown_cpu_pool() -> None:
+    """Останавливает пул процессов (при завершении бота)."""
+    global _executor, _pool_closed
+    _pool_closed = True
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+def is_cpu_pool_running() -> bool:
+    return _executor is not None
+
+async def run_cpu(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Выполняет fn(*args) в пуле процессов и возвращает результат, не блокируя event loop.
+    Исключения fn пробрасываются как есть.
+    """
+    global _executor, _rebuild_task
+    name = getattr(fn, "__name__", "fn")
+    stats = _offload_stats.setdefault(name, {"calls": 0, "inline": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+    stats["calls"] += 1
+    started_at = time.monotonic()
+    try:
+        if _executor is None:
+            stats["inline"] += 1
+            return fn(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+        except BrokenProcessPool:
+            logging.error("Пул процессов сломан (процесс завершился аварийно) — пересоздаём, вычисление выполняем в процессе бота")
+            broken, _executor = _executor, None
+            broken.shutdown(wait=False, cancel_futures=True)
+            if _rebuild_task is None or _rebuild_task.done():
+                _rebuild_task = asyncio.get_running_loop().create_task(_rebuild_cpu_pool())
+            stats["inline"] += 1
+            return fn(*args)
+    finally:
+        elapsed = time.monotonic() - started_at
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+def write_json_snapshot(path: str, payload: bytes, indent: Optional[int] = 2) -> None:
+    """
+    Записывает снимок данных в JSON-файл атомарно (временный файл + замена).
+    payload — pickle.dumps(данные): снимок делается в процессе бота одной быстрой операцией,
+    а медленная сериализация в JSON с отступами идёт в процессе пула.
+    """
+    data = pickle.loads(payload)
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    shutil.move(temp_file, path)
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """Фоновая задача: каждые interval секунд замеряет, насколько event loop опоздал разбудить её."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        _lag_samples.append(lag)
+        _lag_stats["max"] = max(_lag_stats["max"], lag)
+        if lag >= LOOP_LAG_WARN_SECONDS:
+            _lag_stats["stalls"] += 1
+            logging.warning(f"Event loop был заблокирован на {lag * 1000:.0f} мс")
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def get_loop_lag_stats() -> Dict[str, float]:
+    """Задержка event loop по последним замерам (с): p50, p99, максимум с запуска, число «замираний»."""
+    samples = list(_lag_samples)
+    return {
+        "samples": len(samples),
+        "p50": _percentile(samples, 0.5),
+        "p99": _percentile(samples, 0.99),
+        "max": _lag_stats["max"],
+        "stalls": _lag_stats["stalls"],
+    }
+
+def format_cpu_offload_stats() -> str:
+    """Текстовый отчёт для админ-команды: задержка event loop и вынесенные в пул вычисления."""
+    lag = get_loop_lag_stats()
+    pool_state = f"{CPU_POOL_WORKERS} процесс(а)" if _executor is not None else "не запущен"
+    lines = [
+        "⚙️ <b>Event loop и пул процессов</b>",
+        f"Пул: {pool_state}",
+        f"Задержка loop: p50 {lag['p50'] * 1000:.0f} мс, p99 {lag['p99'] * 1000:.0f} мс, "
+        f"макс. {lag['max'] * 1000:.0f} мс, замираний ≥{LOOP_LAG_WARN_SECONDS * 1000:.0f} мс: {lag['stalls']:.0f}",
+    ]
+    for name, stats in sorted(_offload_stats.items()):
+        average = stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0
+        lines.append(
+            f"• {name}: вызовов {stats['calls']:.0f} (в процессе бота {stats['inline']:.0f}), "
+            f"в среднем {average * 1000:.0f} мс, макс. {stats['max_seconds'] * 1000:.0f} мс"
+        )
+    return "\n".join(lines)
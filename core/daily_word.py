@@ -0,0 +1,94 @@
+"""
+Слово Дня: промпт размышления, проверка ответа AI и подгонка текста под лимит подписи.
+Используется и при нажатии кнопки «Получить Слово Дня», и при заполнении пула размышлений.
+"""
+import re
+import logging
+from typing import Optional
+
+from core.ai_interaction import get_ai_response
+from utils.html_parser import convert_markdown_to_html
+from utils.message_layout import truncate_html, visible_length
+
+# Общая длина видимого текста подписи Слова Дня (без HTML-тегов)
+DAILY_WORD_MAX_TEXT_LEN = 350
+# Стих длиннее этого обрезается по слову
+MAX_SCRIPTURE_LEN = 200
+# Короче этого ответ AI не считаем размышлением
+MIN_REFLECTION_LEN = 60
+
+CALL_TO_ACTION = "\n\n💬 Примените это сегодня! Поделитесь мыслями в /new_chat."
+
+def build_reflection_prompt(scripture: str) -> str:
+    """Промпт для AI-размышления над стихом."""
+    return (
+        f"На основе стиха {scripture}, напиши вдохновляющее и духовно глубокое размышление в православном стиле "
+        "(3-4 абзаца, до 300 символов). Добавь исторический контекст, а также практическое применение в современной жизни "
+        "и связь с Евангелием. Стиль изложения - православный священник. Держи позитивный тон Нормана Пила. "
+        "Заверши вопросом для рефлексии, начиная его с эмодзи ❓."
+    )
+
+def _display_scripture(scripture: str) -> str:
+    if len(scripture) > MAX_SCRIPTURE_LEN:
+        return scripture[:MAX_SCRIPTURE_LEN].rsplit(' ', 1)[0] + "..."  # Обрезаем по слову
+    return scripture
+
+def _header_and_source(scripture: str, source: str) -> tuple[str, str]:
+    header_text = f"📖 <b>Слово Дня</b>\n\n<i>{_display_scripture(scripture)}</i>\n\n"
+    source_text = f"\n\n<b>Источник:</b> {source}"
+    return header_text, source_text
+
+def _reflection_budget(header_text: str, source_text: str) -> int:
+    """Сколько видимых символов остаётся на размышление (после «✨ »)."""
+    emoji_length = 2  # "✨ " в начале размышления
+    return (
+        DAILY_WORD_MAX_TEXT_LEN - visible_length(header_text) - visible_length(source_text)
+        - visible_length(CALL_TO_ACTION) - emoji_length
+    )
+
+def fit_reflection(reflection: str, scripture: str, source: str) -> str:
+    """
+    Укорачивает размышление (по слову, с «...») так, чтобы подпись целиком
+    уложилась в DAILY_WORD_MAX_TEXT_LEN видимых символов.
+    """
+    header_text, source_text = _header_and_source(scripture, source)
+    reflection_text = f"✨ {convert_markdown_to_html(reflection, preserve_html_tags=False)}"
+    if visible_length(header_text + reflection_text + source_text + CALL_TO_ACTION) <= DAILY_WORD_MAX_TEXT_LEN:
+        return reflection
+
+    available_length = _reflection_budget(header_text, source_text) - 10  # запас 10 символов
+    if available_length <= 0 or len(reflection) <= available_length:
+        return reflection
+    truncated = reflection[:available_length - 3]  # оставляем место для "..."
+    # Пытаемся обрезать по последнему пробелу
+    if ' ' in truncated:
+        return truncated.rsplit(' ', 1)[0] + "..."
+    return truncated + "..."
+
+def build_daily_word_caption(scripture: str, source: str, reflection: str) -> str:
+    """Собирает HTML-подпись Слова Дня: стих, размышление, источник и призыв."""
+    header_text, source_text = _header_and_source(scripture, source)
+    reflection_html = convert_markdown_to_html(fit_reflection(reflection, scripture, source), preserve_html_tags=False)
+    # Размышление укорочено ещё до разметки; здесь — гарантия лимита без разрезанных тегов
+    reflection_html = truncate_html(reflection_html, _reflection_budget(header_text, source_text), ellipsis="...")
+    return header_text + f"✨ {reflection_html}" + source_text + CALL_TO_ACTION
+
+def is_valid_reflection(text: Optional[str]) -> bool:
+    """Проверяет, что ответ AI похож на размышление: достаточно длинный и на русском."""
+    if not text:
+        return False
+    stripped = text.strip()
+    return len(stripped) >= MIN_REFLECTION_LEN and bool(re.search(r'[а-яё]', stripped, re.IGNORECASE))
+
+async def generate_reflection(scripture: str, source: str, call_site: str = "daily_word") -> Optional[str]:
+    """
+    Генерирует размышление над стихом, проверяет и подгоняет его под лимит подписи.
+
+    :return: Готовый текст или None, если ответ AI не прошёл проверку.
+    :raises AIError: если AI недоступен.
+    """
+    reflection = await get_ai_response(build_reflection_prompt(scripture), prompt_sections=("role", "style"), call_site=call_site)
+    if not is_valid_reflection(reflection):
+        logging.warning(f"Размышление для Слова Дня ({source}) не прошло проверку: {(reflection or '')[:80]}")
+        return None
+    return fit_reflection(reflection.strip(), scripture, source)
@@ -0,0 +1,226 @@
+"""
+Обратный индекс именин: нормализованное имя -> даты (новый стиль), в которые его празднуют
+по данным календаря. Строится из годового пакета календаря и кэша календаря,
+поэтому «когда именины у Марии?» не требует перебора данных всего года.
+
+Память святых с неподвижной датой повторяется каждый год в тот же день нового стиля,
+но переносить месяц и день на другие годы можно, только если индекс покрывает весь год:
+иначе пропущенные дни не дают других дат тех же именин. Поэтому для каждого дня года
+хранится, за какие годы он проиндексирован; пока покрыт не весь год, поиск показывает
+только даты, которые есть в данных, и сообщает, что покрытие неполное.
+Памяти в дни подвижных праздников (MOVABLE_FEASTS: Лазарь в Лазареву субботу, жёны-мироносицы)
+переносятся на другие годы не по месяцу и дню, а по смещению от Пасхи.
+Индекс перестраивается не чаще раза в NAMEDAY_INDEX_TTL_SECONDS (и после ночной предзагрузки).
+
+Записи сайтов пишут имя по-разному: «Се́ргий» (с ударением), «Прп. Се́ргия Радонежского»
+(в родительном падеже после сана). normalize_name снимает ударения, пропускает сан и приводит
+имя после сокращённого сана или сана в косвенном падеже к именительному.
+"""
+import re
+import time
+import logging
+import threading
+import unicodedata
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.calendar_bundle import iter_bundle_days
+from core.calendar_cache import iter_cached_days
+from utils.html_parser import CALENDAR_PARSER_VERSION
+
+NAMEDAY_INDEX_TTL_SECONDS = 3600
+
+# Саны и чины святости перед именем в именительном падеже («святитель Николай»)
+SAINT_TITLES = {
+    "пророк", "страстотерпец", "святой", "святая", "святитель", "мученик", "мученица", "преподобный",
+    "преподобная", "великомученик", "великомученица", "праведный", "праведная", "апостол", "блаженный",
+    "блаженная", "священномученик", "благоверный", "благоверная", "царевич", "князь", "княгиня",
+}
+# Сокращения санов и саны в косвенных падежах: имя после них — в родительном или дательном
+# падеже («Прп. Се́ргия», «Святителю Николаю»)
+SAINT_TITLES_OBLIQUE = {
+    "св", "свв", "свт", "свтт", "сщмч", "сщмчч", "мч", "мчч", "мц", "мцц", "вмч", "вмчч", "вмц", "вмцц",
+    "прп", "прпп", "прмч", "прмчч", "прмц", "ап", "апп", "блж", "блгв", "блгвв", "прав", "равноап",
+    "равноапп", "исп", "прор", "бессребр", "страстот", "свящ",
+    "святого", "святому", "святых", "святителя", "святителю", "святителей", "мученика",
+    "мученику", "мученицы", "мученице", "мучеников", "мучениц", "преподобного", "преподобному",
+    "преподобной", "преподобных", "великомученика", "великомученику", "великомученицы", "великомученице",
+    "праведного", "праведному", "праведной", "праведных", "апостола", "апостолу", "апостолов",
+    "блаженного", "блаженному", "блаженной", "священномученика", "священномученику", "священномучеников",
+    "благоверного", "благоверному", "благоверной", "благоверных", "пророка", "пророку", "страстотерпца",
+    "страстотерпцев", "равноапостольного", "равноапостольной", "исповедника", "царевича", "князя",
+    "княгини", "царицы",
+}
+# Служебные слова между саном и именем («Ап. от 70-ти Карпа»)
+_SKIP_TOKENS = {"от", "ти", "из", "и"}
+# Окончания косвенных падежей -> окончание именительного (проверяются по порядку, длинные раньше)
+_OBLIQUE_ENDINGS = (
+    ("ия", "ий"), ("ию", "ий"), ("ии", "ия"), ("ея", "ей"), ("ею", "ей"), ("ая", "ай"), ("аю", "ай"),
+    ("ьи", "ья"), ("ье", "ья"), ("ки", "ка"), ("ги", "га"), ("хи", "ха"), ("ы", "а"), ("е", "а"),
+    ("я", "ь"), ("ю", "ь"), ("и", "я"), ("а", ""), ("у", ""),
+)
+# Имена с беглой гласной и женские имена на -ь: косвенная форма -> именительная
+_OBLIQUE_EXCEPTIONS = {
+    "павла": "павел", "павлу": "павел", "льва": "лев", "льву": "лев", "любови": "любовь",
+}
+
+# Гражданская форма имени -> церковная (как имя записано в святцах)
+CHURCH_NAME_FORMS = {
+    "иван": "иоанн", "юрий": "георгий", "егор": "георгий", "денис": "дионисий", "сергей": "сергий",
+    "дмитрий": "димитрий", "алексей": "алексий", "семен": "симеон", "федор": "феодор",
+    "наталья": "наталия", "татьяна": "татиана", "софья": "софия", "дарья": "дария", "юлия": "иулия",
+    "ульяна": "иулиания", "светлана": "фотиния", "марина": "маргарита", "полина": "пелагия",
+    "аксинья": "ксения", "оксана": "ксения", "василиса": "василисса", "елизавета": "елисавета",
+    "яна": "иоанна", "жанна": "иоанна", "эмилия": "емилия", "илья": "илия",
+}
+
+_NAME_TOKEN = re.compile(r"[А-ЯЁа-яё]+")
+
+# Все дни невисокосного года: индекс покрывает год, если в нём есть каждый из них (29 февраля не обязательно)
+_YEAR_DAYS = frozenset((day.month, day.day) for day in (date(2001, 1, 1) + timedelta(days=shift) for shift in range(365)))
+
+_lock = threading.Lock()
+# имя -> {дата}
+_index: Dict[str, Set[date]] = {}
+# (месяц, день) -> {год}: за какие годы день есть в индексе
+_coverage: Dict[Tuple[int, int], Set[int]] = {}
+_built_at = 0.0
+_days_indexed = 0
+
+def _strip_accents(text: str) -> str:
+    """Снимает ударения и другие надстрочные знаки, кроме краткой (й остаётся й, ё становится е)."""
+    decomposed = unicodedata.normalize("NFD", text)
+    return unicodedata.normalize("NFC", "".join(c for c in decomposed if not unicodedata.combining(c) or c == "\u0306"))
+
+def _to_nominative(name: str) -> str:
+    if name in _OBLIQUE_EXCEPTIONS:
+        return _OBLIQUE_EXCEPTIONS[name]
+    for ending, nominative in _OBLIQUE_ENDINGS:
+        if name.endswith(ending) and len(name) > len(ending) + 1:
+            return name[:-len(ending)] + nominative
+    return name
+
+def normalize_name(text: Optional[str]) -> Optional[str]:
+    """
+    Имя из записи именин или из запроса пользователя в единой форме: первое слово, которое
+    не сан, без ударений, в нижнем регистре, «ё» -> «е», в именительном падеже
+    (после сокращённого сана или сана в косвенном падеже), гражданская форма -> церковная.
+    """
+    if not text:
+        return None
+    oblique = False
+    for token in _NAME_TOKEN.findall(_strip_accents(text)):
+        name = token.lower()
+        if name in SAINT_TITLES_OBLIQUE:
+            oblique = True
+            continue
+        if name in SAINT_TITLES or name in _SKIP_TOKENS:
+            continue
+        if oblique:
+            name = _to_nominative(name)
+        return CHURCH_NAME_FORMS.get(name, name)
+    return None
+
+def _parse_date_str(date_str: str) -> date:
+    return date(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:8]))
+
+def build_nameday_index(days: Iterable[Tuple[str, dict]]) -> Dict[str, Set[date]]:
+    """Индекс имя -> {дата} по данным дней: пары ('YYYYMMDD', данные календаря)."""
+    index: Dict[str, Set[date]] = {}
+    for date_str, data in days:
+        day = _parse_date_str(date_str)
+        for entry in data.get("namedays") or []:
+            name = normalize_name(entry)
+            if name:
+                index.setdefault(name, set()).add(day)
+    return index
+
+def build_coverage(date_strs: Iterable[str]) -> Dict[Tuple[int, int], Set[int]]:
+    """(месяц, день) -> {год} по датам 'YYYYMMDD', из которых построен индекс."""
+    coverage: Dict[Tuple[int, int], Set[int]] = {}
+    for date_str in date_strs:
+        day = _parse_date_str(date_str)
+        coverage.setdefault((day.month, day.day), set()).add(day.year)
+    return coverage
+
+def covers_full_year(coverage: Dict[Tuple[int, int], Set[int]]) -> bool:
+    """Есть ли в индексе каждый день года — тогда даты неподвижных памятей переносятся на другие годы."""
+    return _YEAR_DAYS <= coverage.keys()
+
+def rebuild_nameday_index() -> int:
+    """Перестраивает индекс из пакета и кэша календаря; возвращает число имён."""
+    global _index, _coverage, _built_at, _days_indexed
+    days = dict(iter_cached_days(CALENDAR_PARSER_VERSION))
+    # Пакет собирается из обеих страниц — его данные важнее кэша
+    days.update(iter_bundle_days(CALENDAR_PARSER_VERSION))
+    index = build_nameday_index(days.items())
+    coverage = build_coverage(days)
+    with _lock:
+        _index, _coverage, _built_at, _days_indexed = index, coverage, time.time(), len(days)
+    logging.info(
+        f"Индекс именин построен: имён {len(index)}, дней {len(days)}, "
+        f"дней года {len(coverage)}{'' if covers_full_year(coverage) else ' (покрытие неполное)'}"
+    )
+    return len(index)
+
+def _ensure_index() -> Tuple[Dict[str, Set[date]], Dict[Tuple[int, int], Set[int]]]:
+    if time.time() - _built_at > NAMEDAY_INDEX_TTL_SECONDS:
+        rebuild_nameday_index()
+    with _lock:
+        return _index, _coverage
+
+def _dates_in_year(dates: Set[date], year: int) -> List[date]:
+    """
+    Даты именин в году year: для известной даты в день подвижного праздника — тот же день
+    от Пасхи года year, для остальных — тот же месяц и день (29 февраля — только в високосный год).
+    """
+    from core.calendar_data import MOVABLE_FEASTS, julian_pascha # Импортируем здесь, чтобы избежать циклического импорта
+    pascha = julian_pascha(year)
+    result = set()
+    for day in dates:
+        shift = (day - julian_pascha(day.year)).days
+        if shift in MOVABLE_FEASTS:
+            result.add(pascha + timedelta(days=shift))
+            continue
+        try:
+            result.add(day.replace(year=year))
+        except ValueError:
+            pass
+    return sorted(result)
+
+def upcoming_dates(dates: Set[date], full_year: bool, count: int, today: date) -> List[date]:
+    """
+    Ближайшие count дат именин, начиная с today, по известным датам имени. При неполном покрытии
+    года — только сами известные даты (их может быть меньше count); при полном — и следующие годы.
+    """
+    if not full_year:
+        return sorted(day for day in dates if day >= today)[:count]
+    if not dates:
+        return []
+    result: List[date] = []
+    year = today.year
+    # Каждый год даёт хотя бы одну дату (кроме одного 29 февраля — оно бывает раз в четыре года)
+    while len(result) < count and year <= today.year + 4 * count:
+        result.extend(day for day in _dates_in_year(dates, year) if day >= today)
+        year += 1
+    return result[:count]
+
+def next_namedays(name: str, count: int = 5, today: Optional[date] = None) -> Tuple[List[date], bool]:
+    """Ближайшие count дат именин для имени в любой форме и признак, покрывает ли индекс весь год."""
+    index, coverage = _ensure_index()
+    full_year = covers_full_year(coverage)
+    dates = index.get(normalize_name(name) or "", set())
+    return upcoming_dates(dates, full_year, count, today or date.today()), full_year
+
+def is_nameday(name: str, day: date) -> bool:
+    """Празднуются ли именины name в день day (по индексу; на другие годы — только при полном покрытии)."""
+    index, coverage = _ensure_index()
+    dates = index.get(normalize_name(name) or "", set())
+    if day in dates:
+        return True
+    return covers_full_year(coverage) and day in _dates_in_year(dates, day.year)
+
+def get_nameday_index_stats() -> Dict[str, float]:
+    """Размер индекса: имён, дней, из которых он построен, дней года в нём и когда построен."""
+    with _lock:
+        return {"names": len(_index), "days": _days_indexed, "year_days": len(_coverage), "built_at": _built_at}
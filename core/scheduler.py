@@ -18,6 +18,7 @@ from aiogram.enums import ParseMode
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from html import escape
 from utils.html_parser import convert_markdown_to_html
+from utils.message_layout import MAX_CAPTION_LEN, truncate_html, visible_length
 
 from core.content_library import (
     daily_quotes,
@@ -30,34 +31,19 @@ from core.content_library import (
 )
 from core.user_database import user_db, get_all_users_with_namedays
 from core.content_sender import send_content_message
-from core.calendar_data import fetch_and_cache_calendar_data
-from core.ai_interaction import get_ai_response # Импортируем для AI-генерации
+from core.calendar_data import get_calendar_data
+from core.cpu_offload import run_cpu
+from core.calendar_render import render_calendar_messages
+from utils.html_parser import fetch_url
+from core.nameday_index import is_nameday, normalize_name
+from core.ai_interaction import get_ai_json_response # Импортируем для AI-генерации
+from core.ai_errors import AIError
 from core.subscription_checker import is_premium, is_trial_active, is_subscription_active, is_free_period_active # Импортируем для проверки премиум доступа
 
-MAX_PHOTO_CAPTION_LEN = 1024
-
-def trim_to_limit(text: str, limit: int) -> str:
-    if len(text) <= limit:
-        return text
-    trimmed = text[:limit].rstrip()
-    return trimmed.rsplit(' ', 1)[0] if ' ' in trimmed else trimmed
-
-def trim_to_sentence(text: str, limit: int, min_len: int) -> str:
-    if len(text) <= limit:
-        return text
-    trimmed = text[:limit].rstrip()
-    matches = list(re.finditer(r'[.!?…](?:\s|$)', trimmed))
-    if matches:
-        last_end = matches[-1].end()
-        if last_end >= min_len:
-            return trimmed[:last_end].rstrip()
-    return trim_to_limit(text, limit)
-
-def is_ai_error(text: str | None) -> bool:
-    if not text:
-        return True
-    lowered = text.strip().lower()
-    return lowered.startswith("ошибка") or lowered.startswith("произошла ошибка")
+# Минимальная длина полей JSON-ответа AI: короче — промах схемы, AI переспрашивается один раз
+MIN_AI_PRAYER_LEN = 50
+MIN_AI_EXHORTATION_LEN = 80
+MIN_AI_REFLECTION_LEN = 200
 
 def pick_daily_word_image_filename() -> str | None:
     images_dir = os.path.join('assets', 'images', 'daily_word')
@@ -76,73 +62,11 @@ def get_morning_fallback_message(target_date: date) -> tuple[str, str]:
     entry = morning_messages[index]
     return entry["prayer"], entry["exhortation"]
 
-def parse_morning_ai_response(text: str) -> tuple[str, str] | None:
-    if not text:
-        return None
-    # Используем lookahead (?=...) чтобы граница "Напутствие:" не захватывалась в текст молитвы.
-    # Это предотвращает дублирование: молитва не будет содержать строку "Напутствие: ..."
-    prayer_match = re.search(r'(?is)молитва\s*[:\-]\s*(.+?)(?=\s*напутствие\s*[:\-]|$)', text)
-    exhort_match = re.search(r'(?is)напутствие\s*[:\-]\s*(.+)$', text)
-    if prayer_match and exhort_match:
-        prayer_text = prayer_match.group(1).strip()
-        exhort_text = exhort_match.group(1).strip()
-        logging.debug(f"Парсинг AI ответа успешен. Молитва: {len(prayer_text)} символов, Напутствие: {len(exhort_text)} символов")
-        return prayer_text, exhort_text
-    logging.warning(f"Не удалось распарсить AI ответ. Prayer match: {bool(prayer_match)}, Exhort match: {bool(exhort_match)}")
-    return None
-
 def sanitize_plain_text(text: str) -> str:
     if not text:
         return ""
     return re.sub(r'<[^>]+>', '', text).strip()
 
-def strip_section_label(text: str, label: str) -> str:
-    """
-    Удаляет метку секции (например, "Молитва:" или "Напутствие:") из начала текста
-    и из начала каждой строки (для обработки дублирования от AI).
-    """
-    if not text:
-        return ""
-    # Удаляем метку с начала текста и с начала каждой внутренней строки (если есть дубликаты)
-    # Флаг MULTILINE делает ^ соответствующим началу каждой строки, а не только началу текста
-    pattern = rf'^\s*{re.escape(label)}\s*[:\-]\s*'
-    text = re.sub(pattern, '', text, flags=re.IGNORECASE | re.MULTILINE).strip()
-    
-    return text
-
-
-def remove_duplicate_exhortation(text: str) -> str:
-    """
-    Удаляет дублирование "Напутствие на день:" в тексте напутствия.
-    AI иногда возвращает: "Текст. Напутствие на день: Текст. Ещё текст" — оставляем только уникальную часть.
-    """
-    if not text:
-        return ""
-    dup_pattern = r'(?is)\s*напутствие\s+на\s+день\s*[:\-]\s*'
-    parts = re.split(dup_pattern, text)
-    if len(parts) <= 1:
-        return text.strip()
-    first = parts[0].strip()
-    rest = parts[1].strip()
-    if not rest:
-        return first
-    # Удаляем из rest дубликат начала first (по предложениям)
-    first_sents = re.split(r'(?<=[.!?])\s+', first)
-    rest_sents = re.split(r'(?<=[.!?])\s+', rest)
-    skip = 0
-    for i, rs in enumerate(rest_sents):
-        if i >= len(first_sents):
-            break
-        fs = first_sents[i]
-        if len(fs) >= 20 and len(rs) >= 20 and fs[:30] == rs[:30]:
-            skip = i + 1
-        else:
-            break
-    if skip > 0:
-        unique = ' '.join(rest_sents[skip:]).strip()
-        return (first + ' ' + unique).strip() if unique else first
-    return text.strip()
-
 def build_evening_prayer_by_index(index: int) -> str:
     parts = evening_prayer_parts
     openings = parts.get("openings", [])
@@ -176,33 +100,48 @@ def build_evening_prayer_by_index(index: int) -> str:
     closing = pick_from(closings, len(closings))
     return " ".join([opening, thanksgiving, repentance, request, closing])
 
+def find_ical_theme(ical_content: str, day: date) -> str | None:
+    """
+    Разбирает содержимое .ics и возвращает название первого события на дату day.
+    Разбор целого календаря занимает заметное время, поэтому вызывается через run_cpu.
+    """
+    calendar = Calendar.from_ical(ical_content)
+
+    for component in calendar.walk():
+        if component.name == "VEVENT":
+            event_start_dt = component.get('dtstart').dt
+            # Если dtstart является datetime, преобразуем его в date
+            if isinstance(event_start_dt, datetime):
+                event_start_date = event_start_dt.date()
+            else:
+                event_start_date = event_start_dt
+
+            if event_start_date == day:
+                summary = str(component.get('summary'))
+                # Возвращаем только название (первую часть до точки)
+                return summary.split('.')[0].strip()
+    return None
+
+# Тема дня из iCal по (URL, дата): пока лента не меняется (ответ 304), повторно не разбираем
+_ical_themes: dict = {}
+
 async def get_calendar_theme_from_ical(ical_url: str) -> str | None:
     """
-    Скачивает .ics файл, парсит его и возвращает название первого события на текущую дату.
+    Скачивает .ics файл (условным запросом), парсит его и возвращает название первого события на текущую дату.
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(ical_url) as response:
-                response.raise_for_status()  # Вызовет исключение для статусов 4xx/5xx
-                ical_content = await response.text()
-
-        calendar = Calendar.from_ical(ical_content)
+        result = await fetch_url(ical_url)
+        if result.text is None:
+            return None
         today = date.today()
-
-        for component in calendar.walk():
-            if component.name == "VEVENT":
-                event_start_dt = component.get('dtstart').dt
-                # Если dtstart является datetime, преобразуем его в date
-                if isinstance(event_start_dt, datetime):
-                    event_start_date = event_start_dt.date()
-                else:
-                    event_start_date = event_start_dt
-
-                if event_start_date == today:
-                    summary = str(component.get('summary'))
-                    # Возвращаем только название (первую часть до точки)
-                    return summary.split('.')[0].strip()
-        return None
+        if result.not_modified and (ical_url, today) in _ical_themes:
+            return _ical_themes[(ical_url, today)]
+        # Темы прошлых дней не нужны, а если лента изменилась — не верны и сегодняшние
+        for key in [key for key in _ical_themes if key[0] == ical_url and (key[1] != today or not result.not_modified)]:
+            del _ical_themes[key]
+        theme = await run_cpu(find_ical_theme, result.text, today)
+        _ical_themes[(ical_url, today)] = theme
+        return theme
     except aiohttp.ClientError as e:
         logging.error(f"Ошибка сети при получении iCal по URL {ical_url}: {e}")
         return None
@@ -263,49 +202,16 @@ async def send_morning_notification(bot: Bot):
 
     today = datetime.now()
     date_str = today.strftime("%Y%m%d")
-    calendar_data = await fetch_and_cache_calendar_data(date_str)
+    calendar_data = await get_calendar_data(date_str)
 
     if not calendar_data:
         logging.error(f"ERROR: calendar_data is unavailable for date {date_str} in morning notification.")
         return
 
-    # Формируем список праздников
-    holidays = calendar_data.get("holidays", [])
-    if holidays:
-        holidays_text = "✨ <b>Праздники:</b>\n" + "\n".join([f"• {h}" for h in holidays]) + "\n\n"
-    else:
-        holidays_text = "✨ <b>Сегодня больших праздников не найдено.</b>\n\n"
-
-    # Формируем список именин
-    namedays = calendar_data.get("namedays", [])
-    if namedays:
-        namedays_text = "😇 <b>Именины:</b>\n" + "\n".join([f"• {n}" for n in namedays]) + "\n\n"
-    else:
-        namedays_text = "😇 <b>Именин нет.</b>\n\n"
-
-    # Основная часть сообщения (как в /calendar)
-    main_caption_text = (
-        f"🗓️ <b>Православный календарь на сегодня</b> ✨\n\n"
-        f"🗓️ <b>Дата:</b> {today.strftime('%d.%m.%Y')}\n\n"
-        f"{holidays_text}"
-        f"ℹ️ <b>Пост:</b> {calendar_data.get('fasting', 'Информация о посте не найдена.')}\n\n"
-        f"🏛️ <b>Седмица:</b> {calendar_data.get('week_info', 'Информация о седмице не найдена.')}\n\n"
-        f"{namedays_text}"
-        f"_Данные предоставлены pravoslavie.ru и azbyka.ru_"
-    )
-
-    # Отдельное сообщение для мыслей Феофана Затворника
-    theophan_thoughts = calendar_data.get('theophan_thoughts', [])
-    if theophan_thoughts:
-        header = "📖 <b>Мысли Святителя Феофана Затворника на каждый день года:</b>\n\n"
-        formatted_thoughts = []
-        for thought in theophan_thoughts:
-            cleaned_thought = re.sub(r'^\s*[\(\);,.]+\s*', '', thought)
-            if cleaned_thought.strip():
-                formatted_thoughts.append(f"✨ <i>{cleaned_thought.strip()}</i>\n\n")
-        theophan_message_text = header + "".join(formatted_thoughts).strip()
-    else:
-        theophan_message_text = None
+    # Сообщения календаря (как в /calendar) и мысли Феофана Затворника — общий рендерер с /calendar
+    calendar_messages = render_calendar_messages(date_str, calendar_data, variant="broadcast")
+    main_caption_text = calendar_messages["main"]
+    theophan_message_text = calendar_messages["theophan"]
 
     # Определяем тему дня для контекста утреннего напутствия
     azbyka_api_key = os.getenv("AZBYKA_API_KEY")
@@ -325,60 +231,49 @@ async def send_morning_notification(bot: Bot):
     theme_line = f"Тема дня: {morning_theme}\n" if morning_theme else ""
     week_line = f"Седмица (НЕ повторяй этот текст в напутствии): {week_info}\n" if week_info and week_info != "Информация о седмице не найдена." else ""
     
+    # Бюджет подписи к фото делим между молитвой и напутствием заранее: те же лимиты
+    # называем AI в промпте и по ним же детерминированно обрезаем ответ
+    greeting_prefix = (
+        "🌅 <b>Доброе утро!</b>\n\n"
+        "🙏 <b>Утренняя молитва:</b>\n"
+    )
+    greeting_mid = "\n\n💡 <b>Напутствие на день:</b>\n"
+    available_len = MAX_CAPTION_LEN - visible_length(greeting_prefix) - visible_length(greeting_mid)
+    prayer_limit = max(0, int(available_len * 0.45))
+    exhort_limit = max(0, available_len - prayer_limit)
+
     morning_prompt = (
         f"ВАЖНО: Сегодня {current_date_str}. Текущий год: {today.year}.\n\n"
         "Составь утреннее приветствие для православного бота.\n"
-        "Структура ответа (строго соблюдай):\n"
-        "Молитва: <краткая молитва в каноническом православном стиле, как из молитвослова, 2-4 предложения>\n"
-        "Напутствие: <глубокое напутствие на день, 3-5 предложений, связь с Писанием, церковной жизнью или святым>\n\n"
-        "НЕ дублируй в напутствии текст. Пиши только ОДИН блок Напутствие:, без заголовка 'Напутствие на день' в тексте.\n\n"
+        "Верни ответ строго в формате JSON:\n"
+        '{"prayer": "краткая молитва", "exhortation": "напутствие на день"}\n'
+        f"- prayer: краткая молитва в каноническом православном стиле, как из молитвослова, 2-4 предложения, не длиннее {prayer_limit} символов\n"
+        f"- exhortation: глубокое напутствие на день, 3-5 предложений, связь с Писанием, церковной жизнью или святым, не длиннее {exhort_limit} символов\n"
+        "Без заголовков («Молитва:», «Напутствие:») внутри полей, без эмодзи, без списков.\n\n"
         f"{theme_line}{week_line}"
         "КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА О ДАТАХ И ХРОНОЛОГИИ:\n"
         "1. Говори ТОЛЬКО о событиях, которые актуальны СЕГОДНЯ или УЖЕ произошли в текущем году.\n"
         "2. НИКОГДА не упоминай события из будущего как уже произошедшие. Проверяй хронологию по текущей дате.\n"
         "3. Если тема дня относится к будущему празднику или событию - говори о ПОДГОТОВКЕ к нему, а не как о прошедшем.\n"
-        "4. Если не уверен в хронологии конкретного события - лучше говори ОБЩИМИ словами о вере, молитве и духовной жизни БЕЗ упоминания конкретных дат.\n\n"
-        "Общий объем 700-900 символов. Без эмодзи, без списков."
+        "4. Если не уверен в хронологии конкретного события - лучше говори ОБЩИМИ словами о вере, молитве и духовной жизни БЕЗ упоминания конкретных дат."
     )
     try:
-        ai_morning = await get_ai_response(morning_prompt)
-        if ai_morning and not is_ai_error(ai_morning):
-            logging.info(f"AI ответ получен, длина: {len(ai_morning)} символов")
-            logging.debug(f"AI ответ (первые 200 символов): {ai_morning[:200]}")
-            parsed = parse_morning_ai_response(ai_morning)
-            if parsed:
-                morning_prayer, morning_exhortation = parsed
-                logging.info(f"AI ответ успешно распарсен. Молитва: {len(morning_prayer)} символов, Напутствие: {len(morning_exhortation)} символов")
-            else:
-                logging.warning("Не удалось распарсить AI ответ, используется fallback")
-        else:
-            logging.warning(f"AI вернул ошибку или пустой ответ, используется fallback")
+        ai_morning = await get_ai_json_response(
+            morning_prompt,
+            {"prayer": MIN_AI_PRAYER_LEN, "exhortation": MIN_AI_EXHORTATION_LEN},
+            prompt_sections=("calendar", "role"),
+            call_site="morning"
+        )
+        morning_prayer, morning_exhortation = ai_morning["prayer"], ai_morning["exhortation"]
+        logging.info(f"AI ответ получен. Молитва: {len(morning_prayer)} символов, Напутствие: {len(morning_exhortation)} символов")
+    except AIError as e:
+        logging.warning(f"AI недоступен для утреннего текста ({e}), используется fallback")
     except Exception as e:
         logging.error(f"Ошибка при генерации утреннего текста через AI: {e}")
 
-    # Приветствие с изображением
-    morning_prayer_clean = strip_section_label(sanitize_plain_text(morning_prayer), "молитва")
-    morning_exhortation_clean = strip_section_label(sanitize_plain_text(morning_exhortation), "напутствие")
-    morning_exhortation_clean = remove_duplicate_exhortation(morning_exhortation_clean)
-    
-    logging.debug(f"После очистки - Молитва: {len(morning_prayer_clean)} символов")
-    logging.debug(f"После очистки - Напутствие (первые 100 символов): {morning_exhortation_clean[:100]}")
-    
-    # Проверяем, не осталась ли метка "Напутствие:" в начале текста
-    if morning_exhortation_clean.lower().startswith("напутствие"):
-        logging.warning(f"⚠️ ВНИМАНИЕ: Метка 'Напутствие:' не была удалена! Текст: {morning_exhortation_clean[:150]}")
-    if morning_prayer_clean.lower().find("напутствие") != -1:
-        logging.warning(f"⚠️ ВНИМАНИЕ: Слово 'напутствие' найдено в тексте молитвы! Позиция: {morning_prayer_clean.lower().find('напутствие')}")
-    greeting_prefix = (
-        "🌅 <b>Доброе утро!</b>\n\n"
-        "🙏 <b>Утренняя молитва:</b>\n"
-    )
-    greeting_mid = "\n\n💡 <b>Напутствие на день:</b>\n"
-    available_len = MAX_PHOTO_CAPTION_LEN - len(greeting_prefix) - len(greeting_mid)
-    prayer_limit = max(0, int(available_len * 0.45))
-    exhort_limit = max(0, available_len - prayer_limit)
-    prayer_text = trim_to_sentence(morning_prayer_clean, prayer_limit, int(prayer_limit * 0.6))
-    exhort_text = trim_to_sentence(morning_exhortation_clean, exhort_limit, int(exhort_limit * 0.6))
+    # Приветствие с изображением (экранируем текст и обрезаем по предложению под бюджет)
+    prayer_text = truncate_html(escape(sanitize_plain_text(morning_prayer)), prayer_limit, int(prayer_limit * 0.6))
+    exhort_text = truncate_html(escape(sanitize_plain_text(morning_exhortation)), exhort_limit, int(exhort_limit * 0.6))
     greeting_text = (
         f"{greeting_prefix}"
         f"{prayer_text}"
@@ -471,6 +366,17 @@ async def send_afternoon_notification(bot: Bot):
     except Exception as e:
         logging.error(f"ERROR: Ошибка при выборе слова дня из daily_words для дневной рассылки: {e}")
     
+    # Формируем сообщение (экранируем все пользовательские данные)
+    scripture_escaped = escape(scripture) if scripture else ""
+    source_escaped = escape(source) if source else ""
+    base_caption = (
+        "📖 <b>Слово Дня</b>\n\n"
+        f"<i>{scripture_escaped}</i>\n"
+        f"<b>Источник:</b> {source_escaped}\n\n"
+    )
+    hashtags = "#Православие #СловоДня"
+    available_len = MAX_CAPTION_LEN - visible_length(base_caption) - len("\n\n") - visible_length(hashtags)
+
     # Генерируем AI-размышление (почти до лимита Telegram)
     ai_reflection = base_reflection
     try:
@@ -478,34 +384,26 @@ async def send_afternoon_notification(bot: Bot):
         prompt = (
             f"На основе стиха \"{scripture}\"{theme_context} напиши вдохновляющее размышление "
             "в православном стиле: глубоко, тепло, с вниманием к сердцу. "
-            "Объем 700-900 символов. 2-3 абзаца, без списков, без эмодзи. "
-            "Свяжи мысль со Священным Писанием и простым шагом на сегодня."
+            f"Объем 600-{max(0, available_len)} символов. 2-3 абзаца, без списков, без эмодзи. "
+            "Свяжи мысль со Священным Писанием и простым шагом на сегодня.\n"
+            'Верни ответ строго в формате JSON: {"reflection": "текст размышления"}'
         )
         logging.info(f"Сформирован промт для AI в дневной рассылке: {prompt[:100]}...")
-        ai_response = await get_ai_response(prompt)
-        if ai_response and not is_ai_error(ai_response):
-            ai_reflection = ai_response
-            logging.info("Получен AI-ответ для дневной рассылки.")
-        else:
-            logging.warning("WARNING: AI не сгенерировал размышление для дневной рассылки. Используем базовое.")
+        ai_response = await get_ai_json_response(
+            prompt, {"reflection": MIN_AI_REFLECTION_LEN}, prompt_sections=("role", "style"), call_site="afternoon"
+        )
+        ai_reflection = ai_response["reflection"]
+        logging.info("Получен AI-ответ для дневной рассылки.")
+    except AIError as e:
+        logging.warning(f"AI недоступен для дневной рассылки ({e}). Используем базовое.")
     except Exception as e:
         logging.error(f"ERROR: Ошибка при генерации AI-размышления в дневной рассылке: {e}. Используем базовое.")
-    
-    # Формируем сообщение (экранируем все пользовательские данные)
-    scripture_escaped = escape(scripture) if scripture else ""
-    source_escaped = escape(source) if source else ""
-    base_caption = (
-        "📖 <b>Слово Дня</b>\n\n"
-        f"<i>{scripture_escaped}</i>\n"
-        f"<b>Источник:</b> {source_escaped}\n\n"
-    )
-    hashtags = "#Православие #СловоДня"
-    available_len = MAX_PHOTO_CAPTION_LEN - len(base_caption) - len("\n\n") - len(hashtags)
+
     # Конвертируем Markdown в HTML для корректного форматирования (жирный, курсив и т.д.)
     # preserve_html_tags=False для безопасности: AI-контент не должен содержать готовые HTML-теги
     ai_reflection_html_converted = convert_markdown_to_html(ai_reflection, preserve_html_tags=False) if ai_reflection else ""
     if ai_reflection_html_converted:
-        ai_reflection_html = trim_to_sentence(ai_reflection_html_converted, max(0, available_len), int(available_len * 0.7))
+        ai_reflection_html = truncate_html(ai_reflection_html_converted, max(0, available_len), int(available_len * 0.7))
     else:
         ai_reflection_html = ""
     caption = (
@@ -586,21 +484,18 @@ async def send_evening_notification(bot: Bot):
         "- Язык: современный церковнославянский стиль, понятный и тёплый\n"
         "- БЕЗ эмодзи, БЕЗ заголовков типа 'Молитва:', только текст молитвы\n"
         "- Уникальная для каждого дня, отражающая вечерний покой и упование на Бога\n"
-        "- Если тема дня относится к будущему событию - НЕ говори о нем как о прошедшем"
+        "- Если тема дня относится к будущему событию - НЕ говори о нем как о прошедшем\n"
+        'Верни ответ строго в формате JSON: {"prayer": "текст молитвы"}'
     )
     
     try:
-        ai_evening = await get_ai_response(evening_prompt)
-        if ai_evening and not is_ai_error(ai_evening):
-            # Убираем возможные метки "Молитва:" если AI их добавил
-            ai_evening_clean = strip_section_label(sanitize_plain_text(ai_evening), "молитва")
-            if ai_evening_clean and len(ai_evening_clean) > 50:  # Проверяем, что получили нормальный ответ
-                evening_prayer = ai_evening_clean
-                logging.info("Получена AI-молитва для вечернего уведомления")
-            else:
-                logging.warning("AI-ответ для вечерней молитвы слишком короткий, используем fallback")
-        else:
-            logging.warning("AI не сгенерировал вечернюю молитву, используем fallback")
+        ai_evening = await get_ai_json_response(
+            evening_prompt, {"prayer": MIN_AI_PRAYER_LEN}, prompt_sections=("role",), call_site="evening"
+        )
+        evening_prayer = ai_evening["prayer"]
+        logging.info("Получена AI-молитва для вечернего уведомления")
+    except AIError as e:
+        logging.warning(f"AI недоступен для вечерней молитвы ({e}), используем fallback")
     except Exception as e:
         logging.error(f"Ошибка при генерации вечерней молитвы через AI: {e}. Используем fallback.")
     
@@ -618,11 +513,11 @@ async def send_evening_notification(bot: Bot):
         "🙏 <b>Вечерняя молитва:</b>\n"
     )
     reflection_header = "\n\n💬 <b>Поговорим?</b>\n"
-    remaining_len = MAX_PHOTO_CAPTION_LEN - len(base_prefix) - len(reflection_header)
+    remaining_len = MAX_CAPTION_LEN - visible_length(base_prefix) - visible_length(reflection_header)
     prayer_limit = max(0, int(remaining_len * 0.65))
     reflection_limit = max(0, remaining_len - prayer_limit)
-    evening_prayer_trimmed = trim_to_sentence(evening_prayer_escaped, prayer_limit, int(prayer_limit * 0.6))
-    reflection_trimmed = trim_to_sentence(reflection_prompt_escaped, reflection_limit, int(reflection_limit * 0.6))
+    evening_prayer_trimmed = truncate_html(evening_prayer_escaped, prayer_limit, int(prayer_limit * 0.6))
+    reflection_trimmed = truncate_html(reflection_prompt_escaped, reflection_limit, int(reflection_limit * 0.6))
 
     caption = f"{base_prefix}{evening_prayer_trimmed}{reflection_header}{reflection_trimmed}"
     
@@ -669,7 +564,7 @@ async def check_namedays(bot: Bot):
     logging.info("Запуск проверки именин...")
     
     tomorrow = datetime.now() + timedelta(days=1)
-    calendar_data = await fetch_and_cache_calendar_data(tomorrow.strftime("%Y%m%d"))
+    calendar_data = await get_calendar_data(tomorrow.strftime("%Y%m%d"))
 
     if not calendar_data:
         logging.error("ERROR: calendar_data is unavailable for nameday check.")
@@ -682,13 +577,14 @@ async def check_namedays(bot: Bot):
         for saint_name in calendar_data["namedays"]:
             if saint_name == "Сегодня именин не найдено.":
                 continue
-            saints_on_nameday.add(saint_name.split(' ')[0].lower())
+            saints_on_nameday.add(normalize_name(saint_name))
 
     users_with_namedays = get_all_users_with_namedays()
 
     for user_id, persons in users_with_namedays.items():
         for person_name in persons:
-            if person_name.lower() in saints_on_nameday:
+            # Индекс именин знает и дни, которых нет в завтрашних данных (например, полученных только с одного сайта)
+            if normalize_name(person_name) in saints_on_nameday or is_nameday(person_name, tomorrow.date()):
                 notification_text = (
                     f"✨ Напоминание! Завтра, {tomorrow_date}, день Ангела у вашего близкого '{person_name}'. "
                     "Не забудьте поздравить!"
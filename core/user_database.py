@@ -1,9 +1,12 @@
 # База данных пользователей с сохранением в файл
 import json
 import os
+import pickle
+import asyncio
 import threading
 import shutil
 from datetime import datetime # Импортируем datetime
+from core.cpu_offload import is_cpu_pool_running, run_cpu, write_json_snapshot
 
 USER_DB_FILE = "user_db.json"
 USER_DB_BACKUP_DIR = "backups"
@@ -83,10 +86,47 @@ def backup_user_db():
         logging.error(f"Ошибка при создании резервной копии БД: {e}")
         return False
 
+# Снимок базы, ещё не записанный на диск, и задача, которая пишет снимки по очереди
+_pending_snapshot = None
+_snapshot_writer = None
+
+def _build_snapshot() -> bytes:
+    """Снимок базы для записи: datetime -> строки ISO, упакованный pickle (быстро, в процессе бота)."""
+    data_to_save = {}
+    for user_id, user_data in user_db.items():
+        data_to_save[str(user_id)] = {}
+        for key, value in user_data.items():
+            if isinstance(value, datetime):
+                data_to_save[str(user_id)][key] = value.isoformat()
+            else:
+                data_to_save[str(user_id)][key] = value
+    return pickle.dumps(data_to_save, protocol=pickle.HIGHEST_PROTOCOL)
+
+async def _write_pending_snapshots():
+    """
+    Пишет последний снимок в пуле процессов; снимки, вытесненные более новыми, не пишутся.
+    Снимок остаётся в _pending_snapshot, пока запись не завершилась: если запись отменена
+    остановкой пула или упала, его запишет flush_user_db.
+    """
+    global _pending_snapshot
+    while _pending_snapshot is not None:
+        payload = _pending_snapshot
+        try:
+            await run_cpu(write_json_snapshot, USER_DB_FILE, payload)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении базы данных пользователей: {e}")
+            return
+        with _db_lock:
+            if _pending_snapshot is payload:
+                _pending_snapshot = None
+
 def save_user_db():
     """
     Сохраняет базу данных пользователей в файл с thread-safe блокировкой.
+    Внутри event loop при запущенном пуле процессов (core/cpu_offload.py) медленная
+    сериализация в JSON идёт в пуле, а частые сохранения подряд объединяются в одну запись.
     """
+    global _pending_snapshot, _snapshot_writer
     with _db_lock:
         try:
             # Создаем резервную копию каждые 100 сохранений
@@ -97,27 +137,38 @@ def save_user_db():
             if save_count % 100 == 0:
                 backup_user_db()
             
-            # Конвертируем datetime объекты в строки для JSON
-            data_to_save = {}
-            for user_id, user_data in user_db.items():
-                data_to_save[str(user_id)] = {}
-                for key, value in user_data.items():
-                    if isinstance(value, datetime):
-                        data_to_save[str(user_id)][key] = value.isoformat()
-                    else:
-                        data_to_save[str(user_id)][key] = value
-            
-            # Сначала пишем во временный файл
-            temp_file = USER_DB_FILE + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-            
-            # Атомарная замена файла (предотвращает повреждение при сбое)
-            shutil.move(temp_file, USER_DB_FILE)
+            payload = _build_snapshot()
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is None or not is_cpu_pool_running():
+                # Атомарная запись через временный файл (предотвращает повреждение при сбое)
+                write_json_snapshot(USER_DB_FILE, payload)
+                return
+            _pending_snapshot = payload
+            if _snapshot_writer is None or _snapshot_writer.done():
+                _snapshot_writer = loop.create_task(_write_pending_snapshots())
             
         except Exception as e:
             logging.error(f"Ошибка при сохранении базы данных пользователей: {e}")
 
+def flush_user_db():
+    """
+    Записывает на диск снимок, который ещё не успел записаться (вызывать при остановке бота,
+    после shutdown_cpu_pool: остановка дожидается идущей в пуле записи, и она не перезапишет
+    более новый снимок).
+    """
+    global _pending_snapshot
+    with _db_lock:
+        if _pending_snapshot is None:
+            return
+        try:
+            write_json_snapshot(USER_DB_FILE, _pending_snapshot)
+            _pending_snapshot = None
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении базы данных пользователей: {e}")
+
 # Импортируем logging для использования в функциях
 import logging
 
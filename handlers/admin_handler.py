@@ -6,6 +6,13 @@ from aiogram.filters import Command
 from aiogram.types import Message, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from core.user_database import user_db, get_user
 from core.subscription_checker import is_subscription_active, activate_premium_subscription, is_trial_active
+from core.ai_gateway import format_gateway_stats
+from core.ai_cache import format_ai_cache_stats
+from core.content_pool import format_content_pool_stats
+from core.ai_interaction import format_structured_output_stats
+from core.ai_metrics import format_ai_metrics
+from core.calendar_data import format_calendar_coverage
+from core.cpu_offload import format_cpu_offload_stats
 
 # Создаем роутер для админ-панели
 router = Router()
@@ -90,6 +97,33 @@ async def admin_command_handler(message: Message):
     )
     await message.answer(menu_text, parse_mode='HTML', reply_markup=build_admin_menu())
 
+@router.message(Command("ai_load"), F.chat.type == "private")
+async def ai_load_handler(message: Message):
+    """Показывает нагрузку на AI (слоты, очередь, отказы), статистику кэша ответов, пула контента и задержку event loop (только для админа)."""
+    if not is_admin(message.from_user.id):
+        await message.answer("Доступ запрещён", parse_mode='HTML')
+        return
+    await message.answer(
+        f"{format_gateway_stats()}\n\n{format_ai_cache_stats()}\n\n{format_content_pool_stats()}\n\n{format_structured_output_stats()}\n\n{format_cpu_offload_stats()}",
+        parse_mode='HTML'
+    )
+
+@router.message(Command("ai_stats"), F.chat.type == "private")
+async def ai_stats_handler(message: Message):
+    """Показывает задержки, токены, стоимость и ошибки вызовов AI по местам вызова (только для админа)."""
+    if not is_admin(message.from_user.id):
+        await message.answer("Доступ запрещён", parse_mode='HTML')
+        return
+    await message.answer(format_ai_metrics(), parse_mode='HTML')
+
+@router.message(Command("calendar_cache"), F.chat.type == "private")
+async def calendar_cache_handler(message: Message):
+    """Показывает покрытие кэша календаря на ближайшие дни и итог последней предзагрузки (только для админа)."""
+    if not is_admin(message.from_user.id):
+        await message.answer("Доступ запрещён", parse_mode='HTML')
+        return
+    await message.answer(format_calendar_coverage(), parse_mode='HTML')
+
 @router.message(Command("admin_stats"), F.chat.type == "private")
 async def admin_stats_handler(message: Message):
     """Показывает статистику бота с детальным списком активных подписок (только для админа)."""
@@ -43,7 +43,7 @@ async def prayer_topic_selection_handler(callback: CallbackQuery, bot: Bot, stat
 
     # Сначала сохраняем состояние — так оно не потеряется при сбое редактирования
     await state.set_state(PrayerState.waiting_for_details)
-    await state.update_data(prayer_topic=topic_text)
+    await state.update_data(prayer_topic=topic_text, prayer_topic_key=topic_key)
 
     try:
         if callback.message.photo:
@@ -1,17 +1,19 @@
 import locale
 import os
-import re # Добавляем импорт re для регулярных выражений
 import logging
 import asyncio
+from html import escape
 from datetime import datetime, timedelta
 from aiogram import Router, Bot
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, FSInputFile, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.enums import ChatAction
 from aiogram.fsm.context import FSMContext # Импортируем FSMContext
 from core.content_sender import send_and_delete_previous, send_content_message # Импортируем новую централизованную функцию
-from core.calendar_data import get_calendar_data, fetch_and_cache_calendar_data
+from core.calendar_data import MONTH_NAMES_GENITIVE, WEEKDAY_NAMES, get_calendar_data
+from core.nameday_index import next_namedays
+from core.calendar_render import render_calendar_messages
 from core.scheduler import pick_daily_word_image_filename
 from core.image_utils import pick_local_image
 from core.user_database import get_user # Импортируем get_user
@@ -44,9 +46,39 @@ async def calendar_handler(message: Message, bot: Bot, state: FSMContext):
     try:
         target_date = datetime.now()
         date_str = target_date.strftime("%Y%m%d")
-        calendar_data = await fetch_and_cache_calendar_data(date_str) or {} # Убедимся, что calendar_data всегда является словарем
+        main_message_sent = False
 
-        if not calendar_data: # Если calendar_data все еще пуст после установки значения по умолчанию
+        async def send_main_calendar(calendar_data: dict):
+            """Основное сообщение календаря; показывается, как только готовы обязательные поля."""
+            nonlocal main_message_sent
+            # Основная часть сообщения — общий рендерер с утренней рассылкой (собирается один раз на дату)
+            main_caption_text = render_calendar_messages(date_str, calendar_data)["main"]
+
+            builder = InlineKeyboardBuilder()
+
+            # Изображение из нашей базы (daily_word), fallback — logo.png
+            morning_image_filename = pick_daily_word_image_filename()
+            calendar_image = f"daily_word/{morning_image_filename}" if morning_image_filename else "logo.png"
+            logging.info(f"Calendar /calendar: image_name={calendar_image!r}")
+
+            await send_and_delete_previous(
+                bot=bot,
+                chat_id=chat_id,
+                state=state,
+                text=main_caption_text,
+                image_name=calendar_image,
+                reply_markup=builder.as_markup(),
+                show_typing=False,
+                delete_previous=False, # Не удаляем предыдущее сообщение (команду пользователя)
+                track_last_message=False
+            )
+            main_message_sent = True
+
+        # Если azbyka.ru ответит раньше pravoslavie.ru, основное сообщение уйдёт сразу,
+        # а мысли Феофана — когда догрузится вторая страница
+        calendar_data = await get_calendar_data(date_str, on_partial=send_main_calendar) or {} # Убедимся, что calendar_data всегда является словарем
+
+        if not calendar_data and not main_message_sent: # Если calendar_data все еще пуст после установки значения по умолчанию
             print(f"ERROR: calendar_data is empty for date {date_str}")
             await send_and_delete_previous(
                 bot=bot,
@@ -59,64 +91,12 @@ async def calendar_handler(message: Message, bot: Bot, state: FSMContext):
             )
             return
 
-        # Формируем список праздников
-        holidays_text = ""
-        holidays = calendar_data.get("holidays", [])
-        if holidays:
-            holidays_text = "✨ <b>Праздники:</b>\n" + "\n".join([f"• {h}" for h in holidays]) + "\n\n"
-        else:
-            holidays_text = "✨ <b>Сегодня больших праздников не найдено.</b>\n\n"
-        
-        # Формируем список именин
-        namedays_text = ""
-        namedays = calendar_data.get("namedays", [])
-        if namedays:
-            namedays_text = "😇 <b>Именины:</b>\n" + "\n".join([f"• {n}" for n in namedays]) + "\n\n"
-        else:
-            namedays_text = "😇 <b>Именин нет.</b>\n\n"
-
-        # Основная часть сообщения
-        main_caption_text = (
-            f"🗓️ <b>Православный календарь на сегодня</b> ✨\n\n"
-            f"🗓️ <b>Дата:</b> {target_date.strftime('%d.%m.%Y')}\n\n"
-            f"{holidays_text}"
-            f"ℹ️ <b>Пост:</b> {calendar_data.get('fasting', 'Информация о посте не найдена.')}\n\n"
-            f"🏛️ <b>Седмица:</b> {calendar_data.get('week_info', 'Информация о седмице не найдена.')}\n\n"
-            f"{namedays_text}"
-            f"Данные предоставлены <a href=\"https://pravoslavie.ru\">pravoslavie.ru</a> и <a href=\"https://azbyka.ru\">azbyka.ru</a>"
-        )
-
-        builder = InlineKeyboardBuilder()
-
-        # Изображение из нашей базы (daily_word), fallback — logo.png
-        morning_image_filename = pick_daily_word_image_filename()
-        calendar_image = f"daily_word/{morning_image_filename}" if morning_image_filename else "logo.png"
-        logging.info(f"Calendar /calendar: image_name={calendar_image!r}")
-
-        await send_and_delete_previous(
-            bot=bot,
-            chat_id=chat_id,
-            state=state,
-            text=main_caption_text,
-            image_name=calendar_image,
-            reply_markup=builder.as_markup(),
-            show_typing=False,
-            delete_previous=False, # Не удаляем предыдущее сообщение (команду пользователя)
-            track_last_message=False
-        )
+        if not main_message_sent:
+            await send_main_calendar(calendar_data)
 
         # Отдельное сообщение для мыслей Феофана Затворника, если они есть
-        theophan_thoughts = calendar_data.get('theophan_thoughts', [])
-        if theophan_thoughts:
-            header = "📖 <b>Мысли Святителя Феофана Затворника на каждый день года:</b>\n\n"
-            
-            formatted_thoughts = []
-            for thought in theophan_thoughts:
-                cleaned_thought = re.sub(r'^\s*[\(\);,.]+\s*', '', thought) # Удаляем начальные символы из каждого абзаца
-                if cleaned_thought.strip():
-                    formatted_thoughts.append(f"✨ <i>{cleaned_thought.strip()}</i>\n\n")
-            
-            theophan_message_text = header + "".join(formatted_thoughts).strip()
+        theophan_message_text = render_calendar_messages(date_str, calendar_data)["theophan"]
+        if theophan_message_text:
             await send_and_delete_previous(
                 bot=bot,
                 chat_id=chat_id,
@@ -139,6 +119,45 @@ async def calendar_handler(message: Message, bot: Bot, state: FSMContext):
             track_last_message=False
         )
 
+# Сколько ближайших дат именин показывать по команде /kogda_imeniny
+NAMEDAY_LOOKUP_COUNT = 5
+
+@router.message(Command("kogda_imeniny"))
+async def nameday_lookup_handler(message: Message, command: CommandObject):
+    """
+    Обработчик для команды /kogda_imeniny <имя>.
+    Показывает ближайшие дни именин по индексу именин (без обращения к сайтам).
+    Пока индекс покрывает не весь год, показываются только известные ему даты с пометкой об этом.
+    """
+    asyncio.create_task(track_feature_used(message.from_user.id, 'kogda_imeniny'))
+
+    name = (command.args or "").strip()
+    if not name:
+        await message.answer(
+            "😇 Напишите имя после команды, например: <code>/kogda_imeniny Мария</code>",
+            parse_mode='HTML'
+        )
+        return
+
+    dates, full_year = next_namedays(name, NAMEDAY_LOOKUP_COUNT)
+    partial_note = (
+        "" if full_year else
+        "\n\n<i>Календарь пока известен мне не на весь год, поэтому показаны только даты из известных дней — "
+        "других именин в этом году может быть больше.</i>"
+    )
+    if not dates:
+        await message.answer(
+            f"😇 Не нашёл именин для имени «{escape(name)}» в известных мне днях календаря. "
+            "Попробуйте церковную форму имени (например, Иоанн вместо Иван)." + partial_note,
+            parse_mode='HTML'
+        )
+        return
+
+    lines = [f"• {day.day} {MONTH_NAMES_GENITIVE[day.month - 1]} {day.year}, {WEEKDAY_NAMES[day.weekday()]}" for day in dates]
+    await message.answer(
+        f"😇 <b>Ближайшие именины — {escape(name)}:</b>\n" + "\n".join(lines) + partial_note,
+        parse_mode='HTML'
+    )
 
 @router.message(Command("molitva"))
 async def molitva_handler(message: Message, bot: Bot, state: FSMContext):
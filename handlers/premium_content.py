@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import random
 import os
-import re
 from aiogram import Router, Bot, F
 from aiogram.filters import Command
 from aiogram.types import Message, InlineKeyboardButton, CallbackQuery, InputMediaPhoto
@@ -12,8 +11,9 @@ import logging # Импортируем logging
 from core.content_sender import send_and_delete_previous, send_content_message # Импортируем новую централизованную функцию
 from core.subscription_checker import check_access
 from core.content_library import daily_words # Импортируем daily_words
-from core.ai_interaction import get_ai_response # Импортируем функцию для AI-генерации
-from utils.html_parser import convert_markdown_to_html # Импортируем для преобразования markdown в HTML
+from core.ai_errors import AIError
+from core.daily_word import build_daily_word_caption, generate_reflection # Промпт, проверка и подгонка размышления
+from core.content_pool import get_pooled_reflection, add_reflection # Пул готовых размышлений
 # from handlers.callbacks import prayer_topic_handler # Этот импорт больше не нужен, так как мы не вызываем хендлер напрямую
 
 # Создаем роутер для премиум-обработчиков
@@ -85,74 +85,25 @@ async def get_daily_word_callback_handler(callback: CallbackQuery, bot: Bot, sta
         source = selected_word['source']
         logging.info(f"Слово Дня: {scripture} — {source}")
 
-        # Формируем улучшенный промпт для AI
-        prompt = (
-            f"На основе стиха {scripture}, напиши вдохновляющее и духовно глубокое размышление в православном стиле "
-            "(3-4 абзаца, до 300 символов). Добавь исторический контекст, а также практическое применение в современной жизни "
-            "и связь с Евангелием. Стиль изложения - православный священник. Держи позитивный тон Нормана Пила. "
-            "Заверши вопросом для рефлексии, начиная его с эмодзи ❓."
-        )
-        logging.info(f"Сформирован промпт для AI: {prompt[:150]}...")
-        
-        # Получаем AI-ответ
-        ai_reflection = await get_ai_response(prompt)
-        if not ai_reflection:
-            logging.error("ERROR: AI-ответ для Слова Дня пуст.")
-            await callback.message.answer("Простите, не удалось получить размышление от AI. Пожалуйста, попробуйте позже.")
-            return
-        logging.info("Получен AI-ответ для Слова Дня.")
-
-        # Преобразуем markdown в HTML для ai_reflection (без сохранения HTML-тегов для безопасности от AI)
-        ai_reflection_html = convert_markdown_to_html(ai_reflection, preserve_html_tags=False)
-
-        # Обрезаем scripture, если он слишком длинный
-        max_scripture_len = 200
-        display_scripture = scripture
-        if len(scripture) > max_scripture_len:
-            display_scripture = scripture[:max_scripture_len].rsplit(' ', 1)[0] + "..." # Обрезаем по слову
-
-        # Подготавливаем базовые части текста
-        source_text = f"\n\n<b>Источник:</b> {source}"
-        call_to_action = "\n\n💬 Примените это сегодня! Поделитесь мыслями в /new_chat."
-        
-        # Формируем заголовок и стих с эмодзи
-        header_text = f"📖 <b>Слово Дня</b>\n\n<i>{display_scripture}</i>\n\n"
-        
-        # Формируем размышление с эмодзи
-        reflection_text = f"✨ {ai_reflection_html}"
-        
-        # Собираем промежуточный текст для расчета длины
-        intermediate_text = header_text + reflection_text + source_text + call_to_action
-        
-        # Проверяем общую длину текста (без HTML-тегов) и обрезаем ai_reflection при необходимости
-        max_total_length = 350
-        text_without_html = re.sub(r'<[^>]+>', '', intermediate_text)
-        text_length = len(text_without_html)
-        
-        # Если текст превышает лимит, обрезаем ai_reflection
-        if text_length > max_total_length:
-            # Вычисляем доступную длину для размышления
-            header_length = len(re.sub(r'<[^>]+>', '', header_text))
-            source_length = len(re.sub(r'<[^>]+>', '', source_text))
-            call_to_action_length = len(call_to_action)
-            emoji_length = 2  # "✨ " в начале размышления
-            
-            available_length = max_total_length - header_length - source_length - call_to_action_length - emoji_length - 10  # запас 10 символов
-            
-            if available_length > 0:
-                # Обрезаем ai_reflection
-                if len(ai_reflection) > available_length:
-                    truncated = ai_reflection[:available_length - 3]  # оставляем место для "..."
-                    # Пытаемся обрезать по последнему пробелу
-                    if ' ' in truncated:
-                        ai_reflection = truncated.rsplit(' ', 1)[0] + "..."
-                    else:
-                        ai_reflection = truncated + "..."
-                    ai_reflection_html = convert_markdown_to_html(ai_reflection, preserve_html_tags=False)
-                    reflection_text = f"✨ {ai_reflection_html}"
-        
-        # Формируем финальный текст с эмодзи
-        final_text = header_text + reflection_text + source_text + call_to_action
+        # Готовое размышление из пула — мгновенно; AI вызываем, только если для стиха пул пуст
+        ai_reflection = get_pooled_reflection(source)
+        if ai_reflection:
+            logging.info(f"Размышление для Слова Дня ({source}) взято из пула.")
+        else:
+            try:
+                ai_reflection = await generate_reflection(scripture, source)
+            except AIError as e:
+                logging.error(f"ERROR: AI не сгенерировал размышление для Слова Дня: {e}")
+                ai_reflection = None
+            if not ai_reflection:
+                logging.error("ERROR: AI-ответ для Слова Дня пуст.")
+                await callback.message.answer("Простите, не удалось получить размышление от AI. Пожалуйста, попробуйте позже.")
+                return
+            add_reflection(source, ai_reflection)
+            logging.info("Получен AI-ответ для Слова Дня.")
+
+        # Стих, размышление (подогнанное под лимит подписи), источник и призыв
+        final_text = build_daily_word_caption(scripture, source, ai_reflection)
 
         # Выбираем случайное изображение из assets/images/daily_word/
         image_dir = 'daily_word' # Относительный путь внутри assets/images/
@@ -2,17 +2,23 @@ from aiogram import Router, F, Bot
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram.enums import ParseMode
 from aiogram.fsm.context import FSMContext # Импортируем FSMContext
-from core.ai_interaction import get_ai_response
+from core.ai_interaction import stream_ai_response
+from core.ai_errors import AIBusyError
+from core.content_library import fallback_prayers
+from core.content_pool import build_prayer_prompt, get_pooled_prayer, schedule_prayer_refresh
 from states import PrayerState # Импортируем состояния
 from core.calendar_data import get_calendar_data
 import logging # Импортируем logging
 from datetime import datetime, timedelta
 import asyncio
+import re
 import os # Импортируем os для работы с путями файлов
 import random # Импортируем random для выбора случайного изображения
-from core.content_sender import send_and_delete_previous # Импортируем новую централизованную функцию
+from core.content_sender import send_streaming_message # Потоковая отправка ответов AI
 from utils.html_parser import convert_markdown_to_html # Импортируем convert_markdown_to_html
 from core.user_database import add_favorite_message, get_favorite_messages, remove_favorite_message, get_user, save_user_db # Импортируем функции для избранного и user_db
+from core.conversation_context import CONTEXT_TOKEN_BUDGET, build_context_messages, needs_summary, split_history_by_budget, summarize_turns
+from core.ai_interaction import estimate_tokens
 
 # Создаем роутер для этого обработчика
 router = Router()
@@ -21,6 +27,12 @@ router = Router()
 MAX_CONVERSATION_HISTORY = 10  # Максимальное количество пар сообщений (user + assistant) в истории
 CONVERSATION_TIMEOUT_HOURS = 1  # Таймаут для очистки старой истории (в часах)
 
+# Очередь сообщений диалога: у пользователя не больше одного запроса к AI одновременно;
+# первое сообщение уходит в AI сразу, пришедшие во время ответа — следующим единым запросом
+
+# Ответ, когда AI перегружен и запрос не принят в очередь
+AI_BUSY_REPLY = "🙏 Сейчас ко мне обращаются очень многие. Пожалуйста, напишите ещё раз через минуту — я обязательно отвечу."
+
 def get_conversation_history(user_id: int) -> list:
     """
     Получает историю диалога пользователя, очищает устаревшую историю.
@@ -51,6 +63,59 @@ def get_conversation_history(user_id: int) -> list:
     
     return history
 
+# Фоновые задачи обновления краткого содержания беседы (не больше одной на пользователя)
+_summary_tasks: dict[int, asyncio.Task] = {}
+
+def get_conversation_context(user_id: int) -> list:
+    """
+    Возвращает контекст диалога для AI в пределах бюджета токенов:
+    краткое содержание старой части беседы и последние реплики дословно.
+    """
+    history = get_conversation_history(user_id)
+    summary = get_user(user_id).get('conversation_summary') if history else None
+    return build_context_messages(history, summary)
+
+async def refresh_conversation_summary(user_id: int):
+    """
+    Сжимает реплики, не помещающиеся в бюджет, в краткое содержание и убирает их из истории.
+    Выполняется в фоне, вне пути ответа пользователю.
+    """
+    user_data = get_user(user_id)
+    history = list(user_data.get('conversation_history', []))
+    previous_summary = user_data.get('conversation_summary')
+    older, _ = split_history_by_budget(history, CONTEXT_TOKEN_BUDGET - estimate_tokens(previous_summary or ""))
+    if not older:
+        return
+
+    new_summary = await summarize_turns(previous_summary, older)
+    if not new_summary:
+        return
+
+    # Пока AI работал, история могла измениться (/new_chat, таймаут) — применяем только к той же истории
+    current = user_data.get('conversation_history', [])
+    if current[:len(older)] != older:
+        logging.info(f"История user_id={user_id} изменилась во время сжатия, краткое содержание отброшено")
+        return
+    user_data['conversation_history'] = current[len(older):]
+    user_data['conversation_summary'] = new_summary
+    save_user_db()
+
+def schedule_summary_refresh(user_id: int):
+    """Запускает фоновое обновление краткого содержания, если оно ещё не выполняется."""
+    task = _summary_tasks.get(user_id)
+    if task and not task.done():
+        return
+
+    async def _run():
+        try:
+            await refresh_conversation_summary(user_id)
+        except Exception as e:
+            logging.error(f"Ошибка при обновлении краткого содержания беседы user_id={user_id}: {e}", exc_info=True)
+        finally:
+            _summary_tasks.pop(user_id, None)
+
+    _summary_tasks[user_id] = asyncio.create_task(_run())
+
 def save_conversation_history(user_id: int, user_message: str, ai_response: str):
     """
     Сохраняет новое сообщение пользователя и ответ AI в историю диалога.
@@ -72,10 +137,11 @@ def save_conversation_history(user_id: int, user_message: str, ai_response: str)
             if datetime.now() - last_time > timedelta(hours=CONVERSATION_TIMEOUT_HOURS):
                 logging.info(f"Очистка устаревшей истории при сохранении для user_id={user_id} (таймаут {CONVERSATION_TIMEOUT_HOURS}ч)")
                 history = []  # Очищаем историю перед добавлением нового сообщения
+                user_data['conversation_summary'] = None
         except Exception as e:
             logging.error(f"Ошибка при проверке таймаута истории при сохранении для user_id={user_id}: {e}")
     
-    # Проверяем, не является ли ответ AI ошибкой или пустым (не сохраняем в историю)
+    # Пустой ответ AI не сохраняем в историю (ошибки AI приходят исключениями и сюда не доходят)
     if not ai_response or not ai_response.strip():
         logging.warning(f"НЕ сохраняем пустой ответ AI в историю для user_id={user_id}")
         # Обновляем время последнего сообщения, но НЕ добавляем в историю
@@ -83,22 +149,6 @@ def save_conversation_history(user_id: int, user_message: str, ai_response: str)
         save_user_db()
         return
     
-    # Проверяем на ТЕХНИЧЕСКИЕ ошибки (не блокируем духовные ответы об ошибках)
-    # Технические ошибки имеют специфичные паттерны из core/ai_interaction.py
-    is_technical_error = (
-        ai_response.startswith("Ошибка:") or  # "Ошибка: API-ключ для DeepSeek не найден"
-        ai_response.startswith("Ошибка API:") or  # "Ошибка API: 500 - Internal Server Error"
-        ai_response.startswith("Ошибка сети") or  # "Ошибка сети при обращении к AI"
-        "при обращении к AI" in ai_response  # "Произошла ошибка при обращении к AI"
-    )
-    
-    if is_technical_error:
-        logging.warning(f"НЕ сохраняем техническую ошибку AI в историю для user_id={user_id}: {ai_response[:50]}...")
-        # Обновляем время последнего сообщения, но НЕ добавляем в историю
-        user_data['last_message_time'] = datetime.now()
-        save_user_db()
-        return
-    
     # Добавляем новые сообщения
     history.append({"role": "user", "content": user_message})
     history.append({"role": "assistant", "content": ai_response})
@@ -115,16 +165,132 @@ def save_conversation_history(user_id: int, user_message: str, ai_response: str)
     
     logging.info(f"Сохранена история диалога для user_id={user_id}, сообщений в истории: {len(history)}")
 
+    # Старые реплики не помещаются в бюджет контекста — сжимаем их в фоне
+    if needs_summary(history, CONTEXT_TOKEN_BUDGET - estimate_tokens(user_data.get('conversation_summary') or "")):
+        schedule_summary_refresh(user_id)
+
 def clear_conversation_history(user_id: int):
     """
     Очищает историю диалога пользователя (для команды /new_chat).
     """
     user_data = get_user(user_id)
     user_data['conversation_history'] = []
+    user_data['conversation_summary'] = None
     user_data['last_message_time'] = None
     save_user_db()
     logging.info(f"Очищена история диалога для user_id={user_id}")
 
+# Блоки кода и цитаты: переводы строк внутри них не удваиваются
+_LINE_BREAK_BLOCKS = re.compile(r"(<pre[^>]*>.*?</pre>|<blockquote>.*?</blockquote>)", re.DOTALL)
+
+def format_chat_response(raw_text: str) -> str:
+    """
+    Преобразует Markdown ответа AI в HTML (без сохранения HTML-тегов для безопасности; с кодом, ссылками и цитатами).
+    Переводы строк удваиваются для отступов между абзацами — кроме блоков кода и цитат.
+    """
+    converted = convert_markdown_to_html(raw_text, preserve_html_tags=False, extended=True)
+    # После split блоки — на нечётных местах
+    parts = _LINE_BREAK_BLOCKS.split(converted)
+    parts[::2] = [part.replace('\n', '\n\n') for part in parts[::2]]
+    return "".join(parts)
+
+# Сообщения, ожидающие ответа, и обработчики очередей по user_id
+_pending_chat_messages: dict[int, list[Message]] = {}
+_chat_workers: dict[int, asyncio.Task] = {}
+# Нажатия «В избранное»/«Удалить из избранного», которые ещё обрабатываются: (chat_id, bot_message_id)
+_favorite_actions_in_progress: set[tuple[int, int]] = set()
+
+def merge_chat_messages(messages: list[Message]) -> str:
+    """
+    Склеивает серию сообщений пользователя в один запрос к AI.
+    Подряд идущие одинаковые сообщения (повторная отправка) учитываются один раз.
+    """
+    texts = []
+    for queued in messages:
+        text = (queued.text or '').strip()
+        if text and (not texts or texts[-1] != text):
+            texts.append(text)
+    return "\n".join(texts)
+
+def enqueue_chat_message(message: Message, bot: Bot):
+    """
+    Ставит сообщение в очередь пользователя. Если запроса к AI сейчас нет, обработчик очереди
+    запускается и отвечает сразу; сообщения, пришедшие во время ответа AI, уходят следующим единым запросом.
+    """
+    user_id = message.from_user.id
+    _pending_chat_messages.setdefault(user_id, []).append(message)
+
+    worker = _chat_workers.get(user_id)
+    if worker and not worker.done():
+        logging.info(f"Сообщение user_id={user_id} добавлено в очередь ({len(_pending_chat_messages[user_id])} ожидает)")
+        return
+    _chat_workers[user_id] = asyncio.create_task(_chat_queue_worker(user_id, bot))
+
+async def _chat_queue_worker(user_id: int, bot: Bot):
+    """Последовательно отвечает на накопившиеся сообщения пользователя, по одному запросу к AI за раз."""
+    try:
+        while True:
+            batch = _pending_chat_messages.pop(user_id, [])
+            if not batch:
+                break
+            if len(batch) > 1:
+                logging.info(f"Склеено {len(batch)} сообщений user_id={user_id} в один запрос к AI")
+            try:
+                await answer_chat_messages(batch, bot)
+            except Exception as e:
+                logging.error(f"Ошибка при ответе на сообщения user_id={user_id}: {e}", exc_info=True)
+    finally:
+        _chat_workers.pop(user_id, None)
+
+async def answer_chat_messages(messages: list[Message], bot: Bot):
+    """
+    Отвечает на серию сообщений пользователя одним запросом к AI с контекстом диалога.
+    Ответ привязывается к последнему сообщению серии.
+    """
+    message = messages[-1]
+    user_id = message.from_user.id
+    chat_id = message.chat.id
+    user_text = merge_chat_messages(messages)
+    if not user_text:
+        return
+
+    # Получаем контекст диалога в пределах бюджета токенов (краткое содержание + последние реплики)
+    conversation_history = get_conversation_context(user_id)
+    
+    # Получаем имя пользователя для персонализации
+    user_name = message.from_user.first_name if message.from_user.first_name else None
+    
+    # Отправляем запрос к AI с контекстом истории и именем; ответ показывается по мере генерации
+    await bot.send_chat_action(chat_id, "typing")
+    sent_message, ai_response, error = await send_streaming_message(
+        bot=bot,
+        chat_id=chat_id,
+        chunks=stream_ai_response(
+            user_text,
+            conversation_history=conversation_history,
+            user_name=user_name,
+            call_site="chat"
+        ),
+        format_text=format_chat_response,
+        reply_markup=get_favorite_keyboard(message.message_id)
+    )
+
+    if isinstance(error, AIBusyError):
+        logging.warning(f"AI перегружен, сообщение user_id={user_id} не обработано: {error}")
+        await message.answer(AI_BUSY_REPLY)
+        return
+    if error:
+        logging.error(f"Ошибка потокового ответа AI для user_id={user_id}: {error}")
+        if not ai_response.strip():
+            await message.answer("😔 Не удалось получить ответ. Попробуйте, пожалуйста, ещё раз чуть позже.")
+        # Оборванный ответ не сохраняем в историю
+        return
+
+    # Сохраняем сообщение пользователя и ответ AI в историю
+    save_conversation_history(user_id, user_text, ai_response)
+    if not ai_response.strip():
+        await message.answer("😔 Не удалось получить ответ. Попробуйте, пожалуйста, ещё раз чуть позже.")
+
 # Функция для создания клавиатуры с кнопкой "В избранное"
 def get_favorite_keyboard(message_id: int, is_favorited: bool = False) -> InlineKeyboardMarkup:
     text = "⭐️ В избранное" if not is_favorited else "🌟 Удалить из избранного"
@@ -167,6 +333,7 @@ async def handle_text_message(message: Message, bot: Bot, state: FSMContext):
     if is_prayer_state:
         user_data = await state.get_data()
         prayer_topic = user_data.get('prayer_topic') or 'молитва'
+        prayer_topic_key = user_data.get('prayer_topic_key') or 'custom'
         user_prayer_details = (message.text or '').strip() or 'о здравии'
         # Убираем кавычки, чтобы не ломать f-строку в промте
         user_prayer_details = user_prayer_details.replace("'", "").replace('"', '')[:500]
@@ -174,112 +341,66 @@ async def handle_text_message(message: Message, bot: Bot, state: FSMContext):
 
         logging.info(f"Молитва: user_id={user_id}, тема={prayer_topic}, детали={user_prayer_details[:50]}...")
 
-        async def _typing_loop():
-            try:
-                while True:
-                    await bot.send_chat_action(chat_id, "typing")
-                    await asyncio.sleep(4)
-            except asyncio.CancelledError:
-                pass
-
-        typing_task = asyncio.create_task(_typing_loop())
-        ai_response = None
-        try:
-            prompt = (
-                f"Сгенерируй текст православной молитвы в позитивном, вдохновляющем стиле (Норман Пил) на тему '{prayer_topic}' "
-                f"с учетом следующей просьбы пользователя: '{user_prayer_details}'. "
-                f"Молитва должна быть на современном русском языке, канонически православно корректной и включать обращение, "
-                f"прошение, благодарение. Текст до 500 символов, глубокий и добрый."
-            )
-            ai_response = await get_ai_response(prompt, max_tokens=400)
-        except Exception as e:
-            logging.exception(f"get_ai_response в модуле Молитва user_id={user_id}: {e}")
-            ai_response = None
-        finally:
-            typing_task.cancel()
-            try:
-                await typing_task
-            except asyncio.CancelledError:
-                pass
+        header = f"🙏 <b>Ваша молитва ({prayer_topic.lower()})</b>\n\n"
+        header_plain = f"🙏 Ваша молитва ({prayer_topic.lower()})\n\n"
 
-        if not ai_response or ai_response.startswith("Ошибка") or ai_response.startswith("Произошла ошибка"):
+        # Типовая короткая просьба ("о здравии сына") — готовая молитва из пула сразу, пул обновляется в фоне
+        pooled_prayer, prayer_intent = get_pooled_prayer(prayer_topic_key, user_prayer_details)
+        if pooled_prayer:
+            logging.info(f"Молитва из пула: user_id={user_id}, тема={prayer_topic_key}, намерение={prayer_intent}")
             await message.answer(
-                "😔 Извините, произошла ошибка при генерации молитвы. Попробуйте ещё раз: /molitva",
-                parse_mode=ParseMode.HTML
+                header + convert_markdown_to_html(pooled_prayer, preserve_html_tags=False),
+                parse_mode=ParseMode.HTML,
+                reply_markup=get_favorite_keyboard(message.message_id)
             )
+            schedule_prayer_refresh(prayer_topic_key, prayer_intent, prayer_topic)
             return
 
-        async def _send_prayer(text: str, use_html: bool = True) -> bool:
-            """Отправляет молитву, при ошибке с HTML пробует без HTML. Возвращает True если успешно."""
-            try:
-                if use_html:
-                    await message.answer(
-                        text,
-                        parse_mode=ParseMode.HTML,
-                        reply_markup=get_favorite_keyboard(message.message_id)
-                    )
-                else:
-                    await message.answer(
-                        text,
-                        reply_markup=get_favorite_keyboard(message.message_id)
-                    )
-                return True
-            except Exception as e:
-                logging.warning(f"Отправка молитвы (html={use_html}) user_id={user_id}: {e}")
-                return False
+        await bot.send_chat_action(chat_id, "typing")
+        prompt = build_prayer_prompt(prayer_topic, user_prayer_details)
 
+        # Молитва появляется по мере генерации и дописывается правками одного сообщения
         try:
-            ai_clean = convert_markdown_to_html(ai_response, preserve_html_tags=False)
-            header = f"🙏 <b>Ваша молитва ({prayer_topic.lower()})</b>\n\n"
-            text_to_send = header + ai_clean
-            if len(text_to_send) > 4096:
-                text_to_send = text_to_send[:4093].rstrip() + "..."
-
-            sent = await _send_prayer(text_to_send, use_html=True)
-            if not sent:
-                text_plain = f"🙏 Ваша молитва ({prayer_topic.lower()})\n\n" + ai_response[:4000]
-                sent = await _send_prayer(text_plain, use_html=False)
-            if not sent:
-                await message.answer("😔 Не удалось отправить молитву. Попробуйте ещё раз: /molitva")
+            sent_message, prayer_text, error = await send_streaming_message(
+                bot=bot,
+                chat_id=chat_id,
+                chunks=stream_ai_response(prompt, max_tokens=400, prompt_sections=("role",), call_site="prayer"),
+                format_text=lambda raw: header + convert_markdown_to_html(raw, preserve_html_tags=False),
+                reply_markup=get_favorite_keyboard(message.message_id),
+                plain_fallback=lambda raw: header_plain + raw
+            )
         except Exception as e:
-            logging.exception(f"Молитва user_id={user_id}: {e}")
-            try:
-                await message.answer(f"🙏 Ваша молитва\n\n{ai_response[:4000]}")
-            except Exception:
-                await message.answer("😔 Не удалось отправить молитву. Попробуйте ещё раз: /molitva")
+            logging.exception(f"Потоковая генерация в модуле Молитва user_id={user_id}: {e}")
+            sent_message, prayer_text, error = None, "", e
+
+        if error:
+            logging.warning(f"stream_ai_response в модуле Молитва user_id={user_id}: {error}")
+        if isinstance(error, AIBusyError) and not prayer_text.strip():
+            # AI перегружен — отдаём заготовленную молитву на ту же тему
+            prayers = fallback_prayers.get(prayer_topic_key) or fallback_prayers["custom"]
+            await message.answer(
+                header + random.choice(prayers),
+                parse_mode=ParseMode.HTML,
+                reply_markup=get_favorite_keyboard(message.message_id)
+            )
+        elif not prayer_text.strip():
+            await message.answer(
+                "😔 Извините, произошла ошибка при генерации молитвы. Попробуйте ещё раз: /molitva",
+                parse_mode=ParseMode.HTML
+            )
+        elif not sent_message:
+            await message.answer("😔 Не удалось отправить молитву. Попробуйте ещё раз: /molitva")
+        elif prayer_intent and not error:
+            # Просьба типовая, а пул для неё был пуст. Ответ мог учесть подробности просьбы,
+            # поэтому в пул идёт отдельная молитва по общему описанию намерения
+            schedule_prayer_refresh(prayer_topic_key, prayer_intent, prayer_topic)
         return
 
     # Календарь запрашивается отдельной командой /calendar
 
-    # Если не в режиме молитвы и не запрос календаря, работаем как обычно
-    # Получаем историю диалога для контекста
-    conversation_history = get_conversation_history(user_id)
-    
-    # Получаем имя пользователя для персонализации
-    user_name = message.from_user.first_name if message.from_user.first_name else None
-    
-    # Отправляем запрос к AI с контекстом истории и именем
-    ai_response = await get_ai_response(
-        message.text, 
-        conversation_history=conversation_history,
-        user_name=user_name
-    )
-    
-    # Сохраняем сообщение пользователя и ответ AI в историю
-    save_conversation_history(user_id, message.text, ai_response)
-    
-    # Преобразуем Markdown в HTML (без сохранения HTML-тегов для безопасности)
-    ai_response = convert_markdown_to_html(ai_response, preserve_html_tags=False)
-    formatted_response = ai_response.replace('\n', '\n\n') # Возможно, это уже не нужно, если convert_markdown_to_html обрабатывает \n
-    await send_and_delete_previous(
-        bot=bot,
-        chat_id=chat_id,
-        state=state,
-        text=formatted_response,
-        reply_markup=get_favorite_keyboard(message.message_id),
-        delete_previous=False,
-        track_last_message=False
-    )
+    # Если не в режиме молитвы и не запрос календаря, работаем как обычно:
+    # сообщение встаёт в очередь пользователя, серия быстрых сообщений получит один ответ
+    enqueue_chat_message(message, bot)
 
 @router.callback_query(F.data.startswith('favorite_'))
 async def handle_favorite_callback(callback_query: CallbackQuery, bot: Bot, state: FSMContext):
@@ -290,6 +411,25 @@ async def handle_favorite_callback(callback_query: CallbackQuery, bot: Bot, stat
     # Получаем сообщение, которое пользователь хочет добавить в избранное
     # Это сообщение, на которое была нажата кнопка "В избранное"
     bot_message = callback_query.message
+
+    # Повторное нажатие, пока первое ещё обрабатывается, или уже сохранённое сообщение — не дублируем
+    action_key = (chat_id, bot_message.message_id)
+    if action_key in _favorite_actions_in_progress:
+        await callback_query.answer()
+        return
+    if any(fav.get('bot_message_id') == bot_message.message_id for fav in get_favorite_messages(user_id)):
+        await callback_query.answer("Сообщение уже в избранном 🌟")
+        return
+    _favorite_actions_in_progress.add(action_key)
+    try:
+        await _add_to_favorites(callback_query, bot, original_message_id)
+    finally:
+        _favorite_actions_in_progress.discard(action_key)
+
+async def _add_to_favorites(callback_query: CallbackQuery, bot: Bot, original_message_id: int):
+    user_id = callback_query.from_user.id
+    chat_id = callback_query.message.chat.id
+    bot_message = callback_query.message
     
     # Извлекаем контент и имя изображения
     content = bot_message.html_text
@@ -312,6 +452,21 @@ async def handle_favorite_callback(callback_query: CallbackQuery, bot: Bot, stat
 @router.callback_query(F.data.startswith('unfavorite_'))
 async def handle_unfavorite_callback(callback_query: CallbackQuery, bot: Bot, state: FSMContext):
     original_message_id = int(callback_query.data.split('_')[1])
+    chat_id = callback_query.message.chat.id
+    bot_message_id = callback_query.message.message_id
+
+    # Повторное нажатие, пока первое ещё обрабатывается, — пропускаем
+    action_key = (chat_id, bot_message_id)
+    if action_key in _favorite_actions_in_progress:
+        await callback_query.answer()
+        return
+    _favorite_actions_in_progress.add(action_key)
+    try:
+        await _remove_from_favorites(callback_query, bot, original_message_id)
+    finally:
+        _favorite_actions_in_progress.discard(action_key)
+
+async def _remove_from_favorites(callback_query: CallbackQuery, bot: Bot, original_message_id: int):
     user_id = callback_query.from_user.id
     chat_id = callback_query.message.chat.id
     bot_message_id = callback_query.message.message_id
@@ -3,6 +3,7 @@ import logging
 import os
 import sys # Добавляем импорт sys
 from datetime import datetime
+from typing import Optional
 
 # Проверяем, активно ли виртуальное окружение
 if not hasattr(sys, 'real_prefix') and not (hasattr(sys, 'base_prefix') and sys.base_prefix != sys.prefix):
@@ -19,8 +20,11 @@ from handlers.admin_handler import router as admin_router
 from handlers.subscription import router as subscription_router
 from core.scheduler import scheduler, send_morning_notification, send_afternoon_notification, send_evening_notification, send_subscription_reminder, send_free_period_ending_notification # check_namedays
 from core.subscription_checker import check_access # Импортируем мидлварь проверки доступа
-from core.user_database import user_db, get_user # Импортируем user_db и get_user
-from core.calendar_data import clear_calendar_cache
+from core.user_database import user_db, get_user, flush_user_db # Импортируем user_db, get_user и flush_user_db
+from core.content_pool import replenish_reflection_pool
+from core.calendar_data import CALENDAR_PREFETCH_DAYS, prefetch_calendar_days
+from core.ai_metrics import start_metrics_server
+from core.cpu_offload import monitor_loop_lag, shutdown_cpu_pool, start_cpu_pool
 
 # Настройка логирования с ротацией файлов
 from logging.handlers import RotatingFileHandler
@@ -49,6 +53,8 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 # Создание объектов Bot и Dispatcher
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(storage=MemoryStorage()) # Инициализируем Dispatcher с MemoryStorage
+# Фоновый замер задержки event loop (ссылка нужна, чтобы задачу не собрал сборщик мусора)
+loop_lag_task: Optional[asyncio.Task] = None
 
 # Асинхронная функция для установки главного меню
 async def set_main_menu(bot: Bot):
@@ -60,6 +66,7 @@ async def set_main_menu(bot: Bot):
         BotCommand(command="/start", description="🔄 Перезапустить бота"),
         BotCommand(command="/new_chat", description="✨ Начать новую беседу с Духовником"),
         BotCommand(command="/calendar", description="🗓️ Православный календарь"),
+        BotCommand(command="/kogda_imeniny", description="😇 Когда именины"),
         BotCommand(command="/molitva", description="🙏 Молитва"),
         # BotCommand(command="/daily_word", description="📖 Слово дня (Premium)"), # Скрыто - доступно только через уведомления
         BotCommand(command="/favorites", description="⭐️ Избранное"), # Добавляем команду для избранного
@@ -80,6 +87,9 @@ async def set_main_menu(bot: Bot):
             BotCommand(command="/admin", description="🛠️ Admin панель"),
             BotCommand(command="/stats", description="📊 Аналитика трафика"),
             BotCommand(command="/admin_stats", description="📈 Статистика подписок"),
+            BotCommand(command="/ai_load", description="🤖 Нагрузка на AI"),
+            BotCommand(command="/ai_stats", description="📈 Задержки и стоимость AI"),
+            BotCommand(command="/calendar_cache", description="🗓️ Кэш календаря"),
             BotCommand(command="/admin_check_subscription", description="🔎 Статус подписки"),
             BotCommand(command="/admin_activate_premium", description="⭐ Активировать Premium"),
             BotCommand(command="/support_history", description="🧾 История поддержки"),
@@ -95,13 +105,17 @@ async def main() -> None:
     Основная функция для запуска long polling.
     """
     import traceback
-    clear_calendar_cache()  # Сброс кэша при старте (убирает старые данные с image_url с сайтов)
+    global loop_lag_task
 
     logging.info("="*80)
     logging.info("🚀 ЗАПУСК ФУНКЦИИ main() - НАЧАЛО ИНИЦИАЛИЗАЦИИ БОТА")
     logging.info(f"Время запуска: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logging.info(f"Call stack:\n{''.join(traceback.format_stack())}")
     logging.info("="*80)
+
+    # Пул процессов для разбора календаря, iCal и сохранения базы — до запуска планировщика и опроса
+    start_cpu_pool()
+    loop_lag_task = asyncio.create_task(monitor_loop_lag())
     
     # Выводим все текущие задачи в планировщике
     existing_jobs = scheduler.get_jobs()
@@ -135,6 +149,14 @@ async def main() -> None:
         scheduler.remove_job('free_period_warning_job')
         removed_count += 1
         logging.info("❌ Удалена задача 'free_period_warning_job'")
+    if scheduler.get_job('reflection_pool_job'):
+        scheduler.remove_job('reflection_pool_job')
+        removed_count += 1
+        logging.info("❌ Удалена задача 'reflection_pool_job'")
+    if scheduler.get_job('calendar_prefetch_job'):
+        scheduler.remove_job('calendar_prefetch_job')
+        removed_count += 1
+        logging.info("❌ Удалена задача 'calendar_prefetch_job'")
     
     logging.info(f"📊 Удалено старых задач: {removed_count}")
 
@@ -156,6 +178,14 @@ async def main() -> None:
     scheduler.add_job(send_free_period_ending_notification, trigger='cron', hour=10, minute=0, args=[bot], timezone='Europe/Moscow', id='free_period_warning_job', replace_existing=True)
     logging.info("✅ Добавлена задача 'free_period_warning_job' на 10:00 MSK")
     
+    # Пополнение пула размышлений Слова Дня в ночные часы, когда нагрузка на AI минимальна
+    scheduler.add_job(replenish_reflection_pool, trigger='cron', hour='2-5', minute=30, timezone='Europe/Moscow', id='reflection_pool_job', replace_existing=True)
+    logging.info("✅ Добавлена задача 'reflection_pool_job' на 02:30-05:30 MSK (ежечасно)")
+
+    # Предзагрузка календаря на ближайшие дни ночью, чтобы дневные запросы /calendar попадали в кэш
+    scheduler.add_job(prefetch_calendar_days, trigger='cron', hour=3, minute=10, timezone='Europe/Moscow', id='calendar_prefetch_job', replace_existing=True)
+    logging.info(f"✅ Добавлена задача 'calendar_prefetch_job' на 03:10 MSK ({CALENDAR_PREFETCH_DAYS} дн. вперёд)")
+    
     # scheduler.add_job(check_namedays, trigger='cron', hour=7, minute=0, args=(bot,)) # Запускаем проверку именин в 7 утра
     
     # Выводим финальное состояние планировщика
@@ -189,10 +219,19 @@ async def main() -> None:
     dp.include_router(legal_handler.router)
     dp.include_router(text_handler.router)  # всегда последним!
 
+    # Эндпоинт метрик AI для Prometheus (если задан METRICS_PORT)
+    await start_metrics_server()
+
     # Устанавливаем главное меню
     await set_main_menu(bot)
     
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        loop_lag_task.cancel()
+        # Остановка пула ждёт идущую запись базы, а отменённые записи остаются в снимке для flush_user_db
+        shutdown_cpu_pool()
+        flush_user_db()
 
 # Точка входа
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+Локальная заглушка OpenAI-совместимого API для проверки отказоустойчивости AI-клиента.
+
+Запуск:
+    python scripts/ai_stub_server.py --port 8089
+
+Режим задаётся первым сегментом пути, например:
+    DEEPSEEK_API_URL=http://127.0.0.1:8089/ok/chat/completions
+    DEEPSEEK_API_URL=http://127.0.0.1:8089/flaky/chat/completions?fail=2
+    AI_FALLBACK_URL=http://127.0.0.1:8089/ok/chat/completions
+
+Режимы:
+    ok       — нормальный ответ (обычный и потоковый)
+    429      — всегда 429 с заголовком Retry-After (?retry_after=1)
+    500      — всегда 500
+    flaky    — первые ?fail=N запросов отвечают 503, затем ok
+    slow     — ответ после задержки ?delay=секунды
+    drop     — поток обрывается после первых фрагментов; обычный запрос — обрыв соединения
+    garbage  — 200 с невалидным JSON; в потоке — битые фрагменты SSE вперемешку с нормальными
+"""
+import json
+import asyncio
+import argparse
+from aiohttp import web # type: ignore
+
+REPLY_TEXT = "Мир вам! Это тестовый ответ заглушки AI."
+
+_request_counts: dict[str, int] = {}
+
+def _completion(text: str) -> dict:
+    return {
+        "id": "stub",
+        "object": "chat.completion",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": len(text.split()), "total_tokens": 10 + len(text.split())},
+    }
+
+async def _stream_reply(request: web.Request, text: str, drop_after: int | None = None, include_usage: bool = False, garbage: bool = False) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    await response.write(b": keep-alive\n\n")
+    for index, word in enumerate(text.split(" ")):
+        if drop_after is not None and index >= drop_after:
+            request.transport.close()  # Обрыв посреди потока
+            return response
+        if garbage:
+            await response.write(b"data: {not json\n\n")
+        chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+        await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await asyncio.sleep(0.05)
+    if include_usage:
+        # Как у OpenAI/DeepSeek: отдельный последний фрагмент с пустым choices и блоком usage
+        chunk = {"choices": [], "usage": _completion(text)["usage"]}
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+async def handle_completion(request: web.Request) -> web.StreamResponse:
+    mode = request.match_info["mode"]
+    payload = await request.json()
+    stream = bool(payload.get("stream"))
+    _request_counts[mode] = _request_counts.get(mode, 0) + 1
+    print(f"[stub] {mode} #{_request_counts[mode]} model={payload.get('model')} stream={stream}")
+
+    if mode == "429":
+        return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": request.query.get("retry_after", "1")})
+    if mode == "500":
+        return web.json_response({"error": "internal"}, status=500)
+    if mode == "flaky" and _request_counts[mode] <= int(request.query.get("fail", "2")):
+        return web.json_response({"error": "unavailable"}, status=503)
+    if mode == "slow":
+        await asyncio.sleep(float(request.query.get("delay", "5")))
+    if mode == "garbage":
+        if stream:
+            return await _stream_reply(request, REPLY_TEXT, garbage=True)
+        return web.Response(text="{not json", content_type="application/json")
+    if mode == "drop":
+        if stream:
+            return await _stream_reply(request, REPLY_TEXT, drop_after=2)
+        request.transport.close()
+        return web.Response()
+
+    if stream:
+        include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+        return await _stream_reply(request, REPLY_TEXT, include_usage=include_usage)
+    return web.json_response(_completion(REPLY_TEXT))
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI-совместимого API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app.router.add_post("/{mode}/chat/completions", handle_completion)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
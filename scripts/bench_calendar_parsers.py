@@ -0,0 +1,83 @@
+"""
+Замер скорости и памяти парсеров календаря на корпусе (scripts/calendar_corpus.py):
+для каждого бэкенда и источника — время разбора страницы (медиана, p95, максимум)
+и пик выделенной памяти при разборе (tracemalloc).
+
+Запуск (из корня проекта):
+    python scripts/bench_calendar_parsers.py            # весь корпус, 3 прогона на страницу
+    python scripts/bench_calendar_parsers.py 5 2025     # 5 прогонов, только корпус за 2025 год
+
+Пока корпус не записан, замер идёт на фикстурах calendar_corpus/fixtures/ (страницы собраны
+по разметке сайтов, а не скачаны, — для выводов о скорости нужен записанный корпус).
+
+Время меряется без tracemalloc (он замедляет разбор в разы), память — отдельным прогоном.
+"""
+import os
+import sys
+import time
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_corpus import iter_corpus, iter_fixtures, read_corpus_page # noqa: E402
+from check_calendar_parsers import PARSERS # noqa: E402
+from utils.html_parser import CALENDAR_PARSER_BACKENDS, LXML_AVAILABLE # noqa: E402
+
+def measure_page(source: str, html_content: str, backend: str, repeats: int) -> tuple:
+    """(лучшее время разбора из repeats прогонов в секундах, пик памяти в байтах)."""
+    parse = PARSERS[source]
+    best = float("inf")
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        parse(html_content, backend=backend)
+        best = min(best, time.perf_counter() - started_at)
+    tracemalloc.start()
+    try:
+        parse(html_content, backend=backend)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def main() -> int:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    year = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    pages = iter_corpus(year)
+    if not pages and year is None:
+        pages = iter_fixtures()
+        if pages:
+            print("Записанного корпуса нет — замер на фикстурах (python scripts/calendar_corpus.py записывает корпус).")
+    if not pages:
+        print("Корпус пуст: запишите его командой python scripts/calendar_corpus.py")
+        return 1
+
+    backends = [backend for backend in CALENDAR_PARSER_BACKENDS if backend != "lxml" or LXML_AVAILABLE]
+    if not LXML_AVAILABLE:
+        print("lxml не установлен — бэкенд lxml не замеряется.")
+    # (бэкенд, источник) -> список (время, память, дата)
+    samples: dict = {}
+    for date_str, source, path in pages:
+        html_content = read_corpus_page(path)
+        for backend in backends:
+            seconds, peak = measure_page(source, html_content, backend, repeats)
+            samples.setdefault((backend, source), []).append((seconds, peak, date_str))
+
+    print(f"Страниц: {len(pages)}, прогонов на страницу: {repeats}")
+    print(f"{'бэкенд':<10} {'источник':<12} {'медиана':>9} {'p95':>9} {'макс.':>9} {'память медиана':>15} {'память макс.':>13}  самая медленная")
+    for (backend, source), rows in sorted(samples.items()):
+        times = [row[0] for row in rows]
+        peaks = [row[1] for row in rows]
+        slowest = max(rows, key=lambda row: row[0])
+        print(
+            f"{backend:<10} {source:<12} {statistics.median(times) * 1000:>7.1f}мс {percentile(times, 0.95) * 1000:>7.1f}мс "
+            f"{max(times) * 1000:>7.1f}мс {statistics.median(peaks) / 1024:>12.0f}КиБ {max(peaks) / 1024:>10.0f}КиБ  {slowest[2]}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
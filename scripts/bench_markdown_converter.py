@@ -0,0 +1,62 @@
+"""
+Замер convert_markdown_to_html (utils/html_parser.py) против прежней реализации
+(reference_convert_markdown_to_html из scripts/fuzz_markdown_converter.py) на типичных текстах:
+длинный ответ AI так, как его размечает чат (preserve_html_tags=False, extended=True — см.
+format_chat_response), и доверенный контент с HTML-тегами (preserve_html_tags=True).
+Ответ AI с кодом, ссылкой и подчёркиванием прежняя реализация не размечала — для него
+результаты не сравниваются, а время дано для сравнения с прежней разметкой того же текста.
+
+Запуск (из корня проекта):
+    python scripts/bench_markdown_converter.py          # 2000 прогонов на текст
+    python scripts/bench_markdown_converter.py 10000
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzz_markdown_converter import reference_convert_markdown_to_html # noqa: E402
+from utils.html_parser import convert_markdown_to_html # noqa: E402
+
+AI_PARAGRAPH = (
+    "💡 **Вот практическая мысль на сегодня:** вместо того чтобы повторять 'я неудачник', начни повторять "
+    "простую молитву-утверждение: **'Господи, благодарю Тебя за этот урок!'** Как сказано в Евангелии: "
+    "_«Просите, и дано будет вам; ищите, и найдёте»_ (Мф. 7:7). Вера &gt; страха, и это не просто слова — "
+    "это **практика** каждого дня: утро начинается с благодарности, а вечер — с _тихой молитвы_.\n\n"
+)
+AI_MARKUP_PARAGRAPH = (
+    "📖 Прочитай __сегодня__ главу из [Евангелия](https://azbyka.ru/biblia/?Mt.5) и запиши одну мысль: "
+    "`Блажени нищии духом` — **что это значит для меня?** Потом _помолись своими словами_.\n\n"
+)
+CONTENT_PARAGRAPH = (
+    "✨ <b>Праздники:</b>\n• <a href=\"https://azbyka.ru\">Сщмч. Дионисия Ареопагита</a>, еп. Афинского\n"
+    "• Прп. <i>Иоанна Хозевита</i>, еп. Кесарийского & **мч. Рустика** и _Елевферия_\n"
+    "ℹ️ <b>Пост:</b> Постный день (среда)\n🏛️ <b>Седмица:</b> Седмица 19-я по Пятидесятнице\n\n"
+)
+
+# название -> (текст, preserve_html_tags, extended, сравнивать ли результат с прежней реализацией)
+SAMPLES = {
+    "ответ AI, ~4 КБ": (AI_PARAGRAPH * 9, False, True, True),
+    "ответ AI, ~16 КБ": (AI_PARAGRAPH * 36, False, True, True),
+    "ответ AI с кодом, ~4 КБ": (AI_MARKUP_PARAGRAPH * 18, False, True, False),
+    "ответ AI с кодом, ~16 КБ": (AI_MARKUP_PARAGRAPH * 72, False, True, False),
+    "контент с тегами, ~4 КБ": (CONTENT_PARAGRAPH * 14, True, False, True),
+    "контент с тегами, ~16 КБ": (CONTENT_PARAGRAPH * 56, True, False, True),
+}
+
+def main() -> int:
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"{'текст':<26} {'символов':>9} {'прежняя':>10} {'новая':>10} {'ускорение':>10}")
+    for name, (text, preserve_html_tags, extended, comparable) in SAMPLES.items():
+        converted = convert_markdown_to_html(text, preserve_html_tags, extended)
+        if comparable and converted != reference_convert_markdown_to_html(text, preserve_html_tags):
+            print(f"{name}: результаты различаются — проверьте scripts/fuzz_markdown_converter.py")
+            return 1
+        old = min(timeit.repeat(lambda: reference_convert_markdown_to_html(text, preserve_html_tags), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: convert_markdown_to_html(text, preserve_html_tags, extended), number=number, repeat=3)) / number
+        print(f"{name:<26} {len(text):>9} {old * 1e6:>8.1f}мкс {new * 1e6:>8.1f}мкс {old / new:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Сборка годового пакета календаря (core/calendar_bundle.py): один раз скачивает страницы
+azbyka.ru и pravoslavie.ru за год (в корпус scripts/calendar_corpus.py — уже скачанное
+не запрашивается повторно), собирает данные каждого дня так же, как бот (build_calendar_data),
+и записывает их в calendar_bundle.sqlite.
+
+Запуск (из корня проекта):
+    python scripts/build_calendar_bundle.py               # текущий и следующий год
+    python scripts/build_calendar_bundle.py 2026 2027     # указанные годы
+    python scripts/build_calendar_bundle.py 2026 --offline  # только из корпуса и кэша, без скачивания
+
+В пакет попадают только дни, для которых получены обе страницы; остальные бот
+по-прежнему скачивает сам. Пакет пересобирают после изменения CALENDAR_PARSER_VERSION.
+Перезапуск бота не нужен: новый файл пакета подхватывается при следующем запросе.
+"""
+import os
+import sys
+import asyncio
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_corpus import corpus_page_path, read_corpus_page, record_year, year_date_strs # noqa: E402
+from core.calendar_bundle import CALENDAR_BUNDLE_FILE, write_bundle # noqa: E402
+from core.calendar_data import build_calendar_data # noqa: E402
+from utils.html_parser import CALENDAR_PARSER_VERSION # noqa: E402
+
+def build_year_days(year: int) -> tuple:
+    """(список (дата, данные дня), список дат без одной из страниц)."""
+    days, incomplete = [], []
+    for date_str in year_date_strs(year):
+        paths = {source: corpus_page_path(date_str, source) for source in ("azbyka", "pravoslavie")}
+        if not all(os.path.exists(path) for path in paths.values()):
+            incomplete.append(date_str)
+            continue
+        data = build_calendar_data(date_str, read_corpus_page(paths["azbyka"]), read_corpus_page(paths["pravoslavie"]))
+        if data is None:
+            incomplete.append(date_str)
+            continue
+        days.append((date_str, data))
+    return days, incomplete
+
+def main() -> int:
+    years = [int(arg) for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not years:
+        years = [datetime.now().year, datetime.now().year + 1]
+    offline = "--offline" in sys.argv
+
+    total = 0
+    for year in years:
+        report = asyncio.run(record_year(year, from_cache=offline))
+        print(f"{year}: страниц скачано {report['recorded']}, уже было {report['existing']}, не получено {len(report['missing'])}")
+        days, incomplete = build_year_days(year)
+        total += write_bundle(days, CALENDAR_PARSER_VERSION)
+        print(f"{year}: в пакет записано дней {len(days)}, пропущено (нет страницы) {len(incomplete)}")
+    print(f"Пакет {CALENDAR_BUNDLE_FILE}: записано дней {total}, версия парсера {CALENDAR_PARSER_VERSION}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Корпус страниц календаря для проверки и замеров парсеров: страницы azbyka.ru и pravoslavie.ru
+за целый год (все праздники, посты, Страстная и Светлая седмицы), сохранённые локально.
+
+Раскладка: calendar_corpus/<год>/<YYYYMMDD>.<azbyka|pravoslavie>.html.gz
+(источник — в имени файла, поэтому файлы корпуса можно передать и в check_calendar_parsers.py).
+
+Запись корпуса (из корня проекта):
+    python scripts/calendar_corpus.py                 # текущий год
+    python scripts/calendar_corpus.py 2025            # указанный год
+    python scripts/calendar_corpus.py 2025 --from-cache  # только из кэша календаря, без скачивания
+
+Уже записанные страницы не скачиваются повторно, поэтому прерванную запись можно продолжить.
+Корпус используют scripts/check_calendar_golden.py и scripts/bench_calendar_parsers.py,
+эталон записанного корпуса — calendar_corpus/golden.json.
+
+В репозитории лежат только фикстуры: calendar_corpus/fixtures/ (31 день 2025 года: двунадесятые
+праздники, Страстная и Светлая седмицы, начало постов, однодневные посты, обычные среды
+и пятницы) с эталоном fixtures/golden.json. Эти страницы не скачаны с сайтов, а собраны по их
+разметке (те классы и ссылки, по которым работают парсеры, плюс шапка, скрипты и подвал страницы),
+поэтому лежат отдельно: запись корпуса и scripts/build_calendar_bundle.py их не читают.
+"""
+import os
+import sys
+import gzip
+import asyncio
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.calendar_data import get_source_urls # noqa: E402
+from core.calendar_cache import get_page_html # noqa: E402
+from utils.html_parser import fetch_html_content # noqa: E402
+
+CORPUS_DIR = "calendar_corpus"
+GOLDEN_FILE = os.path.join(CORPUS_DIR, "golden.json")
+# Собранные по разметке сайтов страницы (не записанный корпус) и их эталон
+FIXTURES_DIR = os.path.join(CORPUS_DIR, "fixtures")
+FIXTURES_GOLDEN_FILE = os.path.join(FIXTURES_DIR, "golden.json")
+CORPUS_SOURCES = ("azbyka", "pravoslavie")
+# Сколько дней качать одновременно и пауза после каждого дня — чтобы не нагружать сайты
+RECORD_CONCURRENCY = 2
+RECORD_PAUSE_SECONDS = 1.0
+
+def corpus_page_path(date_str: str, source: str) -> str:
+    return os.path.join(CORPUS_DIR, date_str[:4], f"{date_str}.{source}.html.gz")
+
+def read_corpus_page(path: str) -> str:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def _iter_pages(directory: str) -> list:
+    if not os.path.isdir(directory):
+        return []
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        parts = name.split(".")
+        if len(parts) == 4 and parts[1] in CORPUS_SOURCES and name.endswith(".html.gz"):
+            pages.append((parts[0], parts[1], os.path.join(directory, name)))
+    return pages
+
+def iter_corpus(year: int | None = None) -> list:
+    """(дата 'YYYYMMDD', источник, путь) для всех страниц записанного корпуса (или только за год), по порядку дат."""
+    if not os.path.isdir(CORPUS_DIR):
+        return []
+    years = [str(year)] if year else sorted(name for name in os.listdir(CORPUS_DIR) if name.isdigit())
+    return [page for year_dir in years for page in _iter_pages(os.path.join(CORPUS_DIR, year_dir))]
+
+def iter_fixtures() -> list:
+    """То же для фикстур calendar_corpus/fixtures/."""
+    return _iter_pages(FIXTURES_DIR)
+
+def year_date_strs(year: int) -> list:
+    day = date(year, 1, 1)
+    date_strs = []
+    while day.year == year:
+        date_strs.append(day.strftime("%Y%m%d"))
+        day += timedelta(days=1)
+    return date_strs
+
+def save_corpus_page(date_str: str, source: str, html_content: str) -> None:
+    path = corpus_page_path(date_str, source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(html_content)
+    os.replace(tmp_path, path)
+
+async def record_year(year: int, from_cache: bool = False) -> dict:
+    """Записывает недостающие страницы года; возвращает отчёт: записано, уже было, не получено."""
+    report = {"recorded": 0, "existing": 0, "missing": []}
+    semaphore = asyncio.Semaphore(RECORD_CONCURRENCY)
+
+    async def record_day(date_str: str):
+        urls = get_source_urls(date_str)
+        for source in CORPUS_SOURCES:
+            if os.path.exists(corpus_page_path(date_str, source)):
+                report["existing"] += 1
+                continue
+            html_content = get_page_html(urls[source])
+            if html_content is None and not from_cache:
+                async with semaphore:
+                    html_content = await fetch_html_content(urls[source])
+                    await asyncio.sleep(RECORD_PAUSE_SECONDS)
+            if html_content:
+                save_corpus_page(date_str, source, html_content)
+                report["recorded"] += 1
+            else:
+                report["missing"].append(f"{date_str}.{source}")
+
+    await asyncio.gather(*(record_day(date_str) for date_str in year_date_strs(year)))
+    return report
+
+def main() -> int:
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    year = int(args[0]) if args else datetime.now().year
+    report = asyncio.run(record_year(year, from_cache="--from-cache" in sys.argv))
+    print(f"Корпус {year}: записано страниц {report['recorded']}, уже было {report['existing']}, не получено {len(report['missing'])}")
+    for name in report["missing"]:
+        print(f"  нет страницы: {name}")
+    return 1 if report["missing"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Проверка отказоустойчивости AI-клиента (core/ai_client.py) на локальной заглушке
+(scripts/ai_stub_server.py): таймаут, 429, 5xx с переходом на резервного провайдера,
+битый JSON и битый/оборванный поток, отменённый пробный запрос выключателя.
+
+Запуск (из корня проекта; заглушка поднимается внутри скрипта, сеть не нужна):
+    python scripts/check_ai_client.py
+
+Задержки повторов, пауза выключателя и общий срок запроса уменьшены через переменные
+окружения, чтобы проверка шла секунды. Код выхода 1 — есть проваленные проверки.
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.update({
+    "DEEPSEEK_API_KEY": "stub",
+    "AI_FALLBACK_URL": "",
+    "AI_MAX_ATTEMPTS": "3",
+    "AI_RETRY_BASE_DELAY": "0.05",
+    "AI_BREAKER_THRESHOLD": "3",
+    "AI_BREAKER_RESET_SECONDS": "1",
+    "AI_RETRY_BUDGET_SECONDS": "3",
+})
+
+from aiohttp import web # type: ignore # noqa: E402
+from ai_stub_server import REPLY_TEXT, _request_counts, handle_completion # noqa: E402
+from core import ai_client # noqa: E402
+from core.ai_client import AI_MAX_ATTEMPTS, AI_RETRY_BUDGET_SECONDS, AIProvider # noqa: E402
+from core.ai_errors import AINetworkError, AIRateLimitError, AIResponseError, AITimeoutError # noqa: E402
+from core.ai_interaction import get_ai_response, stream_ai_response # noqa: E402
+
+PORT = 8099
+# Имя пользователя делает запрос персональным — ответы не берутся из кэша AI
+USER_NAME = "Проверка"
+
+def use_providers(*modes: str):
+    """Основной (и резервный) провайдер — заглушка в заданных режимах ("slow?delay=30" — режим с параметрами)."""
+    ai_client.providers[:] = []
+    for name, mode in zip(("deepseek", "fallback"), modes):
+        mode, _, query = mode.partition("?")
+        url = f"http://127.0.0.1:{PORT}/{mode}/chat/completions" + (f"?{query}" if query else "")
+        ai_client.providers.append(AIProvider(name, url, "stub", "stub-model"))
+    _request_counts.clear()
+
+async def ask() -> str:
+    return await get_ai_response("Тест", user_name=USER_NAME)
+
+async def check_ok():
+    use_providers("ok")
+    assert (await ask()).strip() == REPLY_TEXT
+
+async def check_timeout():
+    use_providers("slow?delay=30")
+    started_at = time.monotonic()
+    try:
+        await ask()
+        raise AssertionError("ожидался AITimeoutError")
+    except AITimeoutError:
+        pass
+    elapsed = time.monotonic() - started_at
+    assert elapsed < AI_RETRY_BUDGET_SECONDS + 1, f"запрос занял {elapsed:.1f} с при сроке {AI_RETRY_BUDGET_SECONDS} с"
+
+async def check_rate_limited():
+    use_providers("429?retry_after=0.1")
+    try:
+        await ask()
+        raise AssertionError("ожидался AIRateLimitError")
+    except AIRateLimitError:
+        pass
+    assert _request_counts.get("429") == AI_MAX_ATTEMPTS, _request_counts
+    # 429 — провайдер жив, выключатель не размыкается
+    assert ai_client.providers[0].breaker.state == "closed"
+
+async def check_server_error_fallback():
+    use_providers("500", "ok")
+    assert (await ask()).strip() == REPLY_TEXT
+    assert _request_counts.get("500") == AI_MAX_ATTEMPTS and _request_counts.get("ok") == 1, _request_counts
+    assert ai_client.providers[0].breaker.state == "open", "после 3 ошибок 5xx выключатель должен разомкнуться"
+
+async def check_flaky():
+    use_providers("flaky?fail=2")
+    assert (await ask()).strip() == REPLY_TEXT
+    assert _request_counts.get("flaky") == 3, _request_counts
+
+async def check_garbage_json():
+    use_providers("garbage")
+    try:
+        await ask()
+        raise AssertionError("ожидался AIResponseError")
+    except AIResponseError:
+        pass
+
+async def check_malformed_stream():
+    use_providers("garbage")
+    text = "".join([chunk async for chunk in stream_ai_response("Тест", user_name=USER_NAME)])
+    assert text.strip() == REPLY_TEXT, text
+
+async def check_dropped_stream():
+    use_providers("drop")
+    received = []
+    try:
+        async for chunk in stream_ai_response("Тест", user_name=USER_NAME):
+            received.append(chunk)
+        raise AssertionError("ожидался AINetworkError")
+    except AINetworkError:
+        pass
+    assert received, "до обрыва должны прийти первые фрагменты"
+
+async def check_cancelled_probe():
+    use_providers("slow?delay=30")
+    breaker = ai_client.providers[0].breaker
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+    await asyncio.sleep(breaker.reset_seconds + 0.1)
+    assert breaker.state == "half_open"
+    # Пробный запрос отменяется снаружи — его исход не должен потеряться
+    try:
+        await asyncio.wait_for(ask(), timeout=0.3)
+    except asyncio.TimeoutError:
+        pass
+    assert not breaker.probe_in_flight, "пробный запрос остался «в полёте» после отмены"
+    assert breaker.state == "open", "отменённый пробный запрос должен снова разомкнуть выключатель"
+    await asyncio.sleep(breaker.reset_seconds + 0.1)
+    assert breaker.allow_request(), "после паузы выключатель должен пропустить новый пробный запрос"
+    breaker.record_success()
+
+CHECKS = [
+    ("обычный ответ", check_ok),
+    ("таймаут укладывается в общий срок", check_timeout),
+    ("429 с Retry-After", check_rate_limited),
+    ("5xx и переход на резервного провайдера", check_server_error_fallback),
+    ("503 дважды, затем ответ", check_flaky),
+    ("битый JSON", check_garbage_json),
+    ("битые фрагменты потока", check_malformed_stream),
+    ("обрыв потока", check_dropped_stream),
+    ("отменённый пробный запрос", check_cancelled_probe),
+]
+
+async def main() -> int:
+    app = web.Application()
+    app.router.add_post("/{mode}/chat/completions", handle_completion)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    failed = 0
+    try:
+        for name, check in CHECKS:
+            try:
+                await check()
+                print(f"OK    {name}")
+            except Exception as e:
+                failed += 1
+                print(f"FAIL  {name}: {type(e).__name__}: {e}")
+    finally:
+        await runner.cleanup()
+    print(f"Проверок: {len(CHECKS)}, провалено: {failed}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,89 @@
+"""
+Проверка парсеров календаря по эталону: для каждой страницы корпуса (scripts/calendar_corpus.py)
+поля holidays, namedays, fasting, week_info и theophan_thoughts должны совпадать
+с сохранёнными в calendar_corpus/golden.json — у каждого бэкенда разбора.
+Так же проверяются фикстуры calendar_corpus/fixtures/ по своему эталону fixtures/golden.json.
+
+Запуск (из корня проекта):
+    python scripts/check_calendar_golden.py           # проверка
+    python scripts/check_calendar_golden.py --update  # записать эталоны (бэкендом reference)
+
+Эталон обновляют только осознанно — после проверки, что новый результат парсера правильный
+(и вместе с увеличением CALENDAR_PARSER_VERSION). Код выхода 1 — есть расхождения.
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_corpus import FIXTURES_GOLDEN_FILE, GOLDEN_FILE, iter_corpus, iter_fixtures, read_corpus_page # noqa: E402
+from check_calendar_parsers import PARSERS # noqa: E402
+from utils.html_parser import CALENDAR_PARSER_BACKENDS, LXML_AVAILABLE # noqa: E402
+
+GOLDEN_FIELDS = ("holidays", "namedays", "fasting", "week_info", "theophan_thoughts")
+
+def extract(source: str, html_content: str, backend: str) -> dict:
+    result = PARSERS[source](html_content, backend=backend)
+    return {field: result.get(field) for field in GOLDEN_FIELDS}
+
+def update_golden(pages: list, golden_file: str) -> None:
+    golden = {f"{date_str}.{source}": extract(source, read_corpus_page(path), "reference") for date_str, source, path in pages}
+    with open(golden_file, 'w', encoding='utf-8') as f:
+        json.dump(golden, f, ensure_ascii=False, indent=1, sort_keys=True)
+    print(f"Эталон записан: {len(golden)} страниц → {golden_file}")
+
+def check_pages(title: str, pages: list, golden_file: str, backends: list) -> int:
+    """Сверяет страницы с эталоном golden_file; возвращает число расхождений (или 1, если эталона нет)."""
+    if not os.path.exists(golden_file):
+        print(f"{title}: нет эталона {golden_file} — запишите его с ключом --update")
+        return 1
+    with open(golden_file, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    failures = 0
+    unknown = 0
+    for date_str, source, path in pages:
+        key = f"{date_str}.{source}"
+        if key not in golden:
+            unknown += 1
+            continue
+        html_content = read_corpus_page(path)
+        for backend in backends:
+            result = extract(source, html_content, backend)
+            differing = [field for field in GOLDEN_FIELDS if result[field] != golden[key][field]]
+            if differing:
+                failures += 1
+                print(f"РАСХОЖДЕНИЕ {backend} — {key}: поля {', '.join(differing)}")
+    missing = len(set(golden) - {f"{date_str}.{source}" for date_str, source, _ in pages})
+
+    print(f"{title}: проверено страниц {len(pages) - unknown}, бэкендов {len(backends)}, расхождений {failures}")
+    if unknown:
+        print(f"  страниц без эталона: {unknown} (обновите эталон с ключом --update)")
+    if missing:
+        print(f"  страниц эталона нет в корпусе: {missing}")
+    return failures
+
+def main() -> int:
+    page_sets = [
+        ("Корпус", iter_corpus(), GOLDEN_FILE),
+        ("Фикстуры", iter_fixtures(), FIXTURES_GOLDEN_FILE),
+    ]
+    page_sets = [page_set for page_set in page_sets if page_set[1]]
+    if not page_sets:
+        print("Корпус пуст: запишите его командой python scripts/calendar_corpus.py")
+        return 1
+    if "--update" in sys.argv:
+        for _, pages, golden_file in page_sets:
+            update_golden(pages, golden_file)
+        return 0
+
+    backends = [backend for backend in CALENDAR_PARSER_BACKENDS if backend != "lxml" or LXML_AVAILABLE]
+    if not LXML_AVAILABLE:
+        print("lxml не установлен — бэкенд lxml не проверяется.")
+    if not iter_corpus():
+        print("Записанного корпуса нет — проверяются только фикстуры (python scripts/calendar_corpus.py записывает корпус).")
+    failures = sum(check_pages(title, pages, golden_file, backends) for title, pages, golden_file in page_sets)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
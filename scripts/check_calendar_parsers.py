@@ -0,0 +1,88 @@
+"""
+Проверка бэкендов разбора календаря: для сохранённых страниц azbyka.ru и pravoslavie.ru
+результат быстрых бэкендов (fast, lxml) должен совпадать с эталонным (reference).
+
+Запуск (из корня проекта):
+    python scripts/check_calendar_parsers.py                 # страницы из кэша календаря (calendar_cache/)
+    python scripts/check_calendar_parsers.py путь/к/html ... # отдельные файлы (.html или .html.gz)
+    python scripts/check_calendar_parsers.py calendar_corpus/2025/*.gz  # корпус (scripts/calendar_corpus.py)
+    python scripts/check_calendar_parsers.py calendar_corpus/fixtures/*.gz  # фикстуры корпуса
+
+Источник страницы определяется по URL из индекса кэша или по имени файла
+(в имени должно быть "azbyka" или "pravoslavie"). Код выхода 1 — есть расхождения
+или не проверено ни одной страницы.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.calendar_cache import CALENDAR_CACHE_INDEX_FILE, _page_path # noqa: E402
+from utils.html_parser import CALENDAR_PARSER_BACKENDS, LXML_AVAILABLE, parse_azbyka_calendar_page, parse_pravoslavie_calendar_page # noqa: E402
+
+PARSERS = {"azbyka": parse_azbyka_calendar_page, "pravoslavie": parse_pravoslavie_calendar_page}
+
+def read_html(path: str) -> str:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+def source_of(name: str) -> str | None:
+    for source in PARSERS:
+        if source in name:
+            return source
+    return None
+
+def cached_pages() -> list:
+    """(источник, путь, подпись) для каждой страницы из кэша календаря."""
+    if not os.path.exists(CALENDAR_CACHE_INDEX_FILE):
+        return []
+    with open(CALENDAR_CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    return [(source_of(url), _page_path(url), url) for url in index.get("pages", {})]
+
+def main() -> int:
+    if len(sys.argv) > 1:
+        pages = [(source_of(os.path.basename(path)), path, path) for path in sys.argv[1:]]
+    else:
+        pages = cached_pages()
+    if not pages:
+        print("Нет страниц для проверки: заполните кэш календаря или передайте файлы.")
+        return 1
+
+    backends = [backend for backend in CALENDAR_PARSER_BACKENDS if backend != "lxml" or LXML_AVAILABLE]
+    if not LXML_AVAILABLE:
+        print("lxml не установлен — бэкенд lxml не проверяется.")
+    timings = {backend: 0.0 for backend in backends}
+    mismatches = 0
+    checked = 0
+    for source, path, label in pages:
+        if source is None or not os.path.exists(path):
+            print(f"Пропуск {label}: неизвестный источник или нет файла")
+            continue
+        html_content = read_html(path)
+        results = {}
+        for backend in backends:
+            started_at = time.perf_counter()
+            results[backend] = PARSERS[source](html_content, backend=backend)
+            timings[backend] += time.perf_counter() - started_at
+        checked += 1
+        for backend in backends:
+            if results[backend] != results["reference"]:
+                mismatches += 1
+                differing = [key for key in results["reference"] if results[backend].get(key) != results["reference"][key]]
+                print(f"РАСХОЖДЕНИЕ {backend} — {label}: поля {', '.join(differing)}")
+
+    print(f"Проверено страниц: {checked}, расхождений: {mismatches}")
+    for backend in backends:
+        print(f"  {backend}: {timings[backend] * 1000:.0f} мс всего")
+    if not checked:
+        print("Ни одна страница не проверена.")
+        return 1
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""
+Проверка уставных правил поста (core/calendar_data.py, get_fasting_info) на известных днях:
+праздники, выпадающие на среду и пятницу, послабления в многодневные посты, однодневные посты.
+
+Запуск (из корня проекта; сеть не нужна):
+    python scripts/check_fasting_rules.py
+
+Код выхода 1 — есть расхождения.
+"""
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.calendar_data import get_fasting_info # noqa: E402
+
+# (день, ожидаемое начало строки поста)
+CASES = (
+    (date(2022, 1, 19), "Крещение Господне — поста нет"),  # Богоявление в среду
+    (date(2025, 1, 18), "Крещенский сочельник — строгий пост"),
+    (date(2025, 1, 7), "Святки — поста нет"),
+    (date(2026, 8, 28), "Успение Пресвятой Богородицы: пост в пятницу ослаблен"),  # Успение в пятницу
+    (date(2025, 8, 28), "Поста нет"),  # Успение в четверг
+    (date(2025, 8, 19), "Успенский пост: праздник, разрешается рыба"),  # Преображение
+    (date(2025, 4, 7), "Великий пост: праздник, разрешается рыба"),  # Благовещение
+    (date(2025, 4, 13), "Великий пост: праздник, разрешается рыба"),  # Вход Господень
+    (date(2025, 4, 18), "Великий пост, Страстная седмица."),
+    (date(2025, 12, 4), "Рождественский пост: праздник, разрешается рыба"),  # Введение
+    (date(2025, 12, 3), "Рождественский пост."),
+    (date(2025, 7, 7), "Петров пост: праздник, разрешается рыба"),  # Рождество Иоанна Предтечи
+    (date(2025, 9, 11), "Постный день: Усекновение"),
+    (date(2025, 9, 27), "Постный день: Воздвижение"),
+    (date(2024, 10, 14), "Поста нет"),  # Покров в понедельник
+    (date(2023, 10, 14), "Поста нет"),  # Покров в субботу
+    (date(2026, 10, 14), "Покров Пресвятой Богородицы: пост в среду ослаблен"),
+    (date(2025, 1, 22), "Постный день (среда)"),
+    (date(2025, 7, 25), "Постный день (пятница)"),
+    (date(2025, 4, 23), "Сплошная седмица — поста нет"),
+)
+
+def main() -> int:
+    failed = 0
+    for day, expected in CASES:
+        actual = get_fasting_info(day)
+        if not actual.startswith(expected):
+            failed += 1
+            print(f"РАСХОЖДЕНИЕ {day.isoformat()}: ожидалось «{expected}…», получено «{actual}»")
+    print(f"Проверено дней: {len(CASES)}, расхождений: {failed}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Проверка раскладки сообщений (utils/message_layout.py) на случайном HTML: каждая часть
+split_html / layout_caption / truncate_html укладывается в лимит видимых символов,
+теги в каждой части парные, а при разбиении не теряется и не дублируется видимый текст
+(с точностью до пробелов на местах разреза).
+
+Запуск (из корня проекта):
+    python scripts/check_message_layout.py             # 20000 строк, seed 0
+    python scripts/check_message_layout.py 100000 3
+
+Код выхода 1 — есть нарушения.
+"""
+import os
+import re
+import sys
+import html
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.message_layout import layout_caption, split_html, truncate_html, visible_length # noqa: E402
+
+FRAGMENTS = [
+    "<b>", "</b>", "<i>", "</i>", '<a href="https://azbyka.ru">', "</a>", "<blockquote>", "</blockquote>",
+    "&amp;", "&lt;", "&#39;", "🙏", "✨", "слово", "Господи", " ", ". ", "! ", "…\n", "\n", "\n\n", "x" * 40,
+]
+_TAG = re.compile(r"<(/?)([a-z]+)[^>]*>")
+
+def random_html(rng: random.Random) -> str:
+    """Случайный HTML с правильно вложенными тегами."""
+    parts, stack = [], []
+    for _ in range(rng.randint(0, 80)):
+        fragment = rng.choice(FRAGMENTS)
+        tag = _TAG.fullmatch(fragment)
+        if tag and tag.group(1):
+            if stack:
+                parts.append(f"</{stack.pop()}>")
+            continue
+        if tag:
+            stack.append(tag.group(2))
+        parts.append(fragment)
+    parts.extend(f"</{name}>" for name in reversed(stack))
+    return "".join(parts)
+
+def balanced(html_text: str) -> bool:
+    stack = []
+    for closing, name in _TAG.findall(html_text):
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack
+
+def plain(html_text: str) -> str:
+    return re.sub(r"\s+", "", html.unescape(_TAG.sub("", html_text)))
+
+def check(html_text: str, limit: int) -> list:
+    problems = []
+    parts = split_html(html_text, limit)
+    caption, follow_ups = layout_caption(html_text, limit, limit * 2)
+    for name, chunks, chunk_limits in (("split_html", parts, [limit] * len(parts)), ("layout_caption", [caption] + follow_ups, [limit] + [limit * 2] * len(follow_ups))):
+        for chunk, chunk_limit in zip(chunks, chunk_limits):
+            if visible_length(chunk) > chunk_limit:
+                problems.append(f"{name}: часть длиннее {chunk_limit}: {chunk!r}")
+            if not balanced(chunk):
+                problems.append(f"{name}: непарные теги: {chunk!r}")
+        if "".join(plain(chunk) for chunk in chunks) != plain(html_text):
+            problems.append(f"{name}: текст частей не совпадает с исходным: {chunks!r}")
+    truncated = truncate_html(html_text, limit, limit // 2, "...")
+    if visible_length(truncated) > limit or not balanced(truncated):
+        problems.append(f"truncate_html: {truncated!r}")
+    return problems
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = random.Random(seed)
+    failures = 0
+    for _ in range(count):
+        html_text = random_html(rng)
+        problems = check(html_text, rng.randint(8, 200))
+        if problems:
+            failures += 1
+            if failures <= 10:
+                print(f"Вход: {html_text!r}")
+                for problem in problems:
+                    print(f"  {problem}")
+    print(f"Строк проверено: {count}, с нарушениями: {failures}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
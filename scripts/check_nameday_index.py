@@ -0,0 +1,134 @@
+"""
+Проверка нормализации имён для индекса именин (core/nameday_index.py) на записях корпуса
+календаря: именины из эталона фикстур calendar_corpus/fixtures/golden.json (то, что парсеры
+берут со страниц azbyka.ru и pravoslavie.ru) приводятся к одной форме с запросами пользователей.
+
+Запуск (из корня проекта; сеть не нужна):
+    python scripts/check_nameday_index.py
+
+Проверяется:
+- записи вида «Прп. Се́ргия Радонежского» дают то же имя, что и список именин azbyka.ru
+  за тот же день («Се́ргий»), — или имя из KNOWN_ENTRIES;
+- в нормализованных именах нет ударений и санов;
+- поиск по индексу, построенному из корпуса, находит дни по гражданской форме имени;
+- корпус покрывает не весь год, поэтому его даты не переносятся на другие годы;
+- при полном покрытии память в день подвижного праздника переносится по Пасхе, а не по числу.
+Код выхода 1 — есть расхождения.
+"""
+import os
+import sys
+import json
+import unicodedata
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calendar_corpus import FIXTURES_GOLDEN_FILE # noqa: E402
+from core.nameday_index import ( # noqa: E402
+    SAINT_TITLES, SAINT_TITLES_OBLIQUE, build_coverage, build_nameday_index, covers_full_year, normalize_name, upcoming_dates,
+)
+
+# Записи, имени из которых нет в списке именин azbyka.ru за тот же день
+# (парсер azbyka.ru убирает из именин имена, входящие в название праздника)
+KNOWN_ENTRIES = {
+    "Сщмч. Феопемпта, епископа Никомидийского, и мч. Феоны волхва": "феопемпт",
+    "Мч. Платона": "платон",
+}
+# Отдельные формы: запись или запрос -> нормализованное имя
+NAME_CASES = (
+    ("Се́ргий", "сергий"),
+    ("Сергей", "сергий"),
+    ("Преподобного Сергия", "сергий"),
+    ("Святителю Николаю", "николай"),
+    ("Прор. Ильи", "илия"),
+    ("Ап. Павла", "павел"),
+    ("Вмц. Варвары", "варвара"),
+    ("Мц. Любови", "любовь"),
+    ("святой Илия", "илия"),
+)
+# Поиск по индексу корпуса: имя в форме пользователя -> (месяц, день)
+LOOKUP_CASES = (
+    ("Сергей", (4, 20)),
+    ("Алексей", (4, 20)),
+    ("Мария", (4, 14)),
+    ("Фёдор", (3, 3)),
+    ("Лев", (3, 3)),
+    ("Дмитрий", (6, 16)),
+    ("Платон", (4, 19)),
+    ("Иван", (6, 11)),
+)
+
+# Полное покрытие: известные даты -> ближайшие три даты с 1 января 2025 года
+PROJECTION_CASES = (
+    ({date(2024, 12, 19)}, [date(2024 + year, 12, 19) for year in (1, 2, 3)]),
+    # Пасха 2025 — 20 апреля, 2026 — 12 апреля, 2027 — 2 мая
+    ({date(2025, 4, 20)}, [date(2025, 4, 20), date(2026, 4, 12), date(2027, 5, 2)]),
+    # Лазарева суббота: за день до Вербного воскресенья
+    ({date(2024, 4, 27)}, [date(2025, 4, 12), date(2026, 4, 4), date(2027, 4, 24)]),
+)
+
+def load_corpus_namedays() -> dict:
+    """'YYYYMMDD' -> {источник: список записей именин}."""
+    with open(FIXTURES_GOLDEN_FILE, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    days: dict = {}
+    for key, fields in golden.items():
+        date_str, source = key.split(".")
+        days.setdefault(date_str, {})[source] = fields.get("namedays") or []
+    return days
+
+def main() -> int:
+    if not os.path.exists(FIXTURES_GOLDEN_FILE):
+        print(f"Нет эталона {FIXTURES_GOLDEN_FILE}: запишите его (scripts/check_calendar_golden.py --update)")
+        return 1
+    days = load_corpus_namedays()
+    failures = 0
+    entries = 0
+    titles = SAINT_TITLES | SAINT_TITLES_OBLIQUE
+    for date_str, sources in sorted(days.items()):
+        plain_names = {normalize_name(entry) for entry in sources.get("azbyka", [])}
+        for source, source_entries in sources.items():
+            for entry in source_entries:
+                entries += 1
+                name = normalize_name(entry)
+                if not name or name in titles or any(unicodedata.combining(c) for c in name):
+                    failures += 1
+                    print(f"ИМЯ {date_str}.{source}: «{entry}» -> {name!r}")
+                elif source != "azbyka" and name not in plain_names and KNOWN_ENTRIES.get(entry) != name:
+                    failures += 1
+                    print(f"НЕТ В ИМЕНИНАХ ДНЯ {date_str}.{source}: «{entry}» -> {name!r}")
+
+    for text, expected in NAME_CASES:
+        if normalize_name(text) != expected:
+            failures += 1
+            print(f"ФОРМА «{text}»: ожидалось {expected!r}, получено {normalize_name(text)!r}")
+
+    index = build_nameday_index(
+        (date_str, {"namedays": [entry for source_entries in sources.values() for entry in source_entries]})
+        for date_str, sources in days.items()
+    )
+    for name, month_day in LOOKUP_CASES:
+        if month_day not in {(day.month, day.day) for day in index.get(normalize_name(name) or "", set())}:
+            failures += 1
+            print(f"ПОИСК «{name}»: нет дня {month_day[1]:02d}.{month_day[0]:02d}")
+
+    # Неполный индекс: только даты корпуса, без повторения того же дня в следующие годы
+    full_year = covers_full_year(build_coverage(days))
+    for name, _ in LOOKUP_CASES:
+        known = sorted(index.get(normalize_name(name) or "", set()))
+        found = upcoming_dates(set(known), full_year, 5, date(int(min(days)[:4]), 1, 1))
+        if full_year or found != known[:5]:
+            failures += 1
+            print(f"НЕПОЛНЫЙ ИНДЕКС «{name}»: {found} (весь год: {full_year}), ожидались {known[:5]}")
+    for known, expected in PROJECTION_CASES:
+        found = upcoming_dates(known, True, len(expected), date(2025, 1, 1))
+        if found != expected:
+            failures += 1
+            print(f"ПЕРЕНОС {sorted(known)}: {found}, ожидалось {expected}")
+
+    print(f"Записей именин: {entries}, имён в индексе: {len(index)}, форм: {len(NAME_CASES)}, "
+          f"поисков: {len(LOOKUP_CASES)}, переносов: {len(PROJECTION_CASES)}, расхождений: {failures}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
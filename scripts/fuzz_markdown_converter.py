@@ -0,0 +1,143 @@
+"""
+Проверка convert_markdown_to_html (utils/html_parser.py) на случайном корпусе: однопроходный
+разборщик должен давать тот же HTML, что и прежняя реализация (reference_convert_markdown_to_html
+ниже — последовательность замен, которой бот пользовался раньше), в обоих режимах preserve_html_tags.
+Исключение — строки, где прежняя реализация перекрывала теги («_a **b_ c**» -> <i>a <b>b</i> c</b>,
+такое сообщение Telegram отклоняет): там новая оставляет курсив текстом. Без preserve_html_tags
+все теги результата создаёт сам разборщик, поэтому они проверяются на правильную вложенность —
+и в расширенном режиме тоже. Расширенная разметка (подчёркивание, код, ссылки, цитаты)
+дополнительно проверяется на примерах.
+
+Запуск (из корня проекта):
+    python scripts/fuzz_markdown_converter.py              # 20000 строк, seed 0
+    python scripts/fuzz_markdown_converter.py 100000 7     # 100000 строк, seed 7
+
+Строки, в которых внутри HTML-тега есть «*» или «_», пропускаются: прежняя реализация
+размечала и содержимое тегов (ломая, например, адреса ссылок), новая переносит теги как есть.
+Код выхода 1 — есть расхождения.
+"""
+import os
+import re
+import sys
+import html
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.html_parser import convert_markdown_to_html # noqa: E402
+
+def reference_convert_markdown_to_html(text: str, preserve_html_tags: bool = True) -> str:
+    """Прежняя реализация convert_markdown_to_html (эталон для сравнения)."""
+    if not text:
+        return text
+    html_tags = []
+    if preserve_html_tags:
+        def save_tag(match):
+            html_tags.append(match.group(0))
+            return f"___HTML_TAG_{len(html_tags) - 1}___"
+        text = re.sub(r'<[^>]+>', save_tag, text)
+    else:
+        text = html.unescape(text)
+    text = text.replace('&', '&amp;')
+    text = text.replace('<', '&lt;')
+    text = text.replace('>', '&gt;')
+    if preserve_html_tags:
+        for i, tag in enumerate(html_tags):
+            text = text.replace(f"___HTML_TAG_{i}___", tag)
+    text = re.sub(r'\*\*((?:[^*]|\*(?!\*))+?)\*\*', r'<b>\1</b>', text, flags=re.DOTALL)
+    text = re.sub(r'(?<!\*)_([^_]+)_(?!\*)', r'<i>\1</i>', text)
+    return text
+
+# Фрагменты, из которых собираются случайные строки: разметка чаще обычного текста
+FRAGMENTS = [
+    "*", "**", "***", "_", "__", "&", "<", ">", " ", "\n", "a", "слово", "Господи", "🙏", "1",
+    "&amp;", "&gt;", "&lt;b&gt;", "&#39;", "&nbsp;", "<b>", "</b>", "<i>", "</i>", "<br>",
+    '<a href="https://azbyka.ru">', "</a>", "<blockquote>", "</blockquote>", "'", '"', "`", "[", "]", "(", ")",
+]
+_TAG_WITH_MARKUP = re.compile(r"<[^>]*[*_][^>]*>")
+_OUTPUT_TAG = re.compile(r"<(/?)([a-z]+)[^>]*>")
+_INPUT_TAG = re.compile(r"<[^>]+>")
+
+def is_well_nested(html_text: str) -> bool:
+    """Каждый закрывающий тег закрывает последний открытый, и все теги закрыты."""
+    stack = []
+    for match in _OUTPUT_TAG.finditer(html_text):
+        closing, name = match.groups()
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+# (текст, ожидаемый HTML) для расширенной разметки (extended=True, preserve_html_tags=False)
+EXTENDED_CASES = [
+    ("__важно__", "<u>важно</u>"),
+    ("код: `a < b && c`", "код: <code>a &lt; b &amp;&amp; c</code>"),
+    ("```python\nprint('**')\n```", "<pre><code class=\"language-python\">print('**')</code></pre>"),
+    ("```\n_x_ <b>\n```", "<pre>_x_ &lt;b&gt;</pre>"),
+    ("[Азбука](https://azbyka.ru/days?a=1&b=2)", '<a href="https://azbyka.ru/days?a=1&amp;b=2">Азбука</a>'),
+    ("[ссылка](javascript:alert(1))", "[ссылка](javascript:alert(1))"),
+    ("> **Блажени** нищии духом\n> _Мф. 5:3_\nДалее", "<blockquote><b>Блажени</b> нищии духом\n<i>Мф. 5:3</i></blockquote>\nДалее"),
+    ("a > b", "a &gt; b"),
+    ("**жирный** и _курсив_ и __подчёркнутый__", "<b>жирный</b> и <i>курсив</i> и <u>подчёркнутый</u>"),
+    ("путь `a_b_c` и _курсив_", "путь <code>a_b_c</code> и <i>курсив</i>"),
+    ("__a **b__ c**", "__a <b>b__ c</b>"),
+    ("**a __b** c__", "<b>a __b</b> c__"),
+    ("__a _b__ c_", "__a <i>b__ c</i>"),
+    ("**a __b__ c** __d **e** f__", "<b>a <u>b</u> c</b> <u>d <b>e</b> f</u>"),
+    ("_a **b_ c**", "_a <b>b_ c</b>"),
+]
+
+def main() -> int:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    rng = random.Random(seed)
+
+    checked = skipped = crossing = mismatches = malformed = 0
+    for _ in range(count):
+        text = random_text(rng)
+        for preserve_html_tags in (True, False):
+            if preserve_html_tags and _TAG_WITH_MARKUP.search(text):
+                skipped += 1
+                continue
+            expected = reference_convert_markdown_to_html(text, preserve_html_tags)
+            actual = convert_markdown_to_html(text, preserve_html_tags)
+            checked += 1
+            if not preserve_html_tags and not is_well_nested(actual):
+                malformed += 1
+                print(f"Перекрывающиеся теги:\n  вход:    {text!r}\n  получено: {actual!r}")
+            # Перекрывает ли прежняя реализация свои теги: исходные теги заменяются обычным символом
+            reference_tags = expected if not preserve_html_tags else reference_convert_markdown_to_html(_INPUT_TAG.sub("§", text), False)
+            if not is_well_nested(reference_tags):
+                crossing += 1
+                continue
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"Расхождение (preserve_html_tags={preserve_html_tags}):\n  вход:    {text!r}\n  эталон:  {expected!r}\n  получено: {actual!r}")
+        extended_html = convert_markdown_to_html(text, preserve_html_tags=False, extended=True)
+        if not is_well_nested(extended_html):
+            malformed += 1
+            if malformed <= 10:
+                print(f"Перекрывающиеся теги (extended):\n  вход:    {text!r}\n  получено: {extended_html!r}")
+
+    extended_failures = 0
+    for text, expected in EXTENDED_CASES:
+        actual = convert_markdown_to_html(text, preserve_html_tags=False, extended=True)
+        if actual != expected:
+            extended_failures += 1
+            print(f"Расширенная разметка:\n  вход:    {text!r}\n  ожидается: {expected!r}\n  получено: {actual!r}")
+
+    print(
+        f"Строк сравнено: {checked}, пропущено (разметка внутри тега): {skipped}, "
+        f"эталон с перекрывающимися тегами: {crossing}, расхождений: {mismatches}"
+    )
+    print(f"Результатов с перекрывающимися тегами: {malformed}")
+    print(f"Примеров расширенной разметки: {len(EXTENDED_CASES)}, ошибок: {extended_failures}")
+    return 1 if mismatches or malformed or extended_failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,103 +1,494 @@
+import os
 import re
 import asyncio
 import aiohttp
 import html
-from bs4 import BeautifulSoup
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+from bs4 import BeautifulSoup, SoupStrainer
 
-def convert_markdown_to_html(text: str, preserve_html_tags: bool = True) -> str:
+try:
+    import lxml # type: ignore # noqa: F401 — быстрый парсер HTML для календаря (необязательная зависимость)
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    import brotli # type: ignore # noqa: F401 — aiohttp распаковывает ответы br, только если установлен Brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Разметка, которую понимает convert_markdown_to_html. HTML-теги (при preserve_html_tags) и блоки
+# расширенной разметки отделяются одним re.split (каждая альтернатива начинается с известного
+# символа — поиск идёт в C), группы выражения сразу дают части блока (язык, код, подпись, адрес...).
+# Весь текст между блоками размечается за один разбор с «*» и «_» (str.split), а на месте
+# блоков стоит заместитель.
+_MARKDOWN_BLOCK_PATTERN = (
+    r"```([\w+-]*)\n?(.*?)```"                        # блок кода: язык, код
+    r"|`([^`\n]+)`"                                   # код
+    r"|\[([^\]\n]+)\]\((https?://[^\s()<>\"]+)\)"      # ссылка: подпись, адрес
+    r"|\n(>[^\n]*(?:\n>[^\n]*)*)"                      # цитата с начала строки
+)
+# (preserve_html_tags, extended) -> (разбиение на текст и блоки, число групп, признаки блоков в тексте)
+_MARKDOWN_BLOCK_SPLIT = {
+    (True, False): (re.compile(r"(<[^>]+>)").split, 1, ("<",)),
+    (False, True): (re.compile(_MARKDOWN_BLOCK_PATTERN, re.DOTALL).split, 6, ("`", "[", "\n>")),
+    (True, True): (re.compile(_MARKDOWN_BLOCK_PATTERN + r"|<([^>]+)>", re.DOTALL).split, 7, ("<", "`", "[", "\n>")),
+}
+# Заместители тега или блока и «__» при разборе текста (в тексте сообщений их не бывает)
+_BLOCK_PLACEHOLDER = "\x00"
+_UNDERLINE_PLACEHOLDER = "\x01"
+_QUOTE_LINE_PREFIX = re.compile(r"^> ?", re.MULTILINE)
+
+def _render_markdown_block(preserve_html_tags: bool, language: Optional[str], pre: Optional[str], code: Optional[str],
+                           label: Optional[str], url: Optional[str], quote: Optional[str], tag: Optional[str] = None) -> str:
+    """HTML для кода, блока кода, ссылки, цитаты (расширенная разметка) или HTML-тега: задана одна из частей."""
+    if code is not None:
+        return "<code>" + code.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;") + "</code>"
+    if url is not None:
+        # В адресе нет пробелов, скобок, «<», «>» и «"» (см. _MARKDOWN_BLOCK_PATTERN) — экранируются «&» и «'»
+        url = url.replace("&", "&amp;").replace("'", "&#x27;")
+        label = label.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        return f'<a href="{url}">{label}</a>'
+    if pre is not None:
+        if pre.endswith("\n"):
+            pre = pre[:-1]  # перевод строки перед закрывающими ``` — не часть кода
+        pre = pre.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        if language:
+            return f'<pre><code class="language-{language}">{pre}</code></pre>'
+        return f"<pre>{pre}</pre>"
+    if quote is not None:
+        # Цитата: её строки (без «>») размечаются отдельно, чтобы теги не выходили за пределы blockquote
+        quoted = _QUOTE_LINE_PREFIX.sub("", quote)
+        return f"\n<blockquote>{_convert_markdown(quoted, preserve_html_tags, True)}</blockquote>"
+    return f"<{tag}>"  # HTML-тег доверенного контента переносится как есть
+
+def _tokenize_text(text: str, parts: list, stars: list, underscores: list, underlines: list, extended: bool) -> None:
+    """
+    Разбор обычного текста между тегами и блоками: экранирование и поиск «*» и «_» делают
+    str.replace и str.split, в Python — только цикл по служебным символам. Результат
+    дописывается в parts, индексы серий «*», «_» и «__» — в stars, underscores и underlines.
+    """
+    append = parts.append
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    chunks = text.split("_")
+    last = len(chunks) - 1
+    for chunk_index, chunk in enumerate(chunks):
+        if chunk_index:
+            if chunk is None:
+                continue  # второй символ «__»
+            if extended and not chunk and chunk_index < last:
+                # Пустой кусок между двумя «_» — это «__»
+                underlines.append(len(parts))
+                append("__")
+                chunk = chunks[chunk_index + 1]
+                chunks[chunk_index + 1] = None
+            else:
+                underscores.append(len(parts))
+                append("_")
+        if "*" not in chunk:
+            if chunk:
+                append(chunk)
+            continue
+        pieces = chunk.split("*")
+        if pieces[0]:
+            append(pieces[0])
+        # Между соседними кусками ровно одна «*»: пустые куски — продолжение серии
+        run = 0
+        for piece in pieces[1:]:
+            run += 1
+            if piece:
+                stars.append(len(parts))
+                append("*" * run)
+                append(piece)
+                run = 0
+        if run:
+            stars.append(len(parts))
+            append("*" * run)
+
+def _interleave(pieces: list, separators: list) -> str:
+    """Собирает pieces[0] + separators[0] + pieces[1] + ...; separators на один элемент короче pieces."""
+    joined = pieces * 2
+    joined.pop()
+    joined[::2] = pieces
+    joined[1::2] = separators
+    return "".join(joined)
+
+def _tags_balanced(text: str) -> bool:
+    """Теги в text (только созданные разборщиком: <b>, <i>, <u>) закрываются в порядке открытия."""
+    stack = []
+    for piece in text.split("<")[1:]:
+        if piece[0] == "/":
+            if not stack or stack.pop() != piece[1]:
+                return False
+        else:
+            stack.append(piece[0])
+    return not stack
+
+def _markup_text(text: str, extended: bool) -> str:
+    """
+    Экранирует текст и расставляет теги жирного, курсива и подчёркнутого — с тем же результатом,
+    что _tokenize_text и _resolve_markdown, но на str.split: если в тексте нет серий из трёх и
+    более «*», серии «**» просто чередуются «<b>», «</b>», а у курсива и подчёркнутого содержимое
+    пары — один кусок разбиения, и пересечение с уже расставленными тегами видно по этому куску.
+    """
+    if "***" in text or _UNDERLINE_PLACEHOLDER in text:
+        parts = []        # фрагменты результата
+        stars = []        # индексы серий «*» в parts
+        underscores = []  # индексы «_» в parts
+        underlines = []   # индексы «__» в parts
+        _tokenize_text(text, parts, stars, underscores, underlines, extended)
+        return _resolve_markdown(parts, stars, underscores, underlines)
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    if extended:
+        text = text.replace("__", _UNDERLINE_PLACEHOLDER)
+    # Жирный; незакрытое последнее «**» остаётся звёздочками
+    pieces = text.split("**")
+    if len(pieces) > 1:
+        count = len(pieces) - 1
+        tags = ["<b>", "</b>"] * (count // 2)
+        if count % 2:
+            tags.append("**")
+        text = _interleave(pieces, tags)
+    # Курсив: непустой кусок между «_», без звёздочки снаружи пары и без пересечения с жирным
+    pieces = text.split("_")
+    if len(pieces) > 2:
+        last = len(pieces) - 1
+        tags = ["_"] * last
+        index = 1
+        while index < last:
+            content = pieces[index]
+            if (
+                content
+                and not pieces[index - 1].endswith("*")
+                and not pieces[index + 1].startswith("*")
+                and ("<" not in content or _tags_balanced(content))
+            ):
+                tags[index - 1], tags[index] = "<i>", "</i>"
+                index += 2
+            else:
+                index += 1
+        text = _interleave(pieces, tags)
+    # Подчёркнутый: пары «__» подряд, непустые и не пересекающие жирный и курсив
+    if extended and _UNDERLINE_PLACEHOLDER in text:
+        pieces = text.split(_UNDERLINE_PLACEHOLDER)
+        count = len(pieces) - 1
+        tags = ["__"] * count
+        for index in range(1, count, 2):
+            content = pieces[index]
+            if content and ("<" not in content or _tags_balanced(content)):
+                tags[index - 1], tags[index] = "<u>", "</u>"
+        text = _interleave(pieces, tags)
+    return text
+
+def _convert_markdown(text: str, preserve_html_tags: bool, extended: bool) -> str:
+    parts = []        # фрагменты результата (при заместителе в самом тексте)
+    stars = []        # индексы серий «*» в parts
+    underscores = []  # индексы «_» в parts
+    underlines = []   # индексы «__» в parts
+    # Цитата с первой строки: перевод строки в начале делает её такой же, как остальные
+    quote_first = extended and text.startswith(">")
+    if quote_first:
+        text = "\n" + text
+    split, groups, markers = _MARKDOWN_BLOCK_SPLIT.get((preserve_html_tags, extended), (None, 0, ()))
+    # Проверка «in» быстрее поиска по выражению: в большинстве ответов блоков нет
+    pieces = split(text) if any(marker in text for marker in markers) else None
+    if not pieces or len(pieces) == 1:
+        converted = _markup_text(text, extended)
+        return converted[1:] if quote_first else converted
+    # pieces: текст, группы блока, текст, ..., текст
+    step = groups + 1
+    gaps = pieces[::step]
+    if groups == 1:
+        blocks = pieces[1::2]  # HTML-теги доверенного контента — как есть
+    else:
+        # Код — самый частый блок, его HTML собирается без вызова функции
+        columns = [pieces[offset::step] for offset in range(1, step)]
+        blocks = [
+            "<code>" + block[2].replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;") + "</code>"
+            if block[2] is not None else _render_markdown_block(preserve_html_tags, *block)
+            for block in zip(*columns)
+        ]
+    if _BLOCK_PLACEHOLDER in text:
+        # Заместитель уже есть в тексте — промежутки разбираются по одному
+        for gap, block in zip(gaps, blocks):
+            _tokenize_text(gap, parts, stars, underscores, underlines, extended)
+            parts.append(block)
+        _tokenize_text(gaps[-1], parts, stars, underscores, underlines, extended)
+        converted = _resolve_markdown(parts, stars, underscores, underlines)
+    else:
+        # Весь текст между блоками — за один разбор, затем заместители заменяются HTML блоков
+        resolved = _markup_text(_BLOCK_PLACEHOLDER.join(gaps), extended).split(_BLOCK_PLACEHOLDER)
+        converted = _interleave(resolved, blocks)
+    return converted[1:] if quote_first else converted
+
+def _crosses(opening: int, closing: int, spans: list, opens: list, closes_sorted: list) -> bool:
+    """Пересекает ли пара (opening, closing) какую-либо из пар spans (отсортированы по открытию)."""
+    # Пара, открытая внутри, закрывается снаружи
+    for span_opening, span_closing in spans[bisect_right(opens, opening):bisect_left(opens, closing)]:
+        if span_closing > closing:
+            return True
+    # Пара, закрытая внутри, открыта снаружи
+    for span_closing, span_opening in closes_sorted[bisect_right(closes_sorted, (opening,)):bisect_left(closes_sorted, (closing,))]:
+        if span_opening < opening:
+            return True
+    return False
+
+def _resolve_markdown(parts: list, stars: list, underscores: list, underlines: list) -> str:
+    """Расставляет теги по найденным служебным символам (индексы в parts) и собирает результат."""
+    # Жирный: «**» открывает, ближайшее следующее «**» закрывает; содержимое не пустое и не начинается с «**».
+    # Для серии звёздочек это значит: закрывают первые две, открывают две из последних трёх
+    # (третья с конца остаётся звёздочкой внутри жирного текста). Серия сразу заменяется своим HTML;
+    # звёздочки, не ставшие тегом, остаются в начале или в конце замены.
+    # Пары жирного идут друг за другом, поэтому их границы — возрастающий ряд «открытие, закрытие, ...»
+    bold_bounds = []
+    pending = None
+    for index in stars:
+        count = len(parts[index])
+        if count == 2:
+            # Самый частый случай — ровно «**»
+            if pending is None:
+                parts[index] = "<b>"
+                pending = index
+            else:
+                parts[index] = "</b>"
+                bold_bounds += (pending, index)
+                pending = None
+            continue
+        closing = pending is not None
+        if count < 2:
+            continue  # одна «*» остаётся звёздочкой и внутри жирного, и вне его
+        first = 2 if closing else 0
+        open_at = max(first, count - 3)
+        if closing:
+            bold_bounds += (pending, index)
+        if count - open_at >= 2:
+            parts[index] = ("</b>" if closing else "") + "*" * (open_at - first) + "<b>" + "*" * (count - open_at - 2)
+            pending = index
+        else:
+            parts[index] = ("</b>" if closing else "") + "*" * (count - first)
+            pending = None
+    if pending is not None:
+        # Незакрытое «**» остаётся звёздочками
+        parts[pending] = parts[pending].replace("<b>", "**")
+
+    # Курсив: «_» и ближайшее следующее «_» с непустым текстом между ними;
+    # не срабатывает, если перед открывающим или после закрывающего стоит звёздочка (не ставшая тегом)
+    # или если пара пересекла бы жирный («_a **b_ c**» — Telegram не принимает перекрывающиеся теги):
+    # пара курсива пересекает жирный, если первая граница внутри неё — закрытие или последняя — открытие
+    italic_bounds = []  # так же, возрастающий ряд
+    last = len(parts) - 1
+    i = 0
+    pairs_end = len(underscores) - 1
+    while i < pairs_end:
+        opening, closing = underscores[i], underscores[i + 1]
+        if (
+            closing > opening + 1
+            and not (opening and parts[opening - 1][-1] == "*")
+            and not (closing < last and parts[closing + 1][0] == "*")
+        ):
+            if bold_bounds:
+                low, high = bisect_right(bold_bounds, opening), bisect_left(bold_bounds, closing)
+                if low < high and (low % 2 or high % 2):
+                    i += 1
+                    continue
+            parts[opening], parts[closing] = "<i>", "</i>"
+            italic_bounds += (opening, closing)
+            i += 2
+        else:
+            i += 1
+
+    # Подчёркнутый (расширенная разметка): «__текст__». Пара, которая пересекла бы жирный
+    # или курсив («__a **b__ c**»), остаётся текстом — Telegram не принимает перекрывающиеся теги
+    if underlines:
+        # Пересечь пару может только тег, одна из границ которого внутри неё; чаще всего внутри
+        # пары подчёркивания границ нет совсем — тогда точная проверка не нужна
+        bounds = bold_bounds + italic_bounds
+        bounds.sort()
+        spans = opens = closes_sorted = None
+        for opening, closing in zip(underlines[::2], underlines[1::2]):
+            if closing == opening + 1:
+                continue
+            if bisect_right(bounds, opening) < bisect_left(bounds, closing):
+                if spans is None:
+                    # пары тегов (индекс открытия, индекс закрытия) по возрастанию открытия
+                    spans = list(zip(bold_bounds[::2], bold_bounds[1::2])) + list(zip(italic_bounds[::2], italic_bounds[1::2]))
+                    spans.sort()
+                    opens = [span[0] for span in spans]
+                    closes_sorted = sorted((span[1], span[0]) for span in spans)
+                if _crosses(opening, closing, spans, opens, closes_sorted):
+                    continue
+            parts[opening], parts[closing] = "<u>", "</u>"
+    return "".join(parts)
+
+def convert_markdown_to_html(text: str, preserve_html_tags: bool = True, extended: bool = False) -> str:
     """
     Преобразует базовый Markdown-текст в HTML.
     Поддерживает:
     - Жирный текст: **текст** -> <b>текст</b>
     - Курсив: _текст_ -> <i>текст</i>
     - Переносы строк: \n (обрабатываются Telegram API в режиме HTML)
+    При extended=True также:
+    - Подчёркнутый: __текст__ -> <u>текст</u>
+    - Код: `код` -> <code>код</code>, блок ```язык\nкод``` -> <pre><code class="language-язык">код</code></pre>
+    - Ссылки: [текст](https://...) -> <a href="https://...">текст</a>
+    - Цитаты: строки, начинающиеся с «>» -> <blockquote>...</blockquote>
     
     Также экранирует HTML-символы в тексте для безопасной отправки в Telegram.
+    Существующие HTML-теги (при preserve_html_tags=True) переносятся как есть: разметка внутри
+    самих тегов (например, «_» в адресе ссылки) не обрабатывается.
     
     :param text: Текст для конвертации
     :param preserve_html_tags: Если True, сохраняет существующие HTML-теги (для доверенного контента).
                                Если False, экранирует ВСЕ HTML-теги (для недоверенного контента, например от AI).
+    :param extended: Включить разметку подчёркивания, кода, ссылок и цитат.
     """
     if not text:
         return text
-    
-    html_tags = []
-    
-    # Защищаем уже существующие HTML-теги от обработки (только если preserve_html_tags=True)
-    if preserve_html_tags:
-        html_tag_placeholder_prefix = "___HTML_TAG_"
-        html_tag_placeholder_suffix = "___"
-        tag_pattern = r'<[^>]+>'
-        
-        def save_tag(match):
-            tag = match.group(0)
-            html_tags.append(tag)
-            return f"{html_tag_placeholder_prefix}{len(html_tags) - 1}{html_tag_placeholder_suffix}"
-        
-        # Сохраняем существующие HTML-теги ПЕРЕД декодированием (для безопасности)
-        # Это предотвращает превращение &lt;script&gt; в <script> перед сохранением
-        text = re.sub(tag_pattern, save_tag, text)
-        
-        # Для доверенного контента (preserve_html_tags=True) НЕ декодируем HTML-сущности
-        # Предполагаем, что сущности там корректные и их не нужно перекодировать
-    else:
-        # Для недоверенного контента (preserve_html_tags=False, AI-ответы)
-        # Декодируем HTML-сущности, которые мог вернуть AI (например, &gt; -> >)
-        # Это предотвращает двойное экранирование (&gt; -> &amp;gt;)
+    if not preserve_html_tags:
+        # Для недоверенного контента (AI-ответы) декодируем HTML-сущности, которые мог вернуть AI
+        # (например, &gt; -> >): это предотвращает двойное экранирование (&gt; -> &amp;gt;).
+        # В доверенном контенте сущности не декодируются — их & экранируется, как и любой другой
         text = html.unescape(text)
-    
-    # Экранируем специальные символы HTML для безопасной отправки в Telegram
-    # Согласно документации Telegram, все &, < и > должны быть экранированы
-    text = text.replace('&', '&amp;')
-    text = text.replace('<', '&lt;')
-    text = text.replace('>', '&gt;')
-    
-    # Восстанавливаем сохраненные HTML-теги (только если preserve_html_tags=True)
-    if preserve_html_tags:
-        for i, tag in enumerate(html_tags):
-            text = text.replace(f"{html_tag_placeholder_prefix}{i}{html_tag_placeholder_suffix}", tag)
-    
-    # Теперь обрабатываем markdown форматирование
-    # Жирный текст: **текст** -> <b>текст</b>
-    # Обрабатываем все вхождения **text** даже если они содержат кавычки и другие символы
-    # Используем более надежный паттерн, который обрабатывает любые символы между **
-    # Паттерн ищет **, затем любые символы (включая переносы строк), затем **
-    text = re.sub(r'\*\*((?:[^*]|\*(?!\*))+?)\*\*', r'<b>\1</b>', text, flags=re.DOTALL)
-    
-    # Курсив: _текст_ -> <i>текст</i>
-    # Убеждаемся, что _ не является частью другого форматирования
-    text = re.sub(r'(?<!\*)_([^_]+)_(?!\*)', r'<i>\1</i>', text)
-    
-    # Переносы строк обрабатываются Telegram API в режиме HTML
-    return text
+    return _convert_markdown(text, preserve_html_tags, extended)
 
-async def fetch_html_content(url: str) -> str | None:
+# Условные запросы: для каждого URL запоминаем ETag/Last-Modified и тело последнего ответа.
+# Повторный запрос отправляет If-None-Match/If-Modified-Since; на 304 сервер не присылает тело,
+# а мы берём запомненное (и вызывающий код может не разбирать его заново).
+HTTP_CACHE_MAX_ENTRIES = 64
+ACCEPT_ENCODING = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate"
+
+_http_cache: "OrderedDict[str, Dict[str, Optional[str]]]" = OrderedDict()
+_http_stats = {"requests": 0, "not_modified": 0, "bytes_received": 0}
+
+class FetchResult(NamedTuple):
+    """Результат запроса: текст (None — ошибка) и признак «не изменилось с прошлого запроса» (ответ 304)."""
+    text: Optional[str]
+    not_modified: bool = False
+
+def _remember_response(url: str, etag: Optional[str], last_modified: Optional[str], body: str) -> None:
+    if not etag and not last_modified:
+        _http_cache.pop(url, None)
+        return
+    _http_cache[url] = {"etag": etag, "last_modified": last_modified, "body": body}
+    _http_cache.move_to_end(url)
+    while len(_http_cache) > HTTP_CACHE_MAX_ENTRIES:
+        _http_cache.popitem(last=False)
+
+async def fetch_url(url: str, timeout_seconds: float = 30) -> FetchResult:
     """
-    Асинхронно извлекает HTML-содержимое с указанного URL с таймаутом 30 секунд.
+    Асинхронно извлекает содержимое URL условным запросом (ETag/Last-Modified) со сжатием gzip/brotli.
+    На 304 возвращает запомненное тело с not_modified=True.
     """
-    timeout = aiohttp.ClientTimeout(total=30)  # Таймаут 30 секунд
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    cached = _http_cache.get(url)
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
     async with aiohttp.ClientSession(timeout=timeout) as session:
         try:
-            async with session.get(url) as response:
+            async with session.get(url, headers=headers) as response:
+                _http_stats["requests"] += 1
+                if response.status == 304 and cached:
+                    _http_stats["not_modified"] += 1
+                    if url in _http_cache:
+                        _http_cache.move_to_end(url)
+                    return FetchResult(cached["body"], not_modified=True)
                 response.raise_for_status()  # Вызывает исключение для кодов состояния HTTP ошибок
-                return await response.text()
+                # Считаем прочитанное тело: у ответов с chunked-передачей Content-Length нет
+                _http_stats["bytes_received"] += len(await response.read())
+                body = await response.text()  # декодирует уже прочитанное тело
+                _remember_response(url, response.headers.get("ETag"), response.headers.get("Last-Modified"), body)
+                return FetchResult(body)
         except (asyncio.TimeoutError, aiohttp.ServerTimeoutError) as e:
             # ВАЖНО: Ловим таймауты ПЕРВЫМИ (до общего ClientError)
             print(f"Таймаут при получении HTML с {url}: {e}")
-            return None
+            return FetchResult(None)
         except aiohttp.ClientError as e:
             print(f"Ошибка при получении HTML с {url}: {e}")
-            return None
+            return FetchResult(None)
         except Exception as e:
             print(f"Неизвестная ошибка при получении HTML с {url}: {e}")
-            return None
+            return FetchResult(None)
 
-def parse_pravoslavie_calendar_page(html_content: str) -> dict:
+async def fetch_html_content(url: str) -> str | None:
+    """
+    Асинхронно извлекает HTML-содержимое с указанного URL с таймаутом 30 секунд.
+    """
+    return (await fetch_url(url)).text
+
+def get_http_cache_stats() -> Dict[str, int]:
+    """Статистика условных запросов: всего, ответов 304, получено байт (после распаковки), URL с валидаторами."""
+    return {"urls": len(_http_cache), **_http_stats}
+
+# Версия парсеров календаря: увеличить при любом изменении результата parse_*_calendar_page,
+# чтобы данные в кэше календаря были пересобраны из сохранённого HTML
+CALENDAR_PARSER_VERSION = 1
+
+# Бэкенды разбора страниц календаря (результат у всех одинаковый, различается скорость):
+#   reference — html.parser по всей странице (эталон для проверки, см. scripts/check_calendar_parsers.py);
+#   fast      — html.parser, но строится дерево только нужных блоков страницы (по умолчанию:
+#               совпадает с reference на scripts/check_calendar_golden.py; если в выборочном дереве
+#               не нашлось ни одного праздника — страница разбирается целиком, как reference);
+#   lxml      — то же на lxml (в разы быстрее; если lxml не установлен — как fast).
+#               Включается явно, после того как scripts/check_calendar_golden.py прошёл с установленным lxml.
+CALENDAR_PARSER_BACKENDS = ("reference", "fast", "lxml")
+CALENDAR_PARSER_BACKEND = os.getenv("CALENDAR_PARSER_BACKEND") or "fast"
+
+# Классы блоков страниц, из которых берутся данные (остальная страница не разбирается)
+PRAVOSLAVIE_BLOCK_CLASSES = {"div": {"DD_TEXT", "DD_FEOFAN"}, "span": {"DD_NED", "DD_TPTXT"}}
+AZBYKA_BLOCK_CLASSES = {
+    "div": {"days-list-item", "post-info", "day-week", "day-namedays", "day-feofan"},
+    "span": {"post-status"},
+}
+
+def _has_block_class(block_classes: dict, name: str, attrs: dict) -> bool:
+    classes = (attrs or {}).get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return bool(block_classes.get(name, set()).intersection(classes))
+
+def _is_pravoslavie_block(name: str, attrs: dict) -> bool:
+    return _has_block_class(PRAVOSLAVIE_BLOCK_CLASSES, name, attrs)
+
+def _is_azbyka_block(name: str, attrs: dict) -> bool:
+    return _has_block_class(AZBYKA_BLOCK_CLASSES, name, attrs)
+
+def _calendar_soup(html_content: str, backend: str | None, parse_only: SoupStrainer | None = None) -> BeautifulSoup:
+    """Строит дерево страницы календаря выбранным бэкендом (None — CALENDAR_PARSER_BACKEND)."""
+    backend = backend or CALENDAR_PARSER_BACKEND
+    if backend == "reference":
+        return BeautifulSoup(html_content, 'html.parser')
+    features = 'lxml' if backend == "lxml" and LXML_AVAILABLE else 'html.parser'
+    return BeautifulSoup(html_content, features, parse_only=parse_only)
+
+def _first_div_containing(soup: BeautifulSoup, marker: str):
+    """
+    Первый в порядке документа <div>, чей текст (get_text(strip=True)) содержит marker.
+    Это всегда div верхнего уровня (предок идёт в документе раньше потомка, и его текст
+    включает текст потомка), поэтому достаточно проверить только их — за один проход по странице
+    вместо get_text() для каждого div.
+    """
+    for div in soup.find_all('div'):
+        if div.find_parent('div') is not None:
+            continue
+        if marker in div.get_text(strip=True):
+            return div
+    return None
+
+def parse_pravoslavie_calendar_page(html_content: str, backend: str | None = None) -> dict:
     """
     Парсит HTML-содержимое страницы православного календаря с pravoslavie.ru
     и извлекает информацию о праздниках, седмицах и мыслях Феофана Затворника.
+
+    :param backend: Бэкенд разбора из CALENDAR_PARSER_BACKENDS (None — CALENDAR_PARSER_BACKEND).
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = _calendar_soup(html_content, backend, parse_only=SoupStrainer(_is_pravoslavie_block))
     
     calendar_data = {
         "main_holiday": None,
@@ -146,9 +537,12 @@ def parse_pravoslavie_calendar_page(html_content: str) -> dict:
 
     # Праздники определяем по секциям страницы (data-prazdnik)
     section_holidays = []
-    for p_tag in soup.select('div.DD_TEXT p.DP_TEXT:has([data-prazdnik])'):
+    # Вместо селектора :has() (проверяет всё дерево для каждого абзаца) — проверка внутри абзаца
+    for p_tag in soup.select('div.DD_TEXT p.DP_TEXT'):
         data_tag = p_tag.select_one('[data-prazdnik]')
-        data_prazdnik = data_tag.get('data-prazdnik') if data_tag else None
+        if not data_tag:
+            continue
+        data_prazdnik = data_tag.get('data-prazdnik')
         level = None
         level_img = p_tag.select_one('img[src*="/T4.gif"], img[src*="/T6.gif"]')
         if level_img and level_img.get('src'):
@@ -254,13 +648,20 @@ def parse_pravoslavie_calendar_page(html_content: str) -> dict:
     else:
         calendar_data["theophan_thoughts"] = []
 
+    if not calendar_data["holidays"] and (backend or CALENDAR_PARSER_BACKEND) != "reference":
+        # В нужных блоках ничего не нашлось — вероятно, изменилась разметка: разбираем страницу целиком
+        return parse_pravoslavie_calendar_page(html_content, backend="reference")
     return calendar_data
 
-def parse_azbyka_calendar_page(html_content: str) -> dict:
+def parse_azbyka_calendar_page(html_content: str, backend: str | None = None) -> dict:
     """
     Парсит HTML-содержимое страницы azbyka.ru и извлекает данные календаря.
+    Быстрые бэкенды строят дерево только блоков AZBYKA_BLOCK_CLASSES: праздники и именины
+    (days-list-item), пост, седмица, строка «Именины:» и мысли Феофана лежат в них целиком.
+
+    :param backend: Бэкенд разбора из CALENDAR_PARSER_BACKENDS (None — CALENDAR_PARSER_BACKEND).
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = _calendar_soup(html_content, backend, parse_only=SoupStrainer(_is_azbyka_block))
 
     calendar_data = {
         "main_holiday": None,
@@ -312,7 +713,7 @@ def parse_azbyka_calendar_page(html_content: str) -> dict:
         if name and name not in calendar_data["namedays"]:
             calendar_data["namedays"].append(name)
     
-    nameday_section = soup.find(lambda tag: tag.name == 'div' and 'Именины:' in tag.get_text(strip=True))
+    nameday_section = _first_div_containing(soup, 'Именины:')
     if nameday_section:
         namedays_str = nameday_section.get_text(strip=True).split("Именины:")[1].strip()
         names = [n.strip() for n in namedays_str.replace(' и ', ',').replace(';', ',').split(',') if n.strip()]
@@ -346,4 +747,7 @@ def parse_azbyka_calendar_page(html_content: str) -> dict:
 
     # Изображения с azbyka.ru не парсим и не сохраняем — используем локальные из daily_word
 
+    if not calendar_data["holidays"] and (backend or CALENDAR_PARSER_BACKEND) != "reference":
+        # В нужных блоках ничего не нашлось — вероятно, изменилась разметка: разбираем страницу целиком
+        return parse_azbyka_calendar_page(html_content, backend="reference")
     return calendar_data
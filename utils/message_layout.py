@@ -0,0 +1,149 @@
+"""
+Раскладка HTML-текста по сообщениям Telegram: длина видимого текста, укорачивание
+и разбиение без разрезания тегов и HTML-сущностей.
+
+Telegram ограничивает не длину HTML, а длину текста после разбора разметки
+(подпись к фото — 1024, сообщение — 4096) и считает её в кодовых единицах UTF-16:
+теги не считаются, сущность (&amp;) — один символ, эмодзи вне BMP — два.
+Текст режется по лучшей границе (абзац, строка, конец предложения, пробел); теги,
+открытые до места разреза, закрываются в первой части и открываются заново во второй.
+"""
+import re
+import html
+from typing import List, Optional, Tuple
+
+MAX_CAPTION_LEN = 1024
+MAX_MESSAGE_LEN = 4096
+
+_TOKEN = re.compile(r"<[^>]+>|&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);|[^<&]+|[<&]")
+_TAG = re.compile(r"<[^>]+>")
+_TAG_NAME = re.compile(r"</?\s*([A-Za-z][\w-]*)")
+# Границы разреза по убыванию предпочтения: (вид, выражение; разрез — после совпадения)
+_BOUNDARIES = (
+    ("paragraph", re.compile(r"\n\s*\n")),
+    ("line", re.compile(r"\n")),
+    ("sentence", re.compile(r"[.!?…](?:[»\")]*)\s")),
+    ("word", re.compile(r"\s")),
+)
+# Текстовый фрагмент оканчивается знаком конца предложения (пробел после него — уже в следующем, за тегом)
+_SENTENCE_END = re.compile(r"[.!?…][»\")]*$")
+# Эти границы завершают мысль — после них многоточие не ставится
+_COMPLETE_BOUNDARIES = ("paragraph", "line", "sentence")
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+def _utf16_prefix(text: str, units: int) -> str:
+    """Самое длинное начало text не длиннее units кодовых единиц UTF-16 (суррогатная пара не разрезается)."""
+    return text.encode("utf-16-le")[:units * 2].decode("utf-16-le", errors="ignore")
+
+def visible_length(html_text: str) -> int:
+    """Длина текста так, как её считает Telegram для HTML-сообщения (без тегов, с раскрытыми сущностями)."""
+    if not html_text:
+        return 0
+    return _utf16_len(html.unescape(_TAG.sub("", html_text)))
+
+def _cut(html_text: str, limit: int, min_len: int) -> Tuple[str, str, str]:
+    """
+    Разрезает HTML так, чтобы видимая часть первой половины не превышала limit.
+
+    :return: (первая часть с закрытыми тегами, остаток с заново открытыми тегами, вид границы)
+    """
+    stack: Tuple[Tuple[str, str], ...] = ()  # открытые теги: (имя, открывающий тег)
+    visible = 0
+    # вид границы -> (позиция в html_text, видимая длина до неё, открытые теги)
+    best = {}
+    cut_at: Optional[Tuple[int, int, tuple]] = None
+    sentence_ended = False
+    for match in _TOKEN.finditer(html_text):
+        token = match.group()
+        if token[0] == "<" and len(token) > 1:
+            name_match = _TAG_NAME.match(token)
+            name = name_match.group(1).lower() if name_match else ""
+            if token.startswith("</"):
+                names = [open_name for open_name, _ in stack]
+                if name in names:
+                    stack = stack[:len(names) - 1 - names[::-1].index(name)]
+            elif not token.endswith("/>"):
+                stack = stack + ((name, token),)
+            continue
+        text = html.unescape(token) if token[0] == "&" and len(token) > 1 else token
+        length = _utf16_len(text)
+        fits = visible + length <= limit
+        is_text = token[0] != "&" or len(token) == 1
+        # Сколько фрагмента помещается (сущность не делится)
+        prefix = token if fits else _utf16_prefix(token, limit - visible) if is_text else ""
+        if is_text:
+            # Границы заканчиваются пробельным символом, который в разрез не попадает, —
+            # поэтому смотрим на один символ дальше помещающейся части
+            searchable = token if fits else token[:len(prefix) + 1]
+            if sentence_ended and searchable[:1].isspace():
+                best["sentence"] = (match.start() + 1, visible + 1, stack)
+            for kind, pattern in _BOUNDARIES:
+                for boundary in pattern.finditer(searchable):
+                    best[kind] = (match.start() + boundary.end(), visible + _utf16_len(searchable[:boundary.end()]), stack)
+        sentence_ended = is_text and bool(_SENTENCE_END.search(token))
+        if not fits:
+            # Жёсткий разрез: столько, сколько помещается
+            cut_at = (match.start() + len(prefix), visible + _utf16_len(prefix), stack)
+            break
+        visible += length
+    else:
+        return html_text, "", "end"
+
+    for kind, _ in _BOUNDARIES:
+        candidate = best.get(kind)
+        if candidate and (candidate[1] >= min_len or kind == "word"):
+            position, _, open_tags, chosen = *candidate, kind
+            break
+    else:
+        position, _, open_tags = cut_at
+        chosen = "hard"
+    head = html_text[:position].rstrip()
+    tail = html_text[position:].lstrip()
+    head += "".join(f"</{name}>" for name, _ in reversed(open_tags))
+    tail = "".join(tag for _, tag in open_tags) + tail
+    return head, tail, chosen
+
+def truncate_html(html_text: str, limit: int, min_len: int = 0, ellipsis: str = "") -> str:
+    """
+    Укорачивает HTML до limit видимых символов по лучшей границе не раньше min_len
+    (абзац, строка, предложение), иначе по слову; открытые теги закрываются.
+    ellipsis добавляется, если текст обрезан не на конце предложения.
+    """
+    if visible_length(html_text) <= limit:
+        return html_text
+    reserve = visible_length(ellipsis)
+    head, _, kind = _cut(html_text, max(0, limit - reserve), min_len)
+    if ellipsis and kind not in _COMPLETE_BOUNDARIES:
+        # Многоточие ставим перед закрывающими тегами — внутрь оформления
+        closing = re.search(r"(?:</[^>]+>)*$", head)
+        head = head[:closing.start()] + ellipsis + head[closing.start():]
+    return head
+
+def split_html(html_text: str, limit: int = MAX_MESSAGE_LEN) -> List[str]:
+    """Разбивает HTML на части не длиннее limit видимых символов; каждая часть — с парными тегами."""
+    parts = []
+    rest = html_text
+    while visible_length(rest) > limit:
+        head, rest, _ = _cut(rest, limit, limit // 2)
+        if head:
+            parts.append(head)
+    if rest.strip() or not parts:
+        parts.append(rest)
+    return parts
+
+def split_plain_text(text: str, limit: int = MAX_MESSAGE_LEN) -> List[str]:
+    """Разбивает текст без разметки (parse_mode=None) на части не длиннее limit символов."""
+    return [html.unescape(part) for part in split_html(html.escape(text, quote=False), limit)]
+
+def layout_caption(html_text: str, caption_limit: int = MAX_CAPTION_LEN, message_limit: int = MAX_MESSAGE_LEN) -> Tuple[str, List[str]]:
+    """
+    Раскладывает HTML на подпись к фото и следующие за ней сообщения.
+
+    :return: (подпись не длиннее caption_limit, список сообщений не длиннее message_limit)
+    """
+    if visible_length(html_text) <= caption_limit:
+        return html_text, []
+    caption, rest, _ = _cut(html_text, caption_limit, caption_limit // 2)
+    return caption, split_html(rest, message_limit) if rest.strip() else []